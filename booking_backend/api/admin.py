@@ -1,11 +1,11 @@
 from django.contrib import admin
 
-from .models import AppointmentSlot, Booking
+from .models import AppointmentSlot, ArchivedBooking, ArchivedSlot, Booking, DailyOccupancy, Notification
 
 
 @admin.register(AppointmentSlot)
 class AppointmentSlotAdmin(admin.ModelAdmin):
-    list_display = ("start", "doctor")
+    list_display = ("start", "end", "doctor")
 
 
 @admin.register(Booking)
@@ -13,3 +13,48 @@ class BookingAdmin(admin.ModelAdmin):
     list_display = ("user", "slot", "status", "reason")
     list_filter = ("status", "slot")
     search_fields = ("user__username", "user__email", "reason")
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("subject", "recipient", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("recipient", "subject")
+
+
+@admin.register(DailyOccupancy)
+class DailyOccupancyAdmin(admin.ModelAdmin):
+    list_display = ("day", "doctor", "total_slots", "confirmed", "cancelled")
+    list_filter = ("doctor",)
+    date_hierarchy = "day"
+
+    def has_add_permission(self, request) -> bool:
+        # rows are maintained by signals and `rebuild_occupancy`
+        return False
+
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
+
+
+class ArchiveAdmin(admin.ModelAdmin):
+    """Read-only: the archive is written by `archive_history`."""
+
+    def has_add_permission(self, request) -> bool:
+        return False
+
+    def has_change_permission(self, request, obj=None) -> bool:
+        return False
+
+
+@admin.register(ArchivedSlot)
+class ArchivedSlotAdmin(ArchiveAdmin):
+    list_display = ("start", "end", "doctor", "archived_at")
+    list_filter = ("doctor",)
+    date_hierarchy = "start"
+
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(ArchiveAdmin):
+    list_display = ("user", "slot", "status", "reason")
+    list_filter = ("status",)
+    search_fields = ("user__username", "user__email", "reason")
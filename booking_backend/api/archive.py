@@ -0,0 +1,66 @@
+import datetime
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AppointmentSlot, ArchivedBooking, ArchivedSlot, Booking
+
+# Slots that ended more than `ARCHIVE_RETENTION_DAYS` ago are moved, with all their bookings
+# (confirmed and cancelled), to the ArchivedSlot/ArchivedBooking tables, keeping their ids. The live
+# tables and their indexes then only hold recent history and the future schedule.
+#
+# Rows are deleted with raw DELETEs, which send no post_delete signals: archiving is not a
+# cancellation, so no notifications or events are sent, and DailyOccupancy keeps counting the
+# archived days (`rebuild_occupancy` reads both tables).
+
+_BOOKING_FIELDS = ("id", "slot_id", "user_id", "reason", "status", "created_at", "updated_at")
+
+
+@dataclass
+class ArchiveResult:
+    slots: int = 0
+    bookings: int = 0
+
+
+def retention_cutoff(now: datetime.datetime | None = None) -> datetime.datetime:
+    return (now or timezone.now()) - datetime.timedelta(days=settings.ARCHIVE_RETENTION_DAYS)
+
+
+def archive_batch(cutoff: datetime.datetime, batch_size: int) -> ArchiveResult:
+    """Move up to `batch_size` of the oldest slots ending before `cutoff`, with their bookings, in one transaction."""
+    now = timezone.now()
+    with transaction.atomic():
+        slots = list(AppointmentSlot.objects.select_for_update().filter(start__lt=cutoff, end__lte=cutoff).order_by("start", "id")[:batch_size])
+        if not slots:
+            return ArchiveResult()
+        slot_ids = [slot.pk for slot in slots]
+        bookings = list(Booking.objects.select_for_update().filter(slot_id__in=slot_ids).values(*_BOOKING_FIELDS))
+
+        ArchivedSlot.objects.bulk_create(ArchivedSlot(id=slot.pk, start=slot.start, end=slot.end, doctor_id=slot.doctor_id, archived_at=now) for slot in slots)
+        ArchivedBooking.objects.bulk_create(ArchivedBooking(**row) for row in bookings)
+
+        # bookings first: they reference the slots (confirmed_slot too)
+        booking_rows = Booking.objects.filter(slot_id__in=slot_ids)
+        booking_rows._raw_delete(booking_rows.db)
+        slot_rows = AppointmentSlot.objects.filter(pk__in=slot_ids)
+        slot_rows._raw_delete(slot_rows.db)
+
+    return ArchiveResult(len(slots), len(bookings))
+
+
+def archive_before(cutoff: datetime.datetime | None = None, batch_size: int | None = None) -> ArchiveResult:
+    """Archive every slot ending before `cutoff` (default: the retention window) in batches.
+
+    Each batch commits on its own, so locks are held briefly and an interrupted run resumes where it stopped.
+    """
+    cutoff = cutoff or retention_cutoff()
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    total = ArchiveResult()
+    while True:
+        batch = archive_batch(cutoff, batch_size)
+        total.slots += batch.slots
+        total.bookings += batch.bookings
+        if batch.slots < batch_size:
+            return total
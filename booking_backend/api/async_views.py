@@ -0,0 +1,203 @@
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import TYPE_CHECKING, Any
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .authentication import ClaimsUser, StatelessJWTAuthentication, ais_revoked, stateless_enabled
+from .events import SlotEvent, SubscriptionOverflow, get_broker
+from .feeds import abuild_calendar_feed
+from .instrumentation import serialization_timer
+from .models import AppointmentSlot, ArchivedBooking
+from .pagination import BookingPagination, SlotPagination
+from .passwords import amake_password
+from .renderers import FastJSONRenderer
+from .roles import aget_roles
+from .serializers import BOOKING_ROW_FIELDS, AppointmentSlotSerializer, UserRegistrationSerializer, issue_token_pair, serialize_booking_rows
+from .slot_cache import acached_slot_entry, is_not_modified
+from .views import AppointmentSlotViewSet, BookingViewSet, RegisterView, booking_sources, datetime_param, own_bookings, upcoming_slots
+
+if TYPE_CHECKING:
+    from django.contrib.auth.models import User
+    from django.http import HttpRequest
+
+# Native async versions of the hot read endpoints, for ASGI workers (uvicorn). They share the query,
+# pagination, caching and serialization code of the DRF viewsets and return the same JSON; only the
+# database and cache I/O is awaited, so a worker does not hold a thread per waiting client.
+
+
+class AsyncJWTAuthentication(StatelessJWTAuthentication):
+    async def aauthenticate(self, request: "HttpRequest") -> tuple["User | ClaimsUser", Any] | None:
+        if (header := self.get_header(request)) is None or (raw_token := self.get_raw_token(header)) is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if await ais_revoked(validated_token):
+            raise InvalidToken("Token has been revoked")
+        # the async views only read, or register a new user
+        if stateless_enabled(validated_token):
+            return ClaimsUser(validated_token), validated_token
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token: Any) -> "User":
+        """`JWTAuthentication.get_user` with the async ORM."""
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken("Token contained no recognizable user identification") from exc
+
+        try:
+            user = await self.user_model.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as exc:
+            raise exceptions.AuthenticationFailed("User not found", code="user_not_found") from exc
+
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise exceptions.AuthenticationFailed("User is inactive", code="user_inactive")
+        if jwt_settings.CHECK_REVOKE_TOKEN and validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise exceptions.AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return user
+
+
+def _json(data: Any, status_code: int = status.HTTP_200_OK, headers: dict[str, str] | None = None) -> HttpResponse:
+    # same renderer and defaults as the DRF views, so the bytes match
+    return HttpResponse(FastJSONRenderer().render(data), status=status_code, headers=headers, content_type="application/json")
+
+
+def async_api_view(query_budget: int, replica_safe: bool = False, methods: tuple[str, ...] = ("GET",)) -> Callable:
+    """Wrap an async view taking a DRF `Request`: authenticate it and render API errors like DRF."""
+
+    def decorator(view: Callable[[Request], Awaitable[HttpResponse]]) -> Callable[["HttpRequest"], Awaitable[HttpResponse]]:
+        # like APIView: JWTs are not ambient credentials, CSRF protection does not apply
+        @csrf_exempt
+        async def wrapper(request: "HttpRequest") -> HttpResponse:
+            if request.method not in methods:
+                return _json({"detail": f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED, {"Allow": ", ".join(methods)})
+            authentication = AsyncJWTAuthentication()
+            api_request = Request(request, parsers=[parser() for parser in drf_settings.DEFAULT_PARSER_CLASSES], authenticators=())
+            try:
+                api_request.user, api_request.auth = await authentication.aauthenticate(request) or (AnonymousUser(), None)
+                await aget_roles(api_request)
+                return await view(api_request)
+            except exceptions.APIException as exc:
+                headers = {}
+                if isinstance(exc, exceptions.NotAuthenticated | exceptions.AuthenticationFailed):
+                    headers["WWW-Authenticate"] = authentication.authenticate_header(request)
+                detail = exc.detail if isinstance(exc.detail, list | dict) else {"detail": exc.detail}
+                return _json(detail, exc.status_code, headers)
+
+        wrapper.query_budget = query_budget
+        wrapper.replica_safe = replica_safe
+        return wrapper
+
+    return decorator
+
+
+async def _cached_response(request: Request, namespace: str, build: Callable[[], Awaitable[Any]]) -> HttpResponse:
+    etag, data = await acached_slot_entry(request, namespace, build)
+    if is_not_modified(request, etag):
+        return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return _json(data, headers={"ETag": etag})
+
+
+@async_api_view(AppointmentSlotViewSet.query_budgets["list"], replica_safe=True)
+async def slot_list(request: Request) -> HttpResponse:
+    """Async `GET /api/appointments/`."""
+    qs = upcoming_slots(AppointmentSlot.objects.all(), request.query_params)
+
+    async def build():
+        paginator = SlotPagination()
+        page = await paginator.apaginate_queryset(qs, request)
+        data = AppointmentSlotSerializer(page, many=True, context={"request": request}).data
+        return paginator.get_paginated_response(data).data
+
+    # own namespace: page links point at the async URL
+    return await _cached_response(request, "async-list", build)
+
+
+@async_api_view(AppointmentSlotViewSet.query_budgets["calendar"], replica_safe=True)
+async def slot_calendar(request: Request) -> HttpResponse:
+    """Async `GET /api/appointments/calendar/`."""
+    qs = upcoming_slots(AppointmentSlot.objects.all(), request.query_params)
+
+    async def build():
+        with serialization_timer():
+            return await abuild_calendar_feed(qs)
+
+    # same payload as the sync feed, so the cache entry is shared
+    return await _cached_response(request, "calendar", build)
+
+
+@async_api_view(BookingViewSet.query_budgets["mine"])
+async def my_bookings(request: Request) -> HttpResponse:
+    """Async `GET /api/bookings/mine/`."""
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    paginator = BookingPagination()
+    sources = booking_sources(request.query_params, own_bookings(request), own_bookings(request, ArchivedBooking))
+    page = await paginator.apaginate_querysets([qs.values(*BOOKING_ROW_FIELDS) for qs in sources], request)
+    with serialization_timer():
+        data = serialize_booking_rows(page, request)
+    return _json(paginator.get_paginated_response(data).data)
+
+
+@async_api_view(RegisterView.query_budgets["post"], methods=("POST",))
+async def register(request: Request) -> HttpResponse:
+    """Async `POST /api/auth/register/`.
+
+    The password is hashed in the hashing pool (`PASSWORD_HASH_THREADS`) instead of the thread that
+    runs the sync code of all ASGI requests, so registrations do not queue behind each other.
+    """
+    serializer = UserRegistrationSerializer(data=request.data)
+    await sync_to_async(serializer.is_valid)(raise_exception=True)
+    encoded = await amake_password(serializer.validated_data["password"])
+
+    def create() -> dict[str, str]:
+        return issue_token_pair(serializer.save(encoded_password=encoded))
+
+    return _json(await sync_to_async(create)(), status.HTTP_201_CREATED)
+
+
+@async_api_view(query_budget=2)
+async def slot_events(request: Request) -> HttpResponse:
+    """`GET /api/events/slots/`: stream slot-created/booked/freed/deleted events as server-sent events.
+
+    Takes the `doctor`, `start` and `end` filters of the slot listing. The stream opens with a
+    `retry` line once it is subscribed; a client re-fetches the listing after that line (and after
+    every reconnect) and then applies the events to it.
+    """
+    if not isinstance(request._request, ASGIRequest):
+        # a sync worker would be held by the stream until the client goes away
+        return _json({"detail": "Event streams are only served by ASGI workers."}, status.HTTP_501_NOT_IMPLEMENTED)
+    if (doctor := request.query_params.get("doctor")) and not doctor.isdigit():
+        raise exceptions.ValidationError({"doctor": "Must be a numeric user id."})
+    doctor_id = int(doctor) if doctor else None
+    start, end = datetime_param(request.query_params, "start"), datetime_param(request.query_params, "end")
+
+    def matches(event: SlotEvent) -> bool:
+        return (doctor_id is None or event.doctor_id == doctor_id) and (start is None or event.start >= start) and (end is None or event.start <= end)
+
+    async def stream() -> AsyncIterator[str]:
+        async with get_broker().subscribe() as subscription:
+            yield f"retry: {settings.SLOT_EVENTS_RETRY_MS}\n\n"
+            while True:
+                try:
+                    event = await subscription.get(settings.SLOT_EVENTS_KEEPALIVE)
+                except SubscriptionOverflow:
+                    # events were dropped, closing makes the client reconnect and re-fetch
+                    return
+                if event is None:
+                    yield ": keep-alive\n\n"
+                elif matches(event):
+                    data = {"slot": event.slot_id, "doctor": event.doctor_id, "start": event.start, "free": event.free}
+                    yield f"event: {event.kind}\ndata: {FastJSONRenderer().render(data).decode()}\n\n"
+
+    return StreamingHttpResponse(stream(), content_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
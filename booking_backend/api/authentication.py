@@ -0,0 +1,140 @@
+import time
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from django.utils.functional import cached_property
+from rest_framework import permissions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .roles import ROLES_CLAIM, remember_roles
+
+if TYPE_CHECKING:
+    from django.contrib.auth.models import User
+    from rest_framework.request import Request
+    from rest_framework_simplejwt.tokens import Token
+
+# Profile fields copied into access tokens (see RoleClaimsTokenObtainPairSerializer) so read requests
+# can be authenticated from the token alone, without loading the user row.
+PROFILE_CLAIMS = ("username", "email", "first_name", "last_name")
+
+# Revocations are cache entries that live as long as the tokens they revoke could still be used:
+# a token's `jti` (logout), or a user id with the time before which its tokens are void (deactivation).
+# They live in their own cache alias, which every worker must share and which must not evict them
+# (see REVOCATION_CACHE_URL in settings).
+revocations = ConnectionProxy(caches, "revocations")
+
+
+def _token_key(jti: str) -> str:
+    return f"auth:revoked-token:{jti}"
+
+
+def _user_key(user_id: Any) -> str:
+    return f"auth:revoked-user:{user_id}"
+
+
+def revoke_token(token: "Token") -> None:
+    """Reject `token` (access or refresh) until it expires."""
+    remaining = int(token["exp"] - time.time()) + 1
+    if remaining > 0:
+        revocations.set(_token_key(token[jwt_settings.JTI_CLAIM]), 1, timeout=remaining)
+
+
+def revoke_user(user_id: Any) -> None:
+    """Reject every token of `user_id` issued before the current second.
+
+    `iat` has a resolution of one second, so a token issued later in the same second (a new login)
+    stays valid; the revocation time is stored in whole seconds to compare like for like.
+    """
+    lifetime = max(jwt_settings.ACCESS_TOKEN_LIFETIME, jwt_settings.REFRESH_TOKEN_LIFETIME)
+    revocations.set(_user_key(user_id), int(time.time()), timeout=int(lifetime.total_seconds()) + 1)
+
+
+def _revocation_keys(token: "Token") -> list[str]:
+    return [_token_key(token.get(jwt_settings.JTI_CLAIM)), _user_key(token.get(jwt_settings.USER_ID_CLAIM))]
+
+
+def _is_revoked(token: "Token", entries: dict[str, Any]) -> bool:
+    token_key, user_key = _revocation_keys(token)
+    if token_key in entries:
+        return True
+    revoked_before = entries.get(user_key)
+    return revoked_before is not None and token.get("iat", 0) < revoked_before
+
+
+def is_revoked(token: "Token") -> bool:
+    return _is_revoked(token, revocations.get_many(_revocation_keys(token)))
+
+
+async def ais_revoked(token: "Token") -> bool:
+    return _is_revoked(token, await revocations.aget_many(_revocation_keys(token)))
+
+
+class ClaimsUser(TokenUser):
+    """Request user built from access token claims; has no database row.
+
+    Carries the id, profile fields and roles of the token. Code that needs a `User` instance (writes,
+    foreign key assignments) runs on unsafe requests, which are authenticated against the database.
+    """
+
+    def __init__(self, token: "Token") -> None:
+        super().__init__(token)
+        # answer role checks from the token (see api.roles)
+        remember_roles(self, frozenset(token[ROLES_CLAIM]))
+
+    @cached_property
+    def id(self) -> int:
+        # the claim is a string, compare equal to the foreign keys of the user's rows
+        return get_user_model()._meta.pk.to_python(self.token[jwt_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self) -> int:
+        return self.id
+
+    @cached_property
+    def email(self) -> str:
+        return self.token.get("email", "")
+
+    @cached_property
+    def first_name(self) -> str:
+        return self.token.get("first_name", "")
+
+    @cached_property
+    def last_name(self) -> str:
+        return self.token.get("last_name", "")
+
+    def get_full_name(self) -> str:
+        return f"{self.first_name} {self.last_name}".strip()
+
+
+def has_claims(token: "Token") -> bool:
+    """Whether `token` carries everything `ClaimsUser` needs (tokens issued before claims were added do not)."""
+    return isinstance(token.get(ROLES_CLAIM), list) and all(claim in token for claim in PROFILE_CLAIMS)
+
+
+def stateless_enabled(token: "Token") -> bool:
+    # roles must come from the token, a ClaimsUser has no groups to query
+    return settings.JWT_STATELESS_READS and settings.ROLES_FROM_TOKEN_CLAIMS and has_claims(token)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """`JWTAuthentication` that checks the revocation cache and skips the user lookup on reads.
+
+    GET/HEAD/OPTIONS requests get a `ClaimsUser` from the token when `JWT_STATELESS_READS` is on,
+    so authentication and role checks cost no query. Other requests load the `User` as before.
+    """
+
+    def authenticate(self, request: "Request") -> tuple["User | ClaimsUser", "Token"] | None:
+        if (header := self.get_header(request)) is None or (raw_token := self.get_raw_token(header)) is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if is_revoked(validated_token):
+            raise InvalidToken("Token has been revoked")
+        if request.method in permissions.SAFE_METHODS and stateless_enabled(validated_token):
+            return ClaimsUser(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
@@ -0,0 +1,224 @@
+import bisect
+import datetime
+import threading
+import time
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AppointmentSlot, Booking
+
+# Free future slots of each doctor are kept as a sorted index of (start timestamp, slot id), the same
+# shape as a Redis sorted set scored by start. "Next N free slots after T" is a bisect plus a slice and
+# per-day free counts are two bisects per day, so reads never touch MySQL once a doctor is loaded.
+# The index is maintained incrementally from Booking/AppointmentSlot signals (see api.signals).
+
+
+class InMemoryAvailabilityStore:
+    """Process-local store.
+
+    Other worker processes do not see this process's signal updates, so every doctor's index is
+    reloaded from the database after `AVAILABILITY_TTL` seconds to bound staleness.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[int, list[tuple[float, int]]] = {}
+        self._loaded_at: dict[int, float] = {}
+
+    def is_loaded(self, doctor_id: int) -> bool:
+        loaded_at = self._loaded_at.get(doctor_id)
+        return loaded_at is not None and time.monotonic() - loaded_at < settings.AVAILABILITY_TTL
+
+    def replace(self, doctor_id: int, entries: Iterable[tuple[float, int]]) -> None:
+        with self._lock:
+            self._entries[doctor_id] = sorted(entries)
+            self._loaded_at[doctor_id] = time.monotonic()
+
+    def invalidate(self, doctor_id: int) -> None:
+        with self._lock:
+            self._entries.pop(doctor_id, None)
+            self._loaded_at.pop(doctor_id, None)
+
+    def add(self, doctor_id: int, start: float, slot_id: int) -> None:
+        with self._lock:
+            if (entries := self._entries.get(doctor_id)) is not None:
+                index = bisect.bisect_left(entries, (start, slot_id))
+                if index == len(entries) or entries[index] != (start, slot_id):
+                    entries.insert(index, (start, slot_id))
+
+    def remove(self, doctor_id: int, start: float, slot_id: int) -> None:
+        with self._lock:
+            if (entries := self._entries.get(doctor_id)) is not None:
+                index = bisect.bisect_left(entries, (start, slot_id))
+                if index < len(entries) and entries[index] == (start, slot_id):
+                    del entries[index]
+
+    def range(self, doctor_id: int, after: float, limit: int) -> list[tuple[float, int]]:
+        entries = self._entries.get(doctor_id, [])
+        index = bisect.bisect_left(entries, (after,))
+        return entries[index : index + limit]
+
+    def counts(self, doctor_id: int, bounds: list[float]) -> list[int]:
+        """Number of entries in each `[bounds[i], bounds[i + 1])` interval."""
+        entries = self._entries.get(doctor_id, [])
+        positions = [bisect.bisect_left(entries, (bound,)) for bound in bounds]
+        return [end - start for start, end in zip(positions, positions[1:], strict=False)]
+
+
+class RedisAvailabilityStore:
+    """Store backed by one Redis sorted set per doctor, shared by all worker processes.
+
+    Requires the `redis` package and `AVAILABILITY_REDIS_URL`.
+    """
+
+    def __init__(self) -> None:
+        import redis
+
+        self._redis = redis.Redis.from_url(settings.AVAILABILITY_REDIS_URL)
+
+    @staticmethod
+    def _key(doctor_id: int) -> str:
+        return f"availability:{doctor_id}"
+
+    def is_loaded(self, doctor_id: int) -> bool:
+        return bool(self._redis.exists(f"{self._key(doctor_id)}:loaded"))
+
+    def replace(self, doctor_id: int, entries: Iterable[tuple[float, int]]) -> None:
+        key = self._key(doctor_id)
+        pipe = self._redis.pipeline()
+        pipe.delete(key)
+        if mapping := {str(slot_id): start for start, slot_id in entries}:
+            pipe.zadd(key, mapping)
+        pipe.set(f"{key}:loaded", 1, ex=settings.AVAILABILITY_TTL)
+        pipe.execute()
+
+    def invalidate(self, doctor_id: int) -> None:
+        self._redis.delete(self._key(doctor_id), f"{self._key(doctor_id)}:loaded")
+
+    def add(self, doctor_id: int, start: float, slot_id: int) -> None:
+        if self.is_loaded(doctor_id):
+            self._redis.zadd(self._key(doctor_id), {str(slot_id): start})
+
+    def remove(self, doctor_id: int, start: float, slot_id: int) -> None:
+        self._redis.zrem(self._key(doctor_id), str(slot_id))
+
+    def range(self, doctor_id: int, after: float, limit: int) -> list[tuple[float, int]]:
+        rows = self._redis.zrangebyscore(self._key(doctor_id), after, "+inf", start=0, num=limit, withscores=True)
+        return [(score, int(member)) for member, score in rows]
+
+    def counts(self, doctor_id: int, bounds: list[float]) -> list[int]:
+        pipe = self._redis.pipeline()
+        for start, end in zip(bounds, bounds[1:], strict=False):
+            pipe.zcount(self._key(doctor_id), start, f"({end}")
+        return pipe.execute()
+
+
+_store = None
+
+
+def get_store() -> InMemoryAvailabilityStore | RedisAvailabilityStore:
+    global _store
+    if _store is None:
+        _store = import_string(settings.AVAILABILITY_STORE)()
+    return _store
+
+
+def _free_slots_query(doctor_ids: Iterable[int]):
+    return (
+        AppointmentSlot.objects.filter(doctor_id__in=doctor_ids, start__gte=timezone.now())
+        .filter(confirmed_booking__isnull=True)
+        .values_list("doctor_id", "start", "id")
+    )
+
+
+def ensure_loaded(doctor_ids: Iterable[int]) -> None:
+    """Load the index of every doctor that is not loaded yet, with a single query."""
+    store = get_store()
+    missing = [doctor_id for doctor_id in set(doctor_ids) if not store.is_loaded(doctor_id)]
+    if not missing:
+        return
+    entries: dict[int, list[tuple[float, int]]] = {doctor_id: [] for doctor_id in missing}
+    for doctor_id, start, slot_id in _free_slots_query(missing).iterator():
+        entries[doctor_id].append((start.timestamp(), slot_id))
+    for doctor_id, doctor_entries in entries.items():
+        store.replace(doctor_id, doctor_entries)
+
+
+def next_free_slots(doctor_id: int, after: datetime.datetime | None = None, limit: int = 10) -> list[tuple[datetime.datetime, int]]:
+    """Return up to `limit` `(start, slot_id)` pairs of free slots starting at or after `after`."""
+    ensure_loaded([doctor_id])
+    now = timezone.now()
+    after = max(after, now) if after else now
+    return [(datetime.datetime.fromtimestamp(start, datetime.UTC), slot_id) for start, slot_id in get_store().range(doctor_id, after.timestamp(), limit)]
+
+
+def free_counts_per_day(doctor_id: int, days: int = 30) -> dict[datetime.date, int]:
+    """Return the number of free slots on each of the next `days` days (in the current time zone)."""
+    ensure_loaded([doctor_id])
+    tz = timezone.get_current_timezone()
+    today = timezone.localdate()
+    dates = [today + datetime.timedelta(days=offset) for offset in range(days + 1)]
+    bounds = [datetime.datetime.combine(day, datetime.time.min, tz).timestamp() for day in dates]
+    # today's bucket starts now: slots earlier today have already passed
+    bounds[0] = max(bounds[0], timezone.now().timestamp())
+    return dict(zip(dates, get_store().counts(doctor_id, bounds), strict=False))
+
+
+def _apply(doctor_id: int | None, start: datetime.datetime, slot_id: int, free: bool) -> None:
+    if doctor_id is None:
+        return
+    store = get_store()
+    if free and start >= timezone.now():
+        store.add(doctor_id, start.timestamp(), slot_id)
+    else:
+        store.remove(doctor_id, start.timestamp(), slot_id)
+
+
+def on_slot_saved(slot: AppointmentSlot, created: bool) -> None:
+    previous = (getattr(slot, "_loaded_doctor_id", None), getattr(slot, "_loaded_start", None))
+    current = (slot.doctor_id, slot.start)
+    free = created or not Booking.objects.filter(confirmed_slot=slot).exists()
+
+    def apply():
+        if not created and previous != current and previous[1] is not None:
+            _apply(previous[0], previous[1], slot.pk, free=False)
+        _apply(slot.doctor_id, slot.start, slot.pk, free)
+
+    # robust: the write is committed already, a store (Redis) failure is logged instead of failing the request
+    transaction.on_commit(apply, robust=True)
+
+
+def on_slot_deleted(slot: AppointmentSlot) -> None:
+    # the instance's pk is cleared once delete() returns, capture it now
+    doctor_id, start, slot_id = slot.doctor_id, slot.start, slot.pk
+    transaction.on_commit(lambda: _apply(doctor_id, start, slot_id, free=False), robust=True)
+
+
+def on_booking_changed(booking: Booking, deleted: bool = False) -> None:
+    slot = booking.slot
+    if booking.status == Booking.Status.CONFIRMED and not deleted:
+        free = False
+    else:
+        # a cancelled/deleted booking frees the slot unless another booking holds it
+        free = not Booking.objects.filter(confirmed_slot_id=slot.pk).exclude(pk=booking.pk).exists()
+    transaction.on_commit(lambda: _apply(slot.doctor_id, slot.start, slot.pk, free), robust=True)
+
+    previous = None if deleted else getattr(booking, "_previous_state", None)
+    if previous is not None and previous[0] != slot.pk:
+        # the booking moved: its previous slot is free again unless another booking holds it
+        old = AppointmentSlot.objects.filter(pk=previous[0]).values_list("doctor_id", "start").first()
+        if old is not None:
+            old_free = not Booking.objects.filter(confirmed_slot_id=previous[0]).exclude(pk=booking.pk).exists()
+            transaction.on_commit(lambda: _apply(old[0], old[1], previous[0], old_free), robust=True)
+
+
+def invalidate(doctor_ids: Iterable[int | None]) -> None:
+    """Drop the index of the given doctors; used by bulk writes that bypass signals."""
+    store = get_store()
+    for doctor_id in set(doctor_ids):
+        if doctor_id is not None:
+            store.invalidate(doctor_id)
@@ -0,0 +1,90 @@
+import datetime
+from collections import Counter
+from collections.abc import Iterable
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import availability, events, occupancy
+from .models import AppointmentSlot, Booking
+from .notifications import enqueue
+from .signals import build_booking_notifications
+from .slot_cache import bump_slot_versions
+
+# Bulk writes go through bulk_create/bulk_update, which send no post_save signals. Each function
+# therefore does by hand what the Booking signal handlers do per row: one outbox insert for all
+# notifications, occupancy counters per day, slot events, and cache/availability invalidation after
+# commit.
+
+
+class SlotsUnavailable(ValueError):
+    """Some slots of a series cannot be booked; nothing was written."""
+
+    def __init__(self, slot_ids: Iterable[int]) -> None:
+        self.slot_ids = sorted(slot_ids)
+        super().__init__(f"Slots not available: {', '.join(map(str, self.slot_ids))}")
+
+
+def _after_commit(doctor_ids: set[int | None]) -> None:
+    transaction.on_commit(lambda: (bump_slot_versions(doctor_ids), availability.invalidate(doctor_ids)), robust=True)
+
+
+def book_series(user: User, slot_ids: Iterable[int], reason: str = "") -> list[Booking]:
+    """Book every slot in `slot_ids` for `user` in one transaction, or none of them.
+
+    Raises `SlotsUnavailable` when a slot does not exist, is in the past or is already booked,
+    including when another request books one of the slots concurrently.
+    """
+    slot_ids = set(slot_ids)
+    now = timezone.now()
+    slots = list(AppointmentSlot.objects.with_booking_state().filter(pk__in=slot_ids))
+    unavailable = slot_ids - {slot.pk for slot in slots} | {slot.pk for slot in slots if slot.start < now or slot.is_booked()}
+    if unavailable:
+        raise SlotsUnavailable(unavailable)
+
+    bookings = [Booking(slot=slot, confirmed_slot=slot, user=user, reason=reason, status=Booking.Status.CONFIRMED) for slot in slots]
+    try:
+        with transaction.atomic():
+            Booking.objects.bulk_create(bookings)
+            enqueue([message for booking in bookings for message in build_booking_notifications(booking, created=True)])
+            deltas: dict[occupancy.Cell, Counter] = {}
+            for slot in slots:
+                deltas.setdefault(occupancy.cell_of(slot), Counter())["confirmed"] += 1
+            occupancy.apply_deltas(deltas)
+            events.publish(events.SlotEvent(events.SLOT_BOOKED, slot.pk, slot.doctor_id, slot.start, free=False) for slot in slots)
+            _after_commit({slot.doctor_id for slot in slots})
+    except IntegrityError:
+        # lost a race on the unique `confirmed_slot` index for at least one slot
+        taken = set(Booking.objects.filter(confirmed_slot_id__in=slot_ids).values_list("confirmed_slot_id", flat=True))
+        if taken:
+            raise SlotsUnavailable(taken) from None
+        raise
+    return bookings
+
+
+def cancel_doctor_bookings(doctor_id: int, start: datetime.datetime, end: datetime.datetime) -> list[Booking]:
+    """Cancel all confirmed bookings of `doctor_id`'s slots starting in `[start, end)`."""
+    with transaction.atomic():
+        bookings = list(
+            Booking.objects.select_for_update()
+            .select_related("slot", "slot__doctor", "user")
+            .filter(slot__doctor_id=doctor_id, slot__start__gte=start, slot__start__lt=end, status=Booking.Status.CONFIRMED)
+        )
+        if not bookings:
+            return []
+        now = timezone.now()
+        deltas: dict[occupancy.Cell, Counter] = {}
+        for booking in bookings:
+            booking.status = Booking.Status.CANCELLED
+            booking.confirmed_slot = None
+            booking.updated_at = now
+            cell = deltas.setdefault(occupancy.cell_of(booking.slot), Counter())
+            cell["confirmed"] -= 1
+            cell["cancelled"] += 1
+        Booking.objects.bulk_update(bookings, ["status", "confirmed_slot", "updated_at"], batch_size=500)
+        enqueue([message for booking in bookings for message in build_booking_notifications(booking, created=False)])
+        occupancy.apply_deltas(deltas)
+        events.publish(events.SlotEvent(events.SLOT_FREED, booking.slot_id, doctor_id, booking.slot.start, free=True) for booking in bookings)
+        _after_commit({doctor_id})
+    return bookings
@@ -0,0 +1,93 @@
+from collections.abc import Iterable, Iterator
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # optional, only gzip is offered without it
+    brotli = None
+
+
+def accepted_encodings(header: str) -> set[str]:
+    """Content codings of an `Accept-Encoding` header that are not refused with `q=0`."""
+    codings = set()
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        quality = params.strip().removeprefix("q=") if params.strip().startswith("q=") else "1"
+        try:
+            if float(quality) > 0:
+                codings.add(coding.strip().lower())
+        except ValueError:
+            continue
+    return codings
+
+
+def _brotli_sequence(sequence: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = brotli.Compressor(quality=settings.RESPONSE_BROTLI_QUALITY)
+    for item in sequence:
+        # flush per chunk: every chunk of the stream reaches the client when it is produced
+        yield compressor.process(item) + compressor.flush()
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress large GET responses with brotli or gzip, as negotiated with `Accept-Encoding`.
+
+    Like Django's `GZipMiddleware`, but preferring brotli when the `brotli` package is installed and
+    leaving small, event stream and non-GET responses alone. Responses to POSTs (tokens, registration)
+    are not compressed so secrets are never compressed next to request input (BREACH).
+    """
+
+    # random padding of gzip output, see django.utils.text.compress_string
+    max_random_bytes = 100
+
+    def process_response(self, request, response):
+        if request.method not in ("GET", "HEAD") or response.has_header("Content-Encoding"):
+            return response
+        if response.streaming:
+            return self._compress_stream(request, response)
+        if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        if brotli is not None and "br" in accepted:
+            encoding, compressed = "br", brotli.compress(response.content, quality=settings.RESPONSE_BROTLI_QUALITY)
+        elif "gzip" in accepted:
+            encoding, compressed = "gzip", compress_string(response.content, max_random_bytes=self.max_random_bytes)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        response.headers["Content-Encoding"] = encoding
+        # the encoded body differs from the identity one, a strong ETag must become weak (RFC 9110 8.8.1)
+        if (etag := response.get("ETag")) and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        return response
+
+    def _compress_stream(self, request, response):
+        # exports are compressed chunk by chunk; event streams (async) must reach the client unbuffered
+        if response.is_async or response.get("Content-Type", "").startswith("text/event-stream"):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        if brotli is not None and "br" in accepted:
+            encoding, compressed = "br", _brotli_sequence(response.streaming_content)
+        elif "gzip" in accepted:
+            encoding, compressed = "gzip", compress_sequence(response.streaming_content, max_random_bytes=self.max_random_bytes)
+        else:
+            return response
+
+        response.streaming_content = compressed
+        del response.headers["Content-Length"]
+        response.headers["Content-Encoding"] = encoding
+        if (etag := response.get("ETag")) and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        return response
@@ -0,0 +1,211 @@
+import asyncio
+import contextlib
+import datetime
+import json
+import threading
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import AppointmentSlot, Booking
+
+# Slot availability changes are published after commit to a broker and streamed to clients by the
+# `/api/events/slots/` SSE view (see api.async_views), so an open calendar learns that a slot was
+# taken without polling the listing. Events are fed from the Booking/AppointmentSlot signals and by
+# hand from the bulk writers, which bypass signals.
+
+SLOT_CREATED = "slot-created"
+SLOT_BOOKED = "slot-booked"
+SLOT_FREED = "slot-freed"
+SLOT_DELETED = "slot-deleted"
+
+
+@dataclass(frozen=True)
+class SlotEvent:
+    kind: str
+    # None for slots inserted with bulk_create on databases that return no ids (MySQL)
+    slot_id: int | None
+    doctor_id: int | None
+    start: datetime.datetime
+    free: bool
+
+    def to_json(self) -> str:
+        return json.dumps({"type": self.kind, "slot": self.slot_id, "doctor": self.doctor_id, "start": self.start.isoformat(), "free": self.free})
+
+    @classmethod
+    def from_json(cls, raw: str | bytes) -> "SlotEvent":
+        data = json.loads(raw)
+        return cls(data["type"], data["slot"], data["doctor"], datetime.datetime.fromisoformat(data["start"]), data["free"])
+
+
+class SubscriptionOverflow(Exception):
+    """The subscriber fell too far behind; its client must reconnect and re-fetch."""
+
+
+class _Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._queue: asyncio.Queue[SlotEvent] = asyncio.Queue(maxsize=settings.SLOT_EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, events: list[SlotEvent]) -> None:
+        # publishers run in worker threads, the queue belongs to the subscriber's event loop
+        with contextlib.suppress(RuntimeError):
+            self._loop.call_soon_threadsafe(self._put, events)
+
+    def _put(self, events: list[SlotEvent]) -> None:
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.overflowed = True
+                return
+
+    async def get(self, timeout: float) -> SlotEvent | None:
+        """Return the next event, or None when none arrived within `timeout` seconds."""
+        if self.overflowed and self._queue.empty():
+            raise SubscriptionOverflow
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+
+class InMemoryBroker:
+    """Process-local broker.
+
+    Subscribers only see events published by the same process, so it suits a single ASGI worker
+    (or tests); run several workers with `RedisBroker`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscriptions: set[_Subscription] = set()
+
+    def publish(self, events: list[SlotEvent]) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.push(events)
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[_Subscription]:
+        subscription = _Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions.discard(subscription)
+
+
+class _RedisSubscription:
+    def __init__(self, pubsub) -> None:
+        self._pubsub = pubsub
+
+    async def get(self, timeout: float) -> SlotEvent | None:
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return SlotEvent.from_json(message["data"]) if message else None
+
+
+class RedisBroker:
+    """Broker backed by a Redis pub/sub channel, shared by all worker processes.
+
+    Requires the `redis` package and `SLOT_EVENTS_REDIS_URL`.
+    """
+
+    channel = "slot-events"
+
+    def __init__(self) -> None:
+        import redis
+
+        self._redis = redis.Redis.from_url(settings.SLOT_EVENTS_REDIS_URL)
+
+    def publish(self, events: list[SlotEvent]) -> None:
+        pipe = self._redis.pipeline(transaction=False)
+        for event in events:
+            pipe.publish(self.channel, event.to_json())
+        pipe.execute()
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[_RedisSubscription]:
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(settings.SLOT_EVENTS_REDIS_URL)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            yield _RedisSubscription(pubsub)
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+
+
+def get_broker() -> InMemoryBroker | RedisBroker:
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.SLOT_EVENTS_BROKER)()
+    return _broker
+
+
+def publish(events: Iterable[SlotEvent]) -> None:
+    """Publish `events` once the current transaction commits (immediately outside one)."""
+    if events := list(events):
+        # the write is committed already: a broker failure is logged, not raised into the request
+        transaction.on_commit(lambda: get_broker().publish(events), robust=True)
+
+
+def _event(kind: str, slot: AppointmentSlot, free: bool) -> SlotEvent:
+    return SlotEvent(kind, slot.pk, slot.doctor_id, slot.start, free)
+
+
+def on_slot_saved(slot: AppointmentSlot, created: bool) -> None:
+    if created:
+        publish([_event(SLOT_CREATED, slot, free=True)])
+        return
+    previous = (getattr(slot, "_loaded_doctor_id", slot.doctor_id), getattr(slot, "_loaded_start", slot.start))
+    if previous != (slot.doctor_id, slot.start):
+        # a moved slot leaves its old place in every calendar and appears at the new one
+        free = not Booking.objects.filter(confirmed_slot=slot).exists()
+        publish([SlotEvent(SLOT_DELETED, slot.pk, previous[0], previous[1], free=False), _event(SLOT_CREATED, slot, free)])
+
+
+def on_slot_deleted(slot: AppointmentSlot) -> None:
+    publish([_event(SLOT_DELETED, slot, free=False)])
+
+
+def on_booking_saved(booking: Booking, created: bool) -> None:
+    """Publish `slot-booked`/`slot-freed` when the booking takes or releases a slot."""
+    confirmed = booking.status == Booking.Status.CONFIRMED
+    if created:
+        if confirmed:
+            publish([_event(SLOT_BOOKED, booking.slot, free=False)])
+        return
+    if (previous := getattr(booking, "_previous_state", None)) is None:
+        # state before the save is unknown for instances not loaded from the database
+        publish([_event(SLOT_BOOKED if confirmed else SLOT_FREED, booking.slot, free=not confirmed)])
+        return
+    previous_slot_id, previous_status = previous
+    held = previous_slot_id if previous_status == Booking.Status.CONFIRMED else None
+    holds = booking.slot_id if confirmed else None
+    if held == holds:
+        return
+    events = []
+    if held is not None:
+        previous_slot = booking.slot if held == booking.slot_id else AppointmentSlot.objects.get(pk=held)
+        events.append(_event(SLOT_FREED, previous_slot, free=True))
+    if holds is not None:
+        events.append(_event(SLOT_BOOKED, booking.slot, free=False))
+    publish(events)
+
+
+def on_booking_deleted(booking: Booking) -> None:
+    if booking.status == Booking.Status.CONFIRMED:
+        publish([_event(SLOT_FREED, booking.slot, free=True)])
@@ -0,0 +1,133 @@
+import csv
+import datetime
+import heapq
+import io
+from collections.abc import Iterator, Sequence
+from itertools import chain, islice
+from operator import itemgetter
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .renderers import FastJSONRenderer
+
+if TYPE_CHECKING:
+    from django.db.models import QuerySet
+
+    from .models import Booking
+
+# Bookings are exported page by page: each page is one keyset query (`id > last id`, see
+# `iter_pages`) rendered to one chunk of the response, so memory stays at one page however many rows
+# match. Keyset pages bound memory on MySQL too, where the client library buffers whole result sets
+# and `QuerySet.iterator()` would not. Live and archived bookings are read side by side and merged
+# by id.
+
+EXPORT_FIELDS = (
+    "id",
+    "slot_id",
+    "slot__start",
+    "slot__doctor_id",
+    "slot__doctor__first_name",
+    "slot__doctor__last_name",
+    "user_id",
+    "user__username",
+    "status",
+    "reason",
+    "created_at",
+)
+
+# columns of the exported records, in order
+COLUMNS = ("id", "slot", "start", "doctor", "doctor_name", "user", "username", "status", "reason", "created_at")
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# leading characters that make spreadsheet applications evaluate a CSV cell as a formula
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def merged_pages(querysets: "Sequence[QuerySet[Booking]]", chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    """Pages of `iter_pages` over several querysets (live and archived bookings), merged in id order."""
+    if len(querysets) == 1:
+        yield from iter_pages(querysets[0], chunk_size)
+        return
+    rows = heapq.merge(*(chain.from_iterable(iter_pages(qs, chunk_size)) for qs in querysets), key=itemgetter("id"))
+    while page := list(islice(rows, chunk_size)):
+        yield page
+
+
+def iter_pages(qs: "QuerySet[Booking]", chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    """`.values(*EXPORT_FIELDS)` rows of `qs` in id order, `chunk_size` rows per query."""
+    rows = qs.order_by("id").values(*EXPORT_FIELDS)
+    last_id = None
+    while True:
+        page = list((rows if last_id is None else rows.filter(id__gt=last_id))[:chunk_size])
+        if page:
+            yield page
+        if len(page) < chunk_size:
+            return
+        last_id = page[-1]["id"]
+
+
+def _record(row: dict[str, Any]) -> dict[str, Any]:
+    doctor_name = None
+    if row["slot__doctor_id"] is not None:
+        doctor_name = f"{row['slot__doctor__first_name']} {row['slot__doctor__last_name']}".strip()
+    return {
+        "id": row["id"],
+        "slot": row["slot_id"],
+        "start": row["slot__start"],
+        "doctor": row["slot__doctor_id"],
+        "doctor_name": doctor_name,
+        "user": row["user_id"],
+        "username": row["user__username"],
+        "status": row["status"],
+        "reason": row["reason"],
+        "created_at": row["created_at"],
+    }
+
+
+def _csv_cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        # same format as the JSON renderers
+        value = value.isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(pages: Iterator[list[dict[str, Any]]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for page in pages:
+        for row in page:
+            writer.writerow([_csv_cell(value) for value in _record(row).values()])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # header only when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(pages: Iterator[list[dict[str, Any]]]) -> Iterator[bytes]:
+    renderer = FastJSONRenderer()
+    for page in pages:
+        yield b"".join(renderer.render(_record(row)) + b"\n" for row in page)
+
+
+def export_response(querysets: "Sequence[QuerySet[Booking]]", output: str, chunk_size: int | None = None) -> StreamingHttpResponse:
+    """Stream the bookings of `querysets` as one CSV or NDJSON attachment."""
+    # pick the database now: the rows are read after the routing middleware has returned
+    pages = merged_pages([qs.using(qs.db) for qs in querysets], chunk_size or settings.EXPORT_CHUNK_SIZE)
+    chunks = csv_chunks(pages) if output == "csv" else ndjson_chunks(pages)
+    filename = f"bookings-{timezone.localdate():%Y%m%d}.{output}"
+    return StreamingHttpResponse(chunks, content_type=FORMATS[output], headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -0,0 +1,52 @@
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from django.db.models import QuerySet
+
+    from .models import AppointmentSlot
+
+CALENDAR_FEED_FIELDS = (
+    "id",
+    "start",
+    "end",
+    "doctor_id",
+    "has_confirmed_booking",
+    "doctor__first_name",
+    "doctor__last_name",
+    "doctor__username",
+)
+
+
+def build_calendar_feed(qs: "QuerySet[AppointmentSlot]") -> dict[str, Any]:
+    """Build a columnar calendar payload straight from `values_list()` rows.
+
+    `qs` must be annotated with `has_confirmed_booking` (see `AppointmentSlotQuerySet.with_booking_state`).
+    Slots are returned as parallel arrays, doctor names once per doctor in a lookup table.
+    """
+    return calendar_feed_from_rows(qs.values_list(*CALENDAR_FEED_FIELDS).iterator())
+
+
+async def abuild_calendar_feed(qs: "QuerySet[AppointmentSlot]") -> dict[str, Any]:
+    """`build_calendar_feed` reading the rows with the async ORM."""
+    return calendar_feed_from_rows([row async for row in qs.values_list(*CALENDAR_FEED_FIELDS)])
+
+
+def calendar_feed_from_rows(rows: Iterable[tuple]) -> dict[str, Any]:
+    ids: list[int] = []
+    starts: list[int] = []
+    ends: list[int] = []
+    doctors: list[int | None] = []
+    booked: list[int] = []
+    doctor_names: dict[str, str] = {}
+
+    for slot_id, start, end, doctor_id, is_booked, first_name, last_name, username in rows:
+        ids.append(slot_id)
+        starts.append(int(start.timestamp()))
+        ends.append(int(end.timestamp()))
+        doctors.append(doctor_id)
+        booked.append(1 if is_booked else 0)
+        if doctor_id is not None and str(doctor_id) not in doctor_names:
+            doctor_names[str(doctor_id)] = f"{first_name} {last_name}".strip() or username
+
+    return {"ids": ids, "starts": starts, "ends": ends, "doctors": doctors, "booked": booked, "doctor_names": doctor_names}
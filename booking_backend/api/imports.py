@@ -0,0 +1,217 @@
+import bisect
+import csv
+import json
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from itertools import chain, islice
+from typing import IO, Any
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from . import events, occupancy
+from .models import AppointmentSlot, Booking
+from .roles import DOCTOR
+from .scheduling import create_slots, load_schedules, overlaps
+from .serializers import ImportRowSerializer
+
+# Imports of slots and their bookings (clinic migrations) from CSV or JSON. Rows are read as a stream
+# and handled in batches of IMPORT_BATCH_SIZE, each in three stages:
+#   1. field validation of every row (ImportRowSerializer),
+#   2. doctors and patients of the batch resolved with one `in_bulk` each,
+#   3. in one transaction holding the doctors' schedule locks: collisions checked against one range
+#      query of their slots, then `bulk_create` of the slots and bookings.
+# A row that fails a stage is reported with its line and skipped; the rest of the file is imported.
+# Imported bookings send no notifications: they were made before the migration.
+
+FORMATS = ("csv", "json")
+
+# `(line, row)`; a string row is a line that could not be parsed
+Row = tuple[int, dict[str, Any] | str]
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be read at all (unknown format, broken JSON array, bad encoding)."""
+
+
+@dataclass
+class RowError:
+    line: int
+    # field -> messages, like DRF validation errors
+    errors: dict[str, list[str]]
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    slots: int = 0
+    bookings: int = 0
+    error_count: int = 0
+    # the first IMPORT_MAX_ERRORS row errors
+    errors: list[RowError] = field(default_factory=list)
+
+    def add_error(self, line: int, errors: dict[str, list[str]]) -> None:
+        self.error_count += 1
+        if len(self.errors) < settings.IMPORT_MAX_ERRORS:
+            self.errors.append(RowError(line, errors))
+
+
+def format_for(filename: str) -> str:
+    """The import format of a file name: `.csv`, or `.json`/`.jsonl`/`.ndjson`."""
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension == "csv":
+        return "csv"
+    if extension in ("json", "jsonl", "ndjson"):
+        return "json"
+    raise ImportFormatError(f"Unsupported file type '.{extension}', expected .csv or .json")
+
+
+def read_rows(stream: IO[str], fmt: str) -> Iterator[Row]:
+    """Rows of a CSV file with a header line, of JSON lines, or of a JSON array (which is read whole)."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # empty cells are missing values
+            yield reader.line_num, {key: value for key, value in row.items() if key and value}
+        return
+
+    first = stream.readline()
+    if first.lstrip().startswith("["):
+        try:
+            items = json.loads(first + stream.read())
+        except ValueError as exc:
+            raise ImportFormatError(f"Invalid JSON: {exc}") from exc
+        if not isinstance(items, list):
+            raise ImportFormatError("Expected a JSON array of objects")
+        for number, item in enumerate(items, 1):
+            yield number, item if isinstance(item, dict) else "Expected a JSON object"
+        return
+
+    for number, line in enumerate(chain([first], stream), 1):
+        yield from _json_line(number, line)
+
+
+def _json_line(number: int, line: str) -> Iterator[Row]:
+    if not line.strip():
+        return
+    try:
+        item = json.loads(line)
+    except ValueError as exc:
+        yield number, f"Invalid JSON: {exc}"
+        return
+    yield number, item if isinstance(item, dict) else "Expected a JSON object"
+
+
+def import_rows(rows: Iterable[Row], batch_size: int | None = None, dry_run: bool = False) -> ImportResult:
+    """Validate and import `rows` batch by batch; a dry run validates everything and writes nothing."""
+    result = ImportResult()
+    rows = iter(rows)
+    try:
+        while batch := list(islice(rows, batch_size or settings.IMPORT_BATCH_SIZE)):
+            _import_batch(batch, result, dry_run)
+    except UnicodeDecodeError as exc:
+        raise ImportFormatError(f"File is not UTF-8: {exc}") from exc
+    return result
+
+
+def _import_batch(batch: list[Row], result: ImportResult, dry_run: bool) -> None:
+    result.rows += len(batch)
+    resolved, patients = _resolve(_validate(batch, result), result)
+    if not resolved:
+        return
+
+    lines: list[int] = []
+    try:
+        with transaction.atomic():
+            lines, slots, bookings = _place(resolved, patients, result)
+            if not dry_run:
+                create_slots(slots)
+                _create_bookings(bookings)
+    except IntegrityError as exc:
+        # a concurrent write conflicted, nothing of this batch was written
+        for line in lines:
+            result.add_error(line, {"non_field_errors": [f"Not imported, the batch was rolled back: {exc}"]})
+        return
+    result.slots += len(slots)
+    result.bookings += len(bookings)
+
+
+def _validate(batch: list[Row], result: ImportResult) -> list[tuple[int, dict[str, Any]]]:
+    valid = []
+    for line, row in batch:
+        if isinstance(row, str):
+            result.add_error(line, {"non_field_errors": [row]})
+            continue
+        serializer = ImportRowSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((line, serializer.validated_data))
+        else:
+            result.add_error(line, {name: [str(message) for message in messages] for name, messages in serializer.errors.items()})
+    return valid
+
+
+def _resolve(valid: list[tuple[int, dict[str, Any]]], result: ImportResult) -> tuple[list[tuple[int, dict[str, Any], int]], dict[str, User]]:
+    """Rows whose doctor and patient exist, with the doctor's id, and the patients by username."""
+    doctors = User.objects.filter(username__in={row["doctor"] for _, row in valid}, groups__name=DOCTOR).in_bulk(field_name="username")
+    patients = User.objects.filter(username__in={row["patient"] for _, row in valid if "patient" in row}).in_bulk(field_name="username")
+    resolved = []
+    for line, row in valid:
+        errors = {}
+        if row["doctor"] not in doctors:
+            errors["doctor"] = [f"Unknown doctor '{row['doctor']}'"]
+        if "patient" in row and row["patient"] not in patients:
+            errors["patient"] = [f"Unknown user '{row['patient']}'"]
+        if errors:
+            result.add_error(line, errors)
+        else:
+            resolved.append((line, row, doctors[row["doctor"]].id))
+    return resolved, patients
+
+
+def _place(
+    resolved: list[tuple[int, dict[str, Any], int]], patients: dict[str, User], result: ImportResult
+) -> tuple[list[int], list[AppointmentSlot], list[Booking]]:
+    """Lines, slots and bookings of the rows that collide with no slot of the database or of the batch."""
+    doctor_ids = sorted({doctor_id for _, _, doctor_id in resolved})
+    # lock the schedules like api.scheduling.ensure_free_interval
+    list(User.objects.select_for_update().filter(pk__in=doctor_ids).values_list("pk", flat=True))
+    schedules = load_schedules(doctor_ids, min(row["start"] for _, row, _ in resolved), max(row["end"] for _, row, _ in resolved))
+
+    lines, slots, bookings = [], [], []
+    for line, row, doctor_id in resolved:
+        intervals = schedules[doctor_id]
+        start, end = row["start"], row["end"]
+        index = bisect.bisect_left(intervals, (start, end))
+        if index < len(intervals) and intervals[index] == (start, end):
+            result.add_error(line, {"start": ["Slot already exists"]})
+            continue
+        if overlaps(intervals, start, end, index):
+            result.add_error(line, {"start": ["Overlaps another slot of the doctor"]})
+            continue
+        intervals.insert(index, (start, end))
+        slot = AppointmentSlot(doctor_id=doctor_id, start=start, end=end)
+        lines.append(line)
+        slots.append(slot)
+        if "status" in row:
+            bookings.append(Booking(slot=slot, user=patients.get(row.get("patient")), reason=row["reason"], status=row["status"]))
+    return lines, slots, bookings
+
+
+def _create_bookings(bookings: list[Booking]) -> None:
+    """Insert `bookings` of just created slots and do what the Booking signal handlers would, except notifying."""
+    if not bookings:
+        return
+    deltas: dict[occupancy.Cell, Counter] = {}
+    for booking in bookings:
+        # bulk_create takes the ids create_slots set on the slots
+        booking.confirmed_slot = booking.slot if booking.status == Booking.Status.CONFIRMED else None
+        deltas.setdefault(occupancy.cell_of(booking.slot), Counter())[occupancy.STATUS_COLUMNS[booking.status]] += 1
+    Booking.objects.bulk_create(bookings)
+    occupancy.apply_deltas(deltas)
+    events.publish(
+        events.SlotEvent(events.SLOT_BOOKED, booking.slot_id, booking.slot.doctor_id, booking.slot.start, free=False)
+        for booking in bookings
+        if booking.status == Booking.Status.CONFIRMED
+    )
@@ -0,0 +1,309 @@
+import bisect
+import logging
+import os
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+if TYPE_CHECKING:
+    from django.http import HttpRequest, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+# upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+METRICS_KEY_PREFIX = "request-metrics:"
+# number of worker snapshot keys handed out; worker n publishes under f"{METRICS_KEY_PREFIX}{n}"
+METRICS_WORKERS_KEY = "request-metrics:workers"
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised instead of logging when `QUERY_BUDGET_STRICT` is enabled (tests)."""
+
+
+@dataclass
+class RequestMetrics:
+    tag: str = ""
+    queries: int = 0
+    db_seconds: float = 0.0
+    serialize_seconds: float = 0.0
+    total_seconds: float = 0.0
+    budget: int | None = None
+    # nesting depth of `serialization_timer` blocks, only the outermost one is timed
+    _serialize_depth: int = 0
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.queries > self.budget
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries", '
+            f"serialize;dur={self.serialize_seconds * 1000:.2f}, "
+            f"total;dur={self.total_seconds * 1000:.2f}"
+        )
+
+
+_current: ContextVar[RequestMetrics | None] = ContextVar("request_metrics", default=None)
+
+
+@contextmanager
+def serialization_timer() -> Iterator[None]:
+    """Attribute the wrapped block to serializer time of the current request.
+
+    Database time spent inside the block (lazy relation loads, iterated querysets) is not counted twice.
+    """
+    metrics = _current.get()
+    if metrics is None or metrics._serialize_depth:
+        yield
+        return
+    metrics._serialize_depth += 1
+    db_before = metrics.db_seconds
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialize_seconds += time.perf_counter() - started - (metrics.db_seconds - db_before)
+        metrics._serialize_depth -= 1
+
+
+class InstrumentedSerializerMixin:
+    """Count `to_representation` of a serializer towards the request's serializer time."""
+
+    def to_representation(self, instance: Any) -> Any:
+        with serialization_timer():
+            return super().to_representation(instance)
+
+
+@dataclass
+class _Aggregate:
+    count: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    db_ms: float = 0.0
+    serialize_ms: float = 0.0
+    total_ms: float = 0.0
+    over_budget: int = 0
+    latency_buckets: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+
+    def add(self, metrics: RequestMetrics) -> None:
+        total_ms = metrics.total_seconds * 1000
+        self.count += 1
+        self.queries += metrics.queries
+        self.max_queries = max(self.max_queries, metrics.queries)
+        self.db_ms += metrics.db_seconds * 1000
+        self.serialize_ms += metrics.serialize_seconds * 1000
+        self.total_ms += total_ms
+        self.over_budget += metrics.over_budget
+        self.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, total_ms)] += 1
+
+    def merge(self, other: dict[str, Any]) -> None:
+        self.count += other["count"]
+        self.queries += other["queries"]
+        self.max_queries = max(self.max_queries, other["max_queries"])
+        self.db_ms += other["db_ms"]
+        self.serialize_ms += other["serialize_ms"]
+        self.total_ms += other["total_ms"]
+        self.over_budget += other["over_budget"]
+        self.latency_buckets = [a + b for a, b in zip(self.latency_buckets, other["latency_buckets"], strict=True)]
+
+
+class MetricsRegistry:
+    """Per-process aggregate of request metrics, periodically published to the cache.
+
+    Each worker process writes its snapshot under its own numbered key, taken from an atomic counter
+    so concurrent workers never overwrite a shared index; `request_metrics` merges them. A worker
+    registers again when the counter is lost or its key was handed to another worker.
+    Use a shared cache backend (`CACHE_URL`) to see metrics of the web workers from another process.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._aggregates: dict[str, _Aggregate] = {}
+        self._last_flush = time.monotonic()
+        # (pid, owner id, number) of the published key: a worker forked after a flush must take a key of its own
+        self._key: tuple[int, str, int] | None = None
+
+    def record(self, metrics: RequestMetrics) -> None:
+        with self._lock:
+            self._aggregates.setdefault(metrics.tag, _Aggregate()).add(metrics)
+            flush = time.monotonic() - self._last_flush >= settings.REQUEST_METRICS_FLUSH_SECONDS
+        if flush:
+            self.flush()
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {tag: vars(aggregate).copy() | {"latency_buckets": list(aggregate.latency_buckets)} for tag, aggregate in self._aggregates.items()}
+
+    def _register(self) -> tuple[int, str, int]:
+        while True:
+            # add() is a no-op when the counter exists; incr() is atomic on memcached/redis and locmem
+            cache.add(METRICS_WORKERS_KEY, 0, timeout=None)
+            try:
+                number = cache.incr(METRICS_WORKERS_KEY)
+            except ValueError:
+                # counter evicted between add() and incr()
+                continue
+            return os.getpid(), uuid.uuid4().hex, number
+
+    def _worker_key(self) -> tuple[str, str]:
+        """`(key, owner)` to publish under, registering again when the key may not be this worker's any more."""
+        if self._key is None or self._key[0] != os.getpid():
+            self._key = self._register()
+        else:
+            _, owner, number = self._key
+            published = cache.get_many([METRICS_WORKERS_KEY, f"{METRICS_KEY_PREFIX}{number}"])
+            # the counter was lost (eviction, restart, clear) and the collector no longer lists the key,
+            # or it was handed out again and another worker publishes under it
+            current = published.get(f"{METRICS_KEY_PREFIX}{number}")
+            if published.get(METRICS_WORKERS_KEY, 0) < number or (current is not None and current["owner"] != owner):
+                self._key = self._register()
+        _, owner, number = self._key
+        return f"{METRICS_KEY_PREFIX}{number}", owner
+
+    def flush(self) -> None:
+        key, owner = self._worker_key()
+        cache.set(key, {"owner": owner, "flushed_at": time.time(), "metrics": self.snapshot()}, timeout=None)
+        self._last_flush = time.monotonic()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._aggregates.clear()
+
+
+registry = MetricsRegistry()
+
+
+def collect_published_metrics() -> dict[str, _Aggregate]:
+    """Merge the snapshots published by all worker processes."""
+    merged: dict[str, _Aggregate] = {}
+    # a worker that registered again may also have left a snapshot under its previous key, use its latest
+    latest: dict[str, dict[str, Any]] = {}
+    for published in cache.get_many(_worker_keys()).values():
+        if published["owner"] not in latest or published["flushed_at"] > latest[published["owner"]]["flushed_at"]:
+            latest[published["owner"]] = published
+    for published in latest.values():
+        for tag, data in published["metrics"].items():
+            merged.setdefault(tag, _Aggregate()).merge(data)
+    return merged
+
+
+def _worker_keys() -> list[str]:
+    return [f"{METRICS_KEY_PREFIX}{number}" for number in range(1, cache.get(METRICS_WORKERS_KEY, 0) + 1)]
+
+
+def clear_published_metrics() -> None:
+    # the counter stays: running workers keep the keys they were given
+    cache.delete_many(_worker_keys())
+    registry.reset()
+
+
+def _view_tag(request: "HttpRequest") -> tuple[str, int | None]:
+    """Return `ViewSet.action` for the resolved view and the query budget declared for it."""
+    match = getattr(request, "resolver_match", None)
+    func = getattr(match, "func", None)
+    view_class = getattr(func, "cls", None) or getattr(func, "view_class", None)
+    if view_class is None:
+        # function views may declare a `query_budget` attribute
+        return (match.view_name if match else "unresolved"), getattr(func, "query_budget", None)
+    actions = getattr(func, "actions", None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    budget = getattr(view_class, "query_budgets", {}).get(action)
+    return f"{view_class.__name__}.{action}", budget
+
+
+class RequestMetricsMiddleware:
+    """Record query count, DB time, serializer time and total time of every request.
+
+    Metrics are returned in a `Server-Timing` header, aggregated per `ViewSet.action` in `registry`
+    and checked against the `query_budgets` declared on the view. Works for sync and async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[["HttpRequest"], "HttpResponse"]) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: "HttpRequest") -> "HttpResponse":
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with self._record_queries(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    async def __acall__(self, request: "HttpRequest") -> "HttpResponse":
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with self._record_queries(metrics):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    @staticmethod
+    @contextmanager
+    def _record_queries(metrics: RequestMetrics) -> Iterator[None]:
+        def record_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                metrics.queries += 1
+                metrics.db_seconds += time.perf_counter() - started
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            yield
+
+    def _finish(self, request: "HttpRequest", response: "HttpResponse", metrics: RequestMetrics, started: float) -> "HttpResponse":
+        metrics.total_seconds = time.perf_counter() - started
+        metrics.tag, metrics.budget = _view_tag(request)
+        response["Server-Timing"] = metrics.server_timing()
+        registry.record(metrics)
+        for listener in list(_listeners):
+            listener(metrics)
+
+        if metrics.over_budget:
+            message = f"{metrics.tag} issued {metrics.queries} queries, budget is {metrics.budget} ({request.method} {request.path})"
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
+
+
+_listeners: list[Callable[[RequestMetrics], None]] = []
+
+
+@contextmanager
+def capture_request_metrics() -> Iterator[list[RequestMetrics]]:
+    """Test helper collecting the metrics of every request handled inside the block."""
+    captured: list[RequestMetrics] = []
+    _listeners.append(captured.append)
+    try:
+        yield captured
+    finally:
+        _listeners.remove(captured.append)
@@ -0,0 +1,41 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.archive import archive_before, retention_cutoff
+
+
+def _date(value: str) -> datetime.date:
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError as exc:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD") from exc
+
+
+class Command(BaseCommand):
+    help = "Move slots older than the retention window, with their bookings, to the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", type=_date, help="Archive slots ending before this day (default: ARCHIVE_RETENTION_DAYS ago)")
+        parser.add_argument("--batch-size", type=int, default=None, help="Slots per transaction (default: ARCHIVE_BATCH_SIZE)")
+        parser.add_argument("--loop", action="store_true", help="Keep archiving as slots age out instead of exiting")
+        parser.add_argument("--interval", type=float, default=3600.0, help="Seconds to sleep between runs in --loop mode")
+
+    def handle(self, *args, **options):
+        while True:
+            # the connection is idle for --interval between runs: replace it once stale or dropped
+            close_old_connections()
+            if options["before"]:
+                cutoff = datetime.datetime.combine(options["before"], datetime.time.min, timezone.get_current_timezone())
+            else:
+                cutoff = retention_cutoff()
+            started = time.perf_counter()
+            result = archive_before(cutoff, options["batch_size"])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f"Archived {result.slots} slots and {result.bookings} bookings before {cutoff.isoformat()} in {elapsed:.3f}s"))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,43 @@
+import dataclasses
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import FORMATS, ImportFormatError, format_for, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import slots and their bookings from a CSV or JSON file, reporting rows that cannot be imported"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file with a header line (doctor,start,end,patient,status,reason), JSON array or JSON lines")
+        parser.add_argument("--format", choices=FORMATS, help="File format (default: from the file extension)")
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per validation batch and transaction (default: IMPORT_BATCH_SIZE)")
+        parser.add_argument("--dry-run", action="store_true", help="Validate the file without writing anything")
+        parser.add_argument("--json", action="store_true", help="Print the result, including row errors, as JSON")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            fmt = options["format"] or format_for(options["path"])
+            with open(options["path"], encoding="utf-8-sig", newline="") as fh:
+                result = import_rows(read_rows(fh, fmt), options["batch_size"], options["dry_run"])
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(f"Cannot import {options['path']}: {exc}") from exc
+
+        if options["json"]:
+            self.stdout.write(json.dumps(dataclasses.asdict(result)))
+            return
+        for error in result.errors:
+            messages = "; ".join(f"{name}: {' '.join(texts)}" for name, texts in error.errors.items())
+            self.stdout.write(self.style.ERROR(f"line {error.line}: {messages}"))
+        if result.error_count > len(result.errors):
+            self.stdout.write(self.style.ERROR(f"... {result.error_count - len(result.errors)} more rows with errors"))
+        verb = "Would import" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {result.slots} slots and {result.bookings} bookings from {result.rows} rows, "
+                f"{result.error_count} rows skipped, in {time.perf_counter() - started:.3f}s"
+            )
+        )
@@ -1,38 +1,92 @@
 import datetime
+import json
+import time
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 
-from api.models import AppointmentSlot
+from api.scheduling import WEEKDAYS, WeeklyTemplate, create_slots, plan_slots
 
 User = get_user_model()
 
 
 class Command(BaseCommand):
-    help = "Populate appointment slots for next N days"
+    help = "Populate appointment slots for next N days from per-doctor weekly templates"
 
     def add_arguments(self, parser):
         parser.add_argument("--days", type=int, default=14)
         parser.add_argument("--start-hour", type=int, default=9)
         parser.add_argument("--end-hour", type=int, default=17)
+        parser.add_argument(
+            "--template",
+            help=(
+                "JSON file mapping doctor usernames to weekly templates, e.g. "
+                '{"doctor1": {"hours": {"mon": [["09:00", "17:00"]]}, "slot_minutes": 30, "breaks": [["12:00", "13:00"]], "holidays": ["2026-12-24"]}}. '
+                "Without it the demo doctors work Monday-Friday from --start-hour to --end-hour in one hour slots."
+            ),
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT statement")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many slots would be created")
 
     def handle(self, *args, **options):
-        days = options["days"]
-        start_hour = options["start_hour"]
-        end_hour = options["end_hour"]
-        now = timezone.now()
-        added = 0
-        # ensure 'doctor' group exists
-        doctor_group, _ = Group.objects.get_or_create(name="doctor")
+        started = time.perf_counter()
+        if options["template"]:
+            templates = self._load_templates(options["template"])
+        else:
+            templates = self._default_templates(options["start_hour"], options["end_hour"], options["dry_run"])
 
-        # create two doctor users if they don't exist
+        first_day = timezone.localdate()
+        last_day = first_day + datetime.timedelta(days=options["days"] - 1)
+        plan = plan_slots(templates, first_day, last_day)
+        planned = time.perf_counter()
+
+        self.stdout.write(
+            f"{len(templates)} doctors, {first_day} - {last_day}: {plan.candidates} candidate slots, "
+            f"{plan.existing} already exist, {plan.overlapping} overlap other slots, {len(plan.slots)} to create (planned in {planned - started:.3f}s)"
+        )
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run, nothing written"))
+            return
+
+        created = create_slots(plan.slots, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Added {created} slots in {time.perf_counter() - planned:.3f}s"))
+
+    def _load_templates(self, path: str) -> list[WeeklyTemplate]:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read template file: {exc}") from exc
+
+        doctors = User.objects.filter(username__in=data.keys(), groups__name="doctor").in_bulk(field_name="username")
+        if missing := sorted(set(data) - set(doctors)):
+            raise CommandError(f"Unknown doctors in template: {', '.join(missing)}")
+        try:
+            return [WeeklyTemplate.from_dict(doctors[username].id, template) for username, template in data.items()]
+        except (TypeError, ValueError) as exc:
+            raise CommandError(f"Invalid template: {exc}") from exc
+
+    def _default_templates(self, start_hour: int, end_hour: int, dry_run: bool = False) -> list[WeeklyTemplate]:
         doctors_info = [
             {"username": "doctor1", "first_name": "Anna", "last_name": ""},
             {"username": "doctor2", "first_name": "Jan", "last_name": ""},
         ]
-        doctor_users = []
+        hours = {"hours": {day: [[f"{start_hour:02d}:00", f"{end_hour:02d}:00"]] for day in WEEKDAYS[:5]}}
+        if dry_run:
+            # plan for the demo doctors that exist, without creating users or group memberships
+            existing = User.objects.filter(username__in=[info["username"] for info in doctors_info]).in_bulk(field_name="username")
+            for info in doctors_info:
+                if info["username"] not in existing:
+                    self.stdout.write(f"Would create user {info['username']}; its slots are not counted")
+            return [WeeklyTemplate.from_dict(user.id, hours) for user in existing.values()]
+
+        # ensure 'doctor' group exists
+        doctor_group, _ = Group.objects.get_or_create(name="doctor")
+
+        # create two doctor users if they don't exist
+        templates = []
         for info in doctors_info:
             user, created = User.objects.get_or_create(
                 username=info["username"],
@@ -49,27 +103,5 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.SUCCESS(f"Created user {user.username} (no password set)"))
             # assign to doctor group
             user.groups.add(doctor_group)
-            user.save()
-            doctor_users.append(user)
-
-        rr = 0
-        for day in range(days):
-            day_date = (now + datetime.timedelta(days=day)).replace(hour=0, minute=0, second=0, microsecond=0)
-            # Skip weekends
-            if day_date.weekday() >= 5:
-                continue
-            for hour in range(start_hour, end_hour):
-                start = day_date + datetime.timedelta(hours=hour)
-                slot, created = AppointmentSlot.objects.get_or_create(start=start)
-                # if slot has no doctor assigned, distribute round-robin between our two doctors
-                if created or slot.doctor is None:
-                    assign_doctor = doctor_users[rr % len(doctor_users)]
-                    slot.doctor = assign_doctor
-                    slot.save()
-                    rr += 1
-                added += 1
-        self.stdout.write(self.style.SUCCESS(f"Added/ensured {added} slots"))
-        # report distribution
-        for user in doctor_users:
-            count = AppointmentSlot.objects.filter(doctor=user).count()
-            self.stdout.write(self.style.SUCCESS(f"Doctor {user.get_full_name() or user.username} has {count} assigned slots"))
+            templates.append(WeeklyTemplate.from_dict(user.id, hours))
+        return templates
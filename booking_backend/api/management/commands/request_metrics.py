@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.instrumentation import LATENCY_BUCKETS_MS, clear_published_metrics, collect_published_metrics
+
+
+class Command(BaseCommand):
+    help = "Show per-endpoint request metrics aggregated by RequestMetricsMiddleware across worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Print raw aggregates as JSON")
+        parser.add_argument("--reset", action="store_true", help="Clear published metrics after printing")
+
+    def handle(self, *args, **options):
+        aggregates = collect_published_metrics()
+        if options["json"]:
+            data = {tag: vars(aggregate) for tag, aggregate in sorted(aggregates.items())}
+            self.stdout.write(json.dumps({"latency_buckets_ms": LATENCY_BUCKETS_MS, "endpoints": data}, indent=2))
+        elif not aggregates:
+            self.stdout.write(self.style.WARNING("No metrics published yet (workers publish every REQUEST_METRICS_FLUSH_SECONDS to the shared cache)"))
+        else:
+            labels = [f"<{bound}" for bound in LATENCY_BUCKETS_MS] + [f">={LATENCY_BUCKETS_MS[-1]}"]
+            self.stdout.write(f"{'endpoint':<40}{'requests':>9}{'avg q':>7}{'max q':>7}{'over':>6}{'db ms':>9}{'ser ms':>9}{'total ms':>10}  latency ms")
+            for tag, agg in sorted(aggregates.items(), key=lambda item: -item[1].total_ms):
+                histogram = " ".join(f"{label}:{count}" for label, count in zip(labels, agg.latency_buckets, strict=True) if count)
+                self.stdout.write(
+                    f"{tag:<40}{agg.count:>9}{agg.queries / agg.count:>7.1f}{agg.max_queries:>7}{agg.over_budget:>6}"
+                    f"{agg.db_ms / agg.count:>9.2f}{agg.serialize_ms / agg.count:>9.2f}{agg.total_ms / agg.count:>10.2f}  {histogram}"
+                )
+
+        if options["reset"]:
+            clear_published_metrics()
+            self.stdout.write(self.style.SUCCESS("Published metrics cleared"))
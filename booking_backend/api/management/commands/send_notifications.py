@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.notifications import deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver queued email notifications from the outbox in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Notifications per batch (default: NOTIFICATION_BATCH_SIZE)")
+        parser.add_argument("--max-attempts", type=int, default=None, help="Attempts before a notification is marked failed")
+        parser.add_argument("--loop", action="store_true", help="Keep polling the outbox instead of exiting when it is drained")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep between polls in --loop mode")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            # a long-running worker outlives CONN_MAX_AGE and database restarts: drop stale connections
+            # like the request cycle does
+            close_old_connections()
+            sent, failed = deliver_pending(options["batch_size"], options["max_attempts"])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(self.style.SUCCESS(f"Sent {sent} notifications, {failed} failed permanently"))
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {total_sent} sent, {total_failed} failed permanently"))
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 06:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointmentslot',
+            index=models.Index(fields=['start', 'id'], name='api_appoint_start_b3def1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at', 'id'], name='api_booking_created_eb3d3f_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 06:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_confirmed_slot(apps, schema_editor):
+    # the earliest confirmed booking of a slot keeps it; later duplicates (if any) stay unlinked
+    Booking = apps.get_model("api", "Booking")
+    seen = set()
+    updates = []
+    for booking_id, slot_id in Booking.objects.filter(status="confirmed").order_by("id").values_list("id", "slot_id").iterator():
+        if slot_id not in seen:
+            seen.add(slot_id)
+            updates.append(Booking(id=booking_id, confirmed_slot_id=slot_id))
+    Booking.objects.bulk_update(updates, ["confirmed_slot"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='confirmed_slot',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='confirmed_booking', to='api.appointmentslot'),
+        ),
+        migrations.RunPython(backfill_confirmed_slot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-18 06:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+def populate_occupancy(apps, schema_editor):
+    # same aggregation as api.occupancy.rebuild, on the historical models
+    AppointmentSlot = apps.get_model("api", "AppointmentSlot")
+    DailyOccupancy = apps.get_model("api", "DailyOccupancy")
+    rows = (
+        AppointmentSlot.objects.annotate(day=TruncDate("start"))
+        .values("day", "doctor_id")
+        .annotate(
+            total_slots=Count("id", distinct=True),
+            confirmed=Count("bookings", filter=Q(bookings__status="confirmed")),
+            cancelled=Count("bookings", filter=Q(bookings__status="cancelled")),
+        )
+        .order_by()
+    )
+    DailyOccupancy.objects.bulk_create([DailyOccupancy(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_booking_confirmed_slot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total_slots', models.IntegerField(default=0)),
+                ('confirmed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_occupancy', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'daily occupancy',
+                'ordering': ['day', 'id'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'doctor'), name='daily_occupancy_day_doctor')],
+            },
+        ),
+        migrations.RunPython(populate_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_end(apps, schema_editor):
+    # existing slots were generated one hour long
+    AppointmentSlot = apps.get_model("api", "AppointmentSlot")
+    AppointmentSlot.objects.update(end=F("start") + datetime.timedelta(hours=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_daily_occupancy'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointmentslot',
+            name='end',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(populate_end, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='appointmentslot',
+            name='end',
+            field=models.DateTimeField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentslot',
+            index=models.Index(fields=['doctor', 'start', 'end'], name='api_appoint_doctor__ad2228_idx'),
+        ),
+    ]
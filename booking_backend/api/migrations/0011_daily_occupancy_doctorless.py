@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 11:40
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailyoccupancy',
+            name='daily_occupancy_day_doctor',
+        ),
+        migrations.AddConstraint(
+            model_name='dailyoccupancy',
+            constraint=models.UniqueConstraint(models.F('day'), django.db.models.functions.comparison.Coalesce('doctor', 0), name='daily_occupancy_day_doctor'),
+        ),
+    ]
@@ -1,13 +1,41 @@
 from __future__ import annotations
 
+import datetime
+
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
+class AppointmentSlotQuerySet(models.QuerySet):
+    def with_booking_state(self) -> "AppointmentSlotQuerySet":
+        """Join the doctor and annotate confirmed-booking state in the same query."""
+        confirmed = Booking.objects.filter(slot=models.OuterRef("pk"), status=Booking.Status.CONFIRMED)
+        return self.select_related("doctor").annotate(has_confirmed_booking=models.Exists(confirmed))
+
+    def overlapping(self, doctor_id: int | None, start: datetime.datetime, end: datetime.datetime) -> "AppointmentSlotQuerySet":
+        """Slots of `doctor_id` intersecting `[start, end)`.
+
+        No slot is longer than `SLOT_MAX_MINUTES`, which bounds `start` on both sides: the query is a
+        short range scan of the `(doctor, start, end)` index however many slots the doctor has.
+        """
+        earliest = start - datetime.timedelta(minutes=settings.SLOT_MAX_MINUTES)
+        return self.filter(doctor_id=doctor_id, start__gt=earliest, start__lt=end, end__gt=start)
+
+    def bulk_create(self, objs, *args, **kwargs) -> list[AppointmentSlot]:
+        objs = list(objs)
+        for slot in objs:
+            slot.set_default_end()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class AppointmentSlot(models.Model):
     start = models.DateTimeField(db_index=True)
+    # exclusive; `SLOT_DEFAULT_MINUTES` after `start` when not given
+    end = models.DateTimeField(blank=True)
     # nullable doctor (user) assignment for clinic context
     doctor = models.ForeignKey(
         User,
@@ -18,14 +46,44 @@ class AppointmentSlot(models.Model):
         limit_choices_to={"groups__name": "doctor"},
     )
 
+    objects = AppointmentSlotQuerySet.as_manager()
+
     class Meta:
         ordering = ["start"]
+        indexes = [
+            # keyset pagination order (see api.pagination.SlotPagination)
+            models.Index(fields=["start", "id"]),
+            # overlap checks of a doctor's schedule (see AppointmentSlotQuerySet.overlapping)
+            models.Index(fields=["doctor", "start", "end"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.start.isoformat()}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values) -> "AppointmentSlot":
+        instance = super().from_db(db, field_names, values)
+        # remember the stored doctor and start so signal handlers can tell when a slot was moved
+        instance._loaded_doctor_id = instance.__dict__.get("doctor_id")
+        instance._loaded_start = instance.__dict__.get("start")
+        return instance
+
+    def save(self, *args, **kwargs) -> None:
+        self.set_default_end()
+        super().save(*args, **kwargs)
+
+    def set_default_end(self) -> None:
+        if self.end is None and self.start is not None:
+            self.end = self.start + datetime.timedelta(minutes=settings.SLOT_DEFAULT_MINUTES)
+
     def is_booked(self) -> bool:
-        """Check if slot has any confirmed booking."""
+        """Check if slot has any confirmed booking.
+
+        Uses the `has_confirmed_booking` annotation when the slot was loaded through
+        `with_booking_state()`, otherwise falls back to a query.
+        """
+        if (booked := getattr(self, "has_confirmed_booking", None)) is not None:
+            return booked
         return self.bookings.filter(status=Booking.Status.CONFIRMED).exists()
 
 
@@ -46,6 +104,16 @@ class Booking(models.Model):
     # optional reason/notes for appointment
     reason = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.CONFIRMED, db_index=True)
+    # mirrors `slot` while the booking is confirmed and is NULL otherwise; the unique index on it lets
+    # the database reject a second confirmed booking for a slot (MySQL has no partial unique indexes)
+    confirmed_slot = models.OneToOneField(
+        AppointmentSlot,
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.CASCADE,
+        related_name="confirmed_booking",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -54,6 +122,8 @@ class Booking(models.Model):
         indexes = [
             models.Index(fields=["slot", "status"]),
             models.Index(fields=["user", "status"]),
+            # keyset pagination order (see api.pagination.BookingPagination)
+            models.Index(fields=["created_at", "id"]),
         ]
 
     def __str__(self) -> str:
@@ -63,8 +133,129 @@ class Booking(models.Model):
     def clean(self) -> None:
         if self.slot.start < timezone.now():
             raise ValidationError("Cannot book slots in the past")
-        if self.status == self.Status.CONFIRMED and self.slot.is_booked():
+        if self.status == self.Status.CONFIRMED:
             # Check if there's already a confirmed booking for this slot
-            existing = self.slot.bookings.filter(status=self.Status.CONFIRMED).exclude(pk=self.pk)
-            if existing.exists():
+            if Booking.objects.filter(confirmed_slot_id=self.slot_id).exclude(pk=self.pk).exists():
                 raise ValidationError("Slot is already booked")
+
+    @classmethod
+    def from_db(cls, db, field_names, values) -> "Booking":
+        instance = super().from_db(db, field_names, values)
+        # remember the stored slot and status so signal handlers can move the booking between aggregates
+        instance._loaded_slot_id = instance.__dict__.get("slot_id")
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def save(self, *args, **kwargs) -> None:
+        self.confirmed_slot_id = self.slot_id if self.status == self.Status.CONFIRMED else None
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"status", "slot"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "confirmed_slot"}
+        # `(slot_id, status)` stored before this save, the same for every post_save receiver whatever
+        # their order; None when unknown (instances not loaded from the database)
+        self._previous_state = (self._loaded_slot_id, self._loaded_status) if hasattr(self, "_loaded_status") else None
+        super().save(*args, **kwargs)
+        self._loaded_slot_id, self._loaded_status = self.slot_id, self.status
+
+
+class Notification(models.Model):
+    """Outbox entry for an email, written with the change that triggers it and delivered by a worker."""
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # earliest time the worker may (re)try delivery
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subject} -> {self.recipient} ({self.status})"
+
+
+class DailyOccupancy(models.Model):
+    """Slot and booking counts of one doctor on one day.
+
+    Maintained incrementally by the Booking/AppointmentSlot signal handlers (see api.occupancy) so
+    utilization reports read a row per day and doctor instead of scanning bookings.
+    `rebuild_occupancy` recomputes the table from scratch.
+    """
+
+    day = models.DateField()
+    doctor = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name="daily_occupancy")
+    total_slots = models.IntegerField(default=0)
+    confirmed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["day", "id"]
+        constraints = [
+            # NULLs are distinct in a plain unique index, so slots without a doctor are keyed as doctor 0:
+            # concurrent transactions cannot create two cells for them (see occupancy.apply_deltas)
+            models.UniqueConstraint(models.F("day"), Coalesce("doctor", 0), name="daily_occupancy_day_doctor"),
+        ]
+        verbose_name_plural = "daily occupancy"
+
+    def __str__(self) -> str:
+        return f"{self.day} {self.doctor_id}: {self.confirmed}/{self.total_slots}"
+
+
+class ArchivedSlot(models.Model):
+    """Past slot moved out of `AppointmentSlot` by `archive_history` (see api.archive).
+
+    Keeps the original id and the field names of `AppointmentSlot`, so queries and row serializers
+    written for live slots and bookings work on the archive unchanged.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    doctor = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="archived_slots")
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["start"]
+        indexes = [
+            models.Index(fields=["start", "id"]),
+            models.Index(fields=["doctor", "start"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.start.isoformat()}"
+
+
+class ArchivedBooking(models.Model):
+    """Booking of an archived slot, confirmed or cancelled; mirrors the fields of `Booking`."""
+
+    id = models.BigIntegerField(primary_key=True)
+    slot = models.ForeignKey(ArchivedSlot, on_delete=models.CASCADE, related_name="bookings")
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="archived_bookings")
+    reason = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=Booking.Status.choices)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["user", "status"]),
+            # keyset pagination order (see api.pagination.BookingPagination)
+            models.Index(fields=["created_at", "id"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"Archived booking {self.id} ({self.status})"
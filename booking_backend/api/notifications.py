@@ -0,0 +1,96 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(messages: list[tuple[str, str, str]]) -> list[Notification]:
+    """Queue `(recipient, subject, body)` emails in the outbox.
+
+    Rows are inserted in the caller's transaction, so they are rolled back together with the change
+    that produced them and the worker never sees notifications for uncommitted bookings.
+    """
+    if not messages:
+        return []
+    return Notification.objects.bulk_create(Notification(recipient=recipient, subject=subject, body=body) for recipient, subject, body in messages)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    # exponential backoff: base, 2*base, 4*base, ... capped at one hour
+    return timedelta(seconds=min(settings.NOTIFICATION_RETRY_BACKOFF * 2 ** (attempts - 1), 3600))
+
+
+def claim_due(batch_size: int) -> list[Notification]:
+    """Claim up to `batch_size` due notifications for this worker in a short transaction.
+
+    Claimed rows count the attempt and have `next_attempt_at` pushed NOTIFICATION_CLAIM_SECONDS ahead,
+    so other workers skip them while they are sent outside the transaction. Rows of a worker that dies
+    mid-batch become due again once the claim runs out.
+    """
+    with transaction.atomic():
+        # skip_locked lets several workers claim from the outbox without waiting for each other
+        batch = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(status=Notification.Status.PENDING, next_attempt_at__lte=timezone.now())
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        claimed_until = timezone.now() + timedelta(seconds=settings.NOTIFICATION_CLAIM_SECONDS)
+        for notification in batch:
+            notification.attempts += 1
+            notification.next_attempt_at = claimed_until
+        Notification.objects.bulk_update(batch, ["attempts", "next_attempt_at"])
+    return batch
+
+
+def deliver_pending(batch_size: int | None = None, max_attempts: int | None = None) -> tuple[int, int]:
+    """Send one batch of due notifications over a single mail connection.
+
+    Returns `(sent, failed)` counts for the batch. Failed messages are rescheduled with backoff
+    until `max_attempts` is reached, then marked as failed. No row lock or transaction is held while
+    the mail server is talked to.
+    """
+    max_attempts = max_attempts or settings.NOTIFICATION_MAX_ATTEMPTS
+    batch = claim_due(batch_size or settings.NOTIFICATION_BATCH_SIZE)
+    if not batch:
+        return 0, 0
+    sent = failed = 0
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.warning("Could not open mail connection: %s", exc)
+        connection = None
+
+    for notification in batch:
+        try:
+            if connection is None:
+                raise ConnectionError("mail connection unavailable")
+            message = EmailMessage(notification.subject, notification.body, settings.DEFAULT_FROM_EMAIL, [notification.recipient], connection=connection)
+            connection.send_messages([message])
+        except Exception as exc:
+            notification.last_error = str(exc)
+            if notification.attempts >= max_attempts:
+                notification.status = Notification.Status.FAILED
+                failed += 1
+            else:
+                notification.next_attempt_at = timezone.now() + _retry_delay(notification.attempts)
+            logger.warning("Notification %s delivery attempt %s failed: %s", notification.pk, notification.attempts, exc)
+        else:
+            notification.status = Notification.Status.SENT
+            notification.sent_at = timezone.now()
+            notification.last_error = ""
+            sent += 1
+
+    if connection is not None:
+        connection.close()
+
+    Notification.objects.bulk_update(batch, ["status", "next_attempt_at", "last_error", "sent_at"])
+    return sent, failed
@@ -0,0 +1,151 @@
+import datetime
+from collections import Counter
+from collections.abc import Iterable
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AppointmentSlot, ArchivedSlot, Booking, DailyOccupancy
+
+# (day, doctor id) cell of the aggregate table
+Cell = tuple[datetime.date, int | None]
+
+# Booking status -> counter column of DailyOccupancy
+STATUS_COLUMNS = {
+    Booking.Status.CONFIRMED: "confirmed",
+    Booking.Status.CANCELLED: "cancelled",
+}
+
+
+def cell_of(slot: AppointmentSlot) -> Cell:
+    return timezone.localdate(slot.start), slot.doctor_id
+
+
+def apply_deltas(deltas: dict[Cell, Counter]) -> None:
+    """Add `deltas` (column -> change) to the counters of each cell, creating missing rows.
+
+    Runs in the caller's transaction so the aggregates commit or roll back with the write they describe.
+    """
+    for (day, doctor_id), changes in deltas.items():
+        changes = {column: delta for column, delta in changes.items() if delta}
+        if not changes:
+            continue
+        row = DailyOccupancy.objects.filter(day=day, doctor_id=doctor_id)
+        if row.update(**{column: F(column) + delta for column, delta in changes.items()}):
+            continue
+        try:
+            with transaction.atomic():
+                DailyOccupancy.objects.create(day=day, doctor_id=doctor_id, **changes)
+        except IntegrityError:
+            # created concurrently by another transaction
+            row.update(**{column: F(column) + delta for column, delta in changes.items()})
+
+
+def record_slots_created(slots: Iterable[AppointmentSlot]) -> None:
+    """Count slots inserted with `bulk_create`, which does not send post_save."""
+    deltas: dict[Cell, Counter] = {}
+    for slot in slots:
+        deltas.setdefault(cell_of(slot), Counter())["total_slots"] += 1
+    apply_deltas(deltas)
+
+
+def on_slot_saved(slot: AppointmentSlot, created: bool) -> None:
+    if created:
+        apply_deltas({cell_of(slot): Counter(total_slots=1)})
+        return
+    if not hasattr(slot, "_loaded_start"):
+        # saved through an instance that was not loaded from the database: the old cell is unknown
+        rebuild_cells([cell_of(slot)])
+        return
+    previous = (timezone.localdate(slot._loaded_start), slot._loaded_doctor_id)
+    if previous != cell_of(slot):
+        # moving a slot is rare, recount both cells instead of moving its bookings one by one
+        rebuild_cells([previous, cell_of(slot)])
+
+
+def on_slot_deleted(slot: AppointmentSlot) -> None:
+    # the slot's bookings are deleted first and decrement their own counters
+    apply_deltas({cell_of(slot): Counter(total_slots=-1)})
+
+
+def on_booking_saved(booking: Booking, created: bool) -> None:
+    deltas: dict[Cell, Counter] = {}
+    if not created:
+        if (previous := getattr(booking, "_previous_state", None)) is None:
+            rebuild_cells([cell_of(booking.slot)])
+            return
+        previous_slot_id, previous_status = previous
+        if (previous_slot_id, previous_status) == (booking.slot_id, booking.status):
+            return
+        previous_slot = booking.slot if previous_slot_id == booking.slot_id else AppointmentSlot.objects.get(pk=previous_slot_id)
+        deltas.setdefault(cell_of(previous_slot), Counter())[STATUS_COLUMNS[previous_status]] -= 1
+    deltas.setdefault(cell_of(booking.slot), Counter())[STATUS_COLUMNS[booking.status]] += 1
+    apply_deltas(deltas)
+
+
+def on_booking_deleted(booking: Booking) -> None:
+    apply_deltas({cell_of(booking.slot): Counter({STATUS_COLUMNS[booking.status]: -1})})
+
+
+def _aggregate_rows(slot_filter: Q) -> list[DailyOccupancy]:
+    """Count the live and archived slots matching `slot_filter` and their bookings per day and doctor."""
+    merged: dict[Cell, DailyOccupancy] = {}
+    # ArchivedSlot mirrors the fields of AppointmentSlot, the same query counts both tables
+    for model in (AppointmentSlot, ArchivedSlot):
+        rows = (
+            model.objects.filter(slot_filter)
+            .annotate(day=TruncDate("start"))
+            .values("day", "doctor_id")
+            .annotate(
+                total_slots=Count("id", distinct=True),
+                confirmed=Count("bookings", filter=Q(bookings__status=Booking.Status.CONFIRMED)),
+                cancelled=Count("bookings", filter=Q(bookings__status=Booking.Status.CANCELLED)),
+            )
+            .order_by()
+        )
+        for row in rows:
+            if (cell := merged.get((row["day"], row["doctor_id"]))) is None:
+                merged[row["day"], row["doctor_id"]] = DailyOccupancy(**row)
+                continue
+            # a day partly archived
+            cell.total_slots += row["total_slots"]
+            cell.confirmed += row["confirmed"]
+            cell.cancelled += row["cancelled"]
+    return list(merged.values())
+
+
+def _day_range(first_day: datetime.date, last_day: datetime.date) -> tuple[datetime.datetime, datetime.datetime]:
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.datetime.combine(first_day, datetime.time.min, tz),
+        datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min, tz),
+    )
+
+
+def rebuild_cells(cells: Iterable[Cell]) -> None:
+    """Recount the given cells from the slot and booking tables."""
+    for day, doctor_id in set(cells):
+        start, end = _day_range(day, day)
+        rows = _aggregate_rows(Q(doctor_id=doctor_id, start__gte=start, start__lt=end))
+        with transaction.atomic():
+            DailyOccupancy.objects.filter(day=day, doctor_id=doctor_id).delete()
+            DailyOccupancy.objects.bulk_create(rows)
+
+
+def rebuild(first_day: datetime.date | None = None, last_day: datetime.date | None = None, batch_size: int = 1000) -> int:
+    """Recompute the aggregates of `[first_day, last_day]` (everything by default) with a grouped query per table."""
+    slots = Q()
+    existing = DailyOccupancy.objects.all()
+    if first_day:
+        slots &= Q(start__gte=_day_range(first_day, first_day)[0])
+        existing = existing.filter(day__gte=first_day)
+    if last_day:
+        slots &= Q(start__lt=_day_range(last_day, last_day)[1])
+        existing = existing.filter(day__lte=last_day)
+    rows = _aggregate_rows(slots)
+    with transaction.atomic():
+        existing.delete()
+        DailyOccupancy.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
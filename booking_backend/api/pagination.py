@@ -0,0 +1,155 @@
+from collections.abc import Generator, Sequence
+from itertools import chain
+from operator import attrgetter, itemgetter
+from typing import TYPE_CHECKING, Any
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+if TYPE_CHECKING:
+    from django.db.models import QuerySet
+
+# joins the values of the ordering fields in a cursor position
+_POSITION_SEPARATOR = "|"
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination seeking on an indexed `(column, id)` pair.
+
+    DRF's CursorPagination seeks on the first ordering field only and steps over rows sharing its
+    value with an OFFSET. The cursor position here holds every ordering field, so each page is one
+    `WHERE (column, id) > (position)` range scan: rows with equal `column` values (slots of several
+    doctors starting at once) cost no OFFSET, and page 1000 costs the same as page 1.
+    """
+
+    ordering = ("id",)
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None) -> list[Any] | None:
+        return self.paginate_querysets([queryset], request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None) -> list[Any] | None:
+        """`paginate_queryset` for async views: the page is fetched with the async ORM."""
+        return await self.apaginate_querysets([queryset], request, view)
+
+    def paginate_querysets(self, querysets: Sequence["QuerySet"], request, view=None) -> list[Any] | None:
+        """Paginate several querysets with the same fields (e.g. live and archived rows) as one.
+
+        Each page reads one page from every queryset and merges them in the pagination order.
+        """
+        steps = self._paginate(querysets, request, view)
+        try:
+            page_queries = next(steps)
+            steps.send([list(page_query) for page_query in page_queries])
+        except StopIteration as stop:
+            return stop.value
+        raise AssertionError("_paginate must finish after receiving the rows")
+
+    async def apaginate_querysets(self, querysets: Sequence["QuerySet"], request, view=None) -> list[Any] | None:
+        steps = self._paginate(querysets, request, view)
+        try:
+            page_queries = next(steps)
+            steps.send([[row async for row in page_query] for page_query in page_queries])
+        except StopIteration as stop:
+            return stop.value
+        raise AssertionError("_paginate must finish after receiving the rows")
+
+    def _paginate(self, querysets: Sequence["QuerySet"], request, view) -> Generator[list[Any], list[list[Any]], list[Any] | None]:
+        """DRF's `CursorPagination.paginate_queryset`, split around the queries it runs.
+
+        Yields the sliced page query of every queryset and expects their rows back, so the sync and
+        async entry points share the cursor logic and produce identical pages and links.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, querysets[0], view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        page_queries = []
+        for queryset in querysets:
+            queryset = queryset.order_by(*ordering)
+            if current_position is not None:
+                queryset = queryset.filter(self._after(current_position, reverse))
+            # one extra row tells whether a following page exists
+            page_queries.append(queryset[offset : offset + self.page_size + 1] if len(querysets) == 1 else queryset[: offset + self.page_size + 1])
+
+        pages = yield page_queries
+        results = pages[0] if len(pages) == 1 else self._merge(pages, ordering)[offset : offset + self.page_size + 1]
+        self.page = list(results[: self.page_size])
+
+        following_position = self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+        self._set_links(offset, reverse, current_position, len(results) > len(self.page), following_position)
+        return self.page
+
+    @staticmethod
+    def _merge(pages: list[list[Any]], ordering: Sequence[str]) -> list[Any]:
+        rows = list(chain.from_iterable(pages))
+        # stable sorts, least significant field first
+        for order in reversed(ordering):
+            field = order.lstrip("-")
+            rows.sort(key=itemgetter(field) if rows and isinstance(rows[0], dict) else attrgetter(field), reverse=order.startswith("-"))
+        return rows
+
+    def _after(self, position: str, reverse: bool) -> Q:
+        """Rows following `position` in the ordering, or preceding it when paging backwards."""
+        # (a, b) > (x, y) is a > x OR (a = x AND b > y)
+        values = position.rsplit(_POSITION_SEPARATOR, len(self.ordering) - 1)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = None
+        for order, value in reversed(list(zip(self.ordering, values, strict=True))):
+            field = order.lstrip("-")
+            lookup = "lt" if order.startswith("-") != reverse else "gt"
+            beyond = Q(**{f"{field}__{lookup}": value})
+            condition = beyond if condition is None else beyond | (Q(**{field: value}) & condition)
+        return condition
+
+    def _get_position_from_instance(self, instance: Any, ordering: tuple[str, ...]) -> str:
+        # every ordering field, so positions are unique and DRF's links never need an offset
+        fields = [order.lstrip("-") for order in ordering]
+        values = [instance[field] for field in fields] if isinstance(instance, dict) else [getattr(instance, field) for field in fields]
+        return _POSITION_SEPARATOR.join(str(value) for value in values)
+
+    def _set_links(self, offset: int, reverse: bool, current_position: Any, has_following_position: bool, following_position: Any) -> None:
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+
+class SlotPagination(KeysetPagination):
+    ordering = ("start", "id")
+
+
+class BookingPagination(KeysetPagination):
+    ordering = ("created_at", "id")
+
+
+class OccupancyPagination(KeysetPagination):
+    ordering = ("day", "id")
@@ -0,0 +1,25 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+# Password hashing (PBKDF2, hundreds of milliseconds) releases the GIL, so a small pool hashes in
+# parallel without blocking the event loop or the one thread that runs the sync code of ASGI requests.
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_executor() -> ThreadPoolExecutor | None:
+    """The hashing pool of `PASSWORD_HASH_THREADS` threads, None when it is disabled (0)."""
+    global _executor
+    if _executor is None and settings.PASSWORD_HASH_THREADS > 0:
+        _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_THREADS, thread_name_prefix="password-hash")
+    return _executor
+
+
+async def amake_password(password: str) -> str:
+    """`make_password` in the hashing pool, or in the thread of the ORM calls when the pool is disabled."""
+    if (executor := get_executor()) is None:
+        return await sync_to_async(make_password)(password)
+    return await asyncio.get_running_loop().run_in_executor(executor, make_password, password)
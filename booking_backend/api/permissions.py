@@ -2,6 +2,8 @@ from typing import TYPE_CHECKING
 
 from rest_framework import permissions
 
+from .roles import is_administrator, is_doctor
+
 if TYPE_CHECKING:
     from django.contrib.auth.models import User
     from rest_framework.request import Request
@@ -26,14 +28,14 @@ class IsDoctor(IsAuthenticatedBase):
     """Allow access if user is in the 'doctor' group."""
 
     def check_permission(self, request: "Request", view: "APIView", user: "User") -> bool:
-        return user.groups.filter(name="doctor").exists()
+        return is_doctor(request)
 
 
 class IsAdministrator(IsAuthenticatedBase):
     """Allow access if user is in the 'administrator' group."""
 
     def check_permission(self, request: "Request", view: "APIView", user: "User") -> bool:
-        return user.groups.filter(name="administrator").exists()
+        return is_administrator(request)
 
 
 class CanCreateBooking(IsAuthenticatedBase):
@@ -43,7 +45,7 @@ class CanCreateBooking(IsAuthenticatedBase):
 
     def check_permission(self, request: "Request", view: "APIView", user: "User") -> bool:
         # deny if user is in 'doctor' group
-        return not user.groups.filter(name="doctor").exists()
+        return not is_doctor(request)
 
 
 class IsBookingOwnerOrReadOnly(permissions.BasePermission):
@@ -60,7 +62,7 @@ class IsBookingOwnerOrReadOnly(permissions.BasePermission):
         if not user or not user.is_authenticated:
             return False
         # administrators may edit
-        if user.groups.filter(name="administrator").exists():
+        if is_administrator(request):
             return True
         # owner may edit
         return getattr(obj, "user", None) == user
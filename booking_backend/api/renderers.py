@@ -0,0 +1,54 @@
+import codecs
+from typing import Any
+
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib json path of DRF is used instead
+    orjson = None
+
+# orjson renders datetimes natively in the same format as DRF's encoder (ISO 8601, UTC as "Z"), so
+# serializers can hand datetime objects to the renderer (REST_FRAMEWORK["DATETIME_FORMAT"] = None)
+# instead of formatting every field in Python.
+ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _default(obj: Any) -> Any:
+    # Decimal, UUID, lazy translations, querysets...: whatever DRF's encoder supports
+    return JSONEncoder().default(obj)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """`JSONRenderer` using orjson when it is installed, with the same output as DRF's stdlib path.
+
+    Indented output (browsable API, `Accept: application/json; indent=4`) falls back to DRF.
+    """
+
+    def render(self, data: Any, accepted_media_type: str | None = None, renderer_context: dict | None = None) -> bytes:
+        if orjson is None or not settings.FAST_JSON or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type or "", renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        # like DRF, escape the separators that are valid JSON but not valid JavaScript
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class FastJSONParser(JSONParser):
+    """`JSONParser` using orjson for UTF-8 bodies when it is installed."""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type: str | None = None, parser_context: dict | None = None) -> Any:
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or not settings.FAST_JSON or codecs.lookup(encoding).name != "utf-8":
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}") from exc
@@ -0,0 +1,79 @@
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+if TYPE_CHECKING:
+    from django.contrib.auth.models import User
+    from rest_framework.request import Request
+
+DOCTOR = "doctor"
+ADMINISTRATOR = "administrator"
+
+# name of the JWT claim carrying the user's group names
+ROLES_CLAIM = "roles"
+
+# attribute used to memoize resolved roles on the (per-request) user object
+_CACHE_ATTR = "_api_roles"
+
+
+def roles_for_user(user: "User") -> frozenset[str]:
+    """Return group names of `user`, querying the database at most once per user instance."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+    if (roles := getattr(user, _CACHE_ATTR, None)) is None:
+        roles = frozenset(user.groups.values_list("name", flat=True))
+        setattr(user, _CACHE_ATTR, roles)
+    return roles
+
+
+def remember_roles(user: "User", roles: frozenset[str]) -> None:
+    """Cache `roles` on `user` so role checks of this request do not query groups."""
+    setattr(user, _CACHE_ATTR, roles)
+
+
+def _roles_from_token(request: "Request", user: "User") -> None:
+    # writes always check the current groups: a token keeps the roles it was issued with
+    if request.method not in SAFE_METHODS:
+        return
+    if getattr(user, _CACHE_ATTR, None) is None and getattr(settings, "ROLES_FROM_TOKEN_CLAIMS", False):
+        token = getattr(request, "auth", None)
+        claim = token.get(ROLES_CLAIM) if hasattr(token, "get") else None
+        if isinstance(claim, list):
+            setattr(user, _CACHE_ATTR, frozenset(claim))
+
+
+def get_roles(request: "Request | None") -> frozenset[str]:
+    """Resolve group names for the requesting user.
+
+    On reads, roles are taken from the access token claim when enabled and present; otherwise they
+    are loaded from the database once and cached on `request.user` for the rest of the request.
+    """
+    user = getattr(request, "user", None)
+    if not user or not user.is_authenticated:
+        return frozenset()
+    _roles_from_token(request, user)
+    return roles_for_user(user)
+
+
+async def aget_roles(request: "Request | None") -> frozenset[str]:
+    """`get_roles` for async views; afterwards the sync helpers answer from the cached roles."""
+    user = getattr(request, "user", None)
+    if not user or not user.is_authenticated:
+        return frozenset()
+    _roles_from_token(request, user)
+    if getattr(user, _CACHE_ATTR, None) is None:
+        setattr(user, _CACHE_ATTR, frozenset([name async for name in user.groups.values_list("name", flat=True)]))
+    return roles_for_user(user)
+
+
+def has_role(request: "Request | None", role: str) -> bool:
+    return role in get_roles(request)
+
+
+def is_doctor(request: "Request | None") -> bool:
+    return has_role(request, DOCTOR)
+
+
+def is_administrator(request: "Request | None") -> bool:
+    return has_role(request, ADMINISTRATOR)
@@ -0,0 +1,105 @@
+import random
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+if TYPE_CHECKING:
+    from django.http import HttpRequest, HttpResponse
+
+# cookie telling later requests of the same client to keep reading from the primary
+PIN_COOKIE = "db_primary_pin"
+
+
+@dataclass
+class RoutingState:
+    # the resolved view action is listed in its view's `replica_actions`
+    replica_allowed: bool = False
+    # the request (or a recent request of the client) wrote, read its own writes from the primary
+    pinned: bool = False
+    wrote: bool = False
+
+
+_state: ContextVar[RoutingState | None] = ContextVar("db_routing_state", default=None)
+
+
+class ReplicaRouter:
+    """Send reads of replica-safe view actions to `DATABASE_REPLICAS`, everything else to the primary.
+
+    Views opt in per action with a `replica_actions` set. Outside such requests (writes, management
+    commands, workers) every query goes to `default`. A request that writes is pinned to the primary
+    for the rest of the request and, through a cookie, for `DATABASE_REPLICA_PIN_SECONDS` afterwards.
+    """
+
+    def db_for_read(self, model, **hints) -> str:
+        state = _state.get()
+        if state is None or not state.replica_allowed or state.pinned or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        # select_for_update and read-modify-write code run inside a transaction on the primary
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints) -> str:
+        if (state := _state.get()) is not None:
+            state.wrote = state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # replicas hold the same data as the primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """Enable replica reads for the view actions listed in the view's `replica_actions`.
+
+    Function views opt in with a truthy `replica_safe` attribute.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[["HttpRequest"], "HttpResponse"]) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: "HttpRequest") -> "HttpResponse":
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, state)
+
+    async def __acall__(self, request: "HttpRequest") -> "HttpResponse":
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(response, state)
+
+    def _finish(self, response: "HttpResponse", state: RoutingState) -> "HttpResponse":
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(PIN_COOKIE, "1", max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True, samesite="Lax")
+        return response
+
+    def process_view(self, request: "HttpRequest", view_func, view_args, view_kwargs) -> None:
+        if (state := _state.get()) is None or request.method not in ("GET", "HEAD"):
+            return None
+        if (view_class := getattr(view_func, "cls", None)) is None:
+            state.replica_allowed = bool(getattr(view_func, "replica_safe", False))
+            return None
+        actions = getattr(view_func, "actions", None) or {}
+        action = actions.get(request.method.lower())
+        state.replica_allowed = action in getattr(view_class, "replica_actions", ())
+        return None
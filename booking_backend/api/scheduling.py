@@ -0,0 +1,205 @@
+import bisect
+import datetime
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import availability, events, occupancy
+from .models import AppointmentSlot
+from .slot_cache import bump_slot_versions
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+Interval = tuple[datetime.time, datetime.time]
+DateTimeInterval = tuple[datetime.datetime, datetime.datetime]
+
+
+@dataclass(frozen=True)
+class WeeklyTemplate:
+    """Recurring weekly schedule of a single doctor."""
+
+    doctor_id: int
+    # weekday (0 = Monday) -> working intervals
+    working_hours: dict[int, list[Interval]]
+    slot_minutes: int = 60
+    breaks: list[Interval] = field(default_factory=list)
+    holidays: frozenset[datetime.date] = frozenset()
+
+    @classmethod
+    def from_dict(cls, doctor_id: int, data: dict[str, Any]) -> "WeeklyTemplate":
+        """Build a template from its JSON form.
+
+        Example: `{"hours": {"mon": [["09:00", "17:00"]]}, "slot_minutes": 30, "breaks": [["12:00", "13:00"]], "holidays": ["2026-12-24"]}`
+        """
+
+        def parse_intervals(items: Iterable[Iterable[str]]) -> list[Interval]:
+            return [(datetime.time.fromisoformat(start), datetime.time.fromisoformat(end)) for start, end in items]
+
+        working_hours = {}
+        for day, intervals in data.get("hours", {}).items():
+            if day not in WEEKDAYS:
+                raise ValueError(f"Unknown weekday '{day}', expected one of {', '.join(WEEKDAYS)}")
+            working_hours[WEEKDAYS.index(day)] = parse_intervals(intervals)
+
+        slot_minutes = int(data.get("slot_minutes", 60))
+        if slot_minutes <= 0:
+            raise ValueError("slot_minutes must be positive")
+
+        return cls(
+            doctor_id=doctor_id,
+            working_hours=working_hours,
+            slot_minutes=slot_minutes,
+            breaks=parse_intervals(data.get("breaks", [])),
+            holidays=frozenset(datetime.date.fromisoformat(day) for day in data.get("holidays", [])),
+        )
+
+    def slot_starts(self, first_day: datetime.date, last_day: datetime.date, tz: datetime.tzinfo) -> list[datetime.datetime]:
+        """Return aware slot start times for every day in `[first_day, last_day]`."""
+        length = datetime.timedelta(minutes=self.slot_minutes)
+        starts = []
+        day = first_day
+        while day <= last_day:
+            if day not in self.holidays:
+                breaks = [(datetime.datetime.combine(day, b_start, tz), datetime.datetime.combine(day, b_end, tz)) for b_start, b_end in self.breaks]
+                for work_start, work_end in self.working_hours.get(day.weekday(), []):
+                    current = datetime.datetime.combine(day, work_start, tz)
+                    end = datetime.datetime.combine(day, work_end, tz)
+                    while current + length <= end:
+                        # jump past any break the slot would overlap
+                        overlapping = [b_end for b_start, b_end in breaks if b_start < current + length and current < b_end]
+                        if overlapping:
+                            current = max(overlapping)
+                            continue
+                        starts.append(current)
+                        current += length
+            day += datetime.timedelta(days=1)
+        return starts
+
+
+@dataclass
+class SchedulePlan:
+    candidates: int
+    existing: int
+    slots: list[AppointmentSlot]
+    # candidates dropped because they overlap a different slot of the doctor
+    overlapping: int = 0
+
+
+def overlaps(intervals: list[DateTimeInterval], start: datetime.datetime, end: datetime.datetime, index: int) -> bool:
+    """Whether `[start, end)` overlaps an interval of the sorted `intervals`; `index` is its insertion point."""
+    if index < len(intervals) and intervals[index][0] < end:
+        return True
+    # a doctor's slots do not overlap, so they end in the order they start: if the interval before the
+    # insertion point ends by `start`, every earlier one does too
+    return index > 0 and intervals[index - 1][1] > start
+
+
+def load_schedules(doctor_ids: Iterable[int], range_start: datetime.datetime, range_end: datetime.datetime) -> dict[int, list[DateTimeInterval]]:
+    """Sorted `(start, end)` of the slots of each doctor that can reach into `[range_start, range_end)`, in one range query."""
+    schedules = {doctor_id: [] for doctor_id in doctor_ids}
+    # slots starting up to SLOT_MAX_MINUTES before the range can reach into it
+    for doctor_id, start, end in AppointmentSlot.objects.filter(
+        doctor_id__in=schedules,
+        start__gte=range_start - datetime.timedelta(minutes=settings.SLOT_MAX_MINUTES),
+        start__lt=range_end,
+    ).values_list("doctor_id", "start", "end"):
+        schedules[doctor_id].append((start, end))
+    for intervals in schedules.values():
+        intervals.sort()
+    return schedules
+
+
+def plan_slots(templates: list[WeeklyTemplate], first_day: datetime.date, last_day: datetime.date) -> SchedulePlan:
+    """Compute the slots `templates` produce and drop the ones that already exist or would overlap a slot.
+
+    Existing slots are loaded with a single range query over all doctors of the plan, then each
+    candidate is checked with a bisect into its doctor's sorted intervals.
+    """
+    tz = timezone.get_current_timezone()
+    now = timezone.now()
+    candidates = {
+        (template.doctor_id, start, start + datetime.timedelta(minutes=template.slot_minutes))
+        for template in templates
+        for start in template.slot_starts(first_day, last_day, tz)
+        if start >= now
+    }
+
+    schedules = load_schedules(
+        {template.doctor_id for template in templates},
+        datetime.datetime.combine(first_day, datetime.time.min, tz),
+        datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min, tz),
+    )
+
+    plan = SchedulePlan(candidates=len(candidates), existing=0, slots=[])
+    for doctor_id, start, end in sorted(candidates, key=lambda item: (item[1], item[0])):
+        intervals = schedules[doctor_id]
+        index = bisect.bisect_left(intervals, (start, end))
+        if index < len(intervals) and intervals[index] == (start, end):
+            plan.existing += 1
+        elif overlaps(intervals, start, end, index):
+            plan.overlapping += 1
+        else:
+            intervals.insert(index, (start, end))
+            plan.slots.append(AppointmentSlot(doctor_id=doctor_id, start=start, end=end))
+    return plan
+
+
+class SlotOverlap(ValueError):
+    """A slot would overlap other slots of the same doctor."""
+
+    def __init__(self, slot_ids: Iterable[int]) -> None:
+        self.slot_ids = sorted(slot_ids)
+        super().__init__(f"Overlaps slots: {', '.join(map(str, self.slot_ids))}")
+
+
+def ensure_free_interval(doctor_id: int | None, start: datetime.datetime, end: datetime.datetime, exclude_id: int | None = None) -> None:
+    """Raise `SlotOverlap` if `[start, end)` overlaps a slot of `doctor_id` other than `exclude_id`.
+
+    Must run in a transaction: it locks the doctor's user row until commit, so concurrent writers of
+    the same schedule cannot both pass the check.
+    """
+    if doctor_id is None:
+        return
+    list(User.objects.select_for_update().filter(pk=doctor_id).values_list("pk", flat=True))
+    overlapping = AppointmentSlot.objects.overlapping(doctor_id, start, end).exclude(pk=exclude_id).values_list("pk", flat=True)
+    if slot_ids := list(overlapping[:10]):
+        raise SlotOverlap(slot_ids)
+
+
+def _fill_primary_keys(slots: list[AppointmentSlot]) -> None:
+    """Set the ids of doctors' slots inserted by a `bulk_create` that returned none (MySQL)."""
+    missing = [slot for slot in slots if slot.pk is None and slot.doctor_id is not None]
+    if not missing:
+        return
+    # a doctor has one slot per start (slots do not overlap)
+    rows = AppointmentSlot.objects.filter(
+        doctor_id__in={slot.doctor_id for slot in missing},
+        start__gte=min(slot.start for slot in missing),
+        start__lte=max(slot.start for slot in missing),
+    ).values_list("doctor_id", "start", "pk")
+    ids = {(doctor_id, start): pk for doctor_id, start, pk in rows}
+    for slot in missing:
+        slot.pk = ids.get((slot.doctor_id, slot.start))
+
+
+def create_slots(slots: list[AppointmentSlot], batch_size: int = 1000) -> int:
+    """Insert `slots` with chunked `bulk_create` in one transaction and invalidate slot caches.
+
+    The slots of doctors have their ids set afterwards, on every database.
+    """
+    if not slots:
+        return 0
+    with transaction.atomic():
+        AppointmentSlot.objects.bulk_create(slots, batch_size=batch_size)
+        _fill_primary_keys(slots)
+        # bulk_create bypasses post_save, so count the slots, publish their events and invalidate cached listings and availability by hand
+        occupancy.record_slots_created(slots)
+        events.publish(events.SlotEvent(events.SLOT_CREATED, slot.pk, slot.doctor_id, slot.start, free=True) for slot in slots)
+        doctor_ids = {slot.doctor_id for slot in slots}
+        transaction.on_commit(lambda: (bump_slot_versions(doctor_ids), availability.invalidate(doctor_ids)), robust=True)
+    return len(slots)
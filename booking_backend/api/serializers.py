@@ -1,22 +1,72 @@
-from typing import Any
+import datetime
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User, update_last_login
 from django.contrib.auth.password_validation import validate_password
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 
-from .models import AppointmentSlot, Booking
+from .authentication import PROFILE_CLAIMS, is_revoked
+from .bulk import SlotsUnavailable, book_series
+from .instrumentation import InstrumentedSerializerMixin
+from .models import AppointmentSlot, Booking, DailyOccupancy
+from .roles import ROLES_CLAIM, is_administrator, remember_roles, roles_for_user
+from .scheduling import SlotOverlap, ensure_free_interval
 
+if TYPE_CHECKING:
+    from rest_framework.request import Request
+    from rest_framework_simplejwt.tokens import Token
 
-class AppointmentSlotSerializer(serializers.ModelSerializer):
+
+class AppointmentSlotSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     doctor = serializers.SerializerMethodField()
     is_booked = serializers.SerializerMethodField()
 
     class Meta:
         model = AppointmentSlot
-        fields = ("id", "start", "doctor", "is_booked")
+        fields = ("id", "start", "end", "doctor", "is_booked")
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        start = attrs.get("start", getattr(self.instance, "start", None))
+        if attrs.get("end") is None:
+            # keep the length of an existing slot when only its start moves
+            length = self.instance.end - self.instance.start if self.instance else datetime.timedelta(minutes=settings.SLOT_DEFAULT_MINUTES)
+            attrs["end"] = start + length
+        if attrs["end"] <= start:
+            raise serializers.ValidationError({"end": "Must be after start."})
+        if attrs["end"] - start > datetime.timedelta(minutes=settings.SLOT_MAX_MINUTES):
+            raise serializers.ValidationError({"end": f"Slots can last at most {settings.SLOT_MAX_MINUTES} minutes."})
+        return attrs
+
+    def create(self, validated_data: dict[str, Any]) -> AppointmentSlot:
+        doctor = validated_data.get("doctor")
+        with self._free_interval(doctor.id if doctor else None, validated_data):
+            return super().create(validated_data)
+
+    def update(self, instance: AppointmentSlot, validated_data: dict[str, Any]) -> AppointmentSlot:
+        with self._free_interval(instance.doctor_id, validated_data):
+            return super().update(instance, validated_data)
+
+    @contextmanager
+    def _free_interval(self, doctor_id: int | None, validated_data: dict[str, Any]) -> Iterator[None]:
+        """Save inside a transaction that holds the doctor's schedule lock and rejects overlaps."""
+        start = validated_data.get("start", getattr(self.instance, "start", None))
+        try:
+            with transaction.atomic():
+                ensure_free_interval(doctor_id, start, validated_data["end"], exclude_id=getattr(self.instance, "pk", None))
+                yield
+        except SlotOverlap as exc:
+            raise serializers.ValidationError({"start": [f"Overlaps slot {slot_id}" for slot_id in exc.slot_ids]}) from None
 
     def get_is_booked(self, obj: AppointmentSlot) -> bool:
         return obj.is_booked()
@@ -28,7 +78,7 @@ class AppointmentSlotSerializer(serializers.ModelSerializer):
         return None
 
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     is_owner = serializers.SerializerMethodField()
     slot_details = serializers.SerializerMethodField()
@@ -40,17 +90,15 @@ class BookingSerializer(serializers.ModelSerializer):
 
     def get_slot_details(self, obj: Booking) -> dict[str, Any] | None:
         if obj.slot:
-            return {"id": obj.slot.id, "start": obj.slot.start.isoformat(), "doctor_name": obj.slot.doctor.get_full_name() if obj.slot.doctor else None}
+            return {"id": obj.slot.id, "start": obj.slot.start, "doctor_name": obj.slot.doctor.get_full_name() if obj.slot.doctor else None}
         return None
 
     def get_user(self, obj: Booking) -> str | dict[str, Any] | None:
         if not (user_obj := obj.user):
             return None
-        request = self.context.get("request")
         # For administrators, return detailed user info
-        if request and hasattr(request, "user"):
-            if request.user.groups.filter(name="administrator").exists():
-                return {"id": user_obj.id, "username": user_obj.username, "full_name": user_obj.get_full_name() or user_obj.username}
+        if is_administrator(self.context.get("request")):
+            return {"id": user_obj.id, "username": user_obj.username, "full_name": user_obj.get_full_name() or user_obj.username}
         # For regular users, just return username
 
         return str(user_obj)
@@ -60,48 +108,108 @@ class BookingSerializer(serializers.ModelSerializer):
             return False
         user = getattr(request, "user", None)
 
-        return user and user.is_authenticated and obj.user == user
+        # compare ids: the request user may be a token-backed `ClaimsUser`
+        return bool(user and user.is_authenticated and obj.user_id == user.id)
 
     def validate(self, data: dict[str, Any]) -> dict[str, Any]:
-        # check slot exists and availability (only if slot is being updated)
+        # availability is enforced by the unique `confirmed_slot` index when the row is written
         slot = data.get("slot")
-        if slot is not None:
-            if slot.start < timezone.now():
-                raise serializers.ValidationError("Cannot book a slot in the past")
-            if slot.is_booked():
-                raise serializers.ValidationError("Slot is already booked")
-
-            request = self.context.get("request")
-            user = getattr(request, "user", None) if request is not None else None
-
-            # prevent duplicate booking: check by authenticated user
-            if user and user.is_authenticated:
-                if Booking.objects.filter(slot=slot, user=user, status=Booking.Status.CONFIRMED).exists():
-                    raise serializers.ValidationError("You already have a confirmed booking for this slot")
-            else:
-                # booking without authentication is not allowed by the viewset; keep validation minimal
-                pass
+        if slot is not None and slot.start < timezone.now():
+            raise serializers.ValidationError("Cannot book a slot in the past")
 
         return data
 
     def create(self, validated_data: dict[str, Any]) -> Booking:
-        # Use a transaction to avoid race conditions on slot availability
-        with transaction.atomic():
-            slot = AppointmentSlot.objects.select_for_update().get(pk=validated_data["slot"].pk)
-            if slot.is_booked():
-                raise serializers.ValidationError("Slot is already booked")
-            # If request user available in context, associate booking
-            request = self.context.get("request")
-            user = getattr(request, "user", None) if request is not None else None
-            if user and user.is_authenticated:
-                # associate booking with the authenticated user
-                validated_data["user"] = user
-            booking = Booking.objects.create(**validated_data)
-
-            return booking
-
-
-class BookingPublicSerializer(serializers.ModelSerializer):
+        # If request user available in context, associate booking
+        request = self.context.get("request")
+        user = getattr(request, "user", None) if request is not None else None
+        if user and user.is_authenticated:
+            # associate booking with the authenticated user
+            validated_data["user"] = user
+
+        with self._claim_slot(validated_data.get("slot")):
+            return super().create(validated_data)
+
+    def update(self, instance: Booking, validated_data: dict[str, Any]) -> Booking:
+        with self._claim_slot(validated_data.get("slot", instance.slot)):
+            return super().update(instance, validated_data)
+
+    @staticmethod
+    @contextmanager
+    def _claim_slot(slot: AppointmentSlot | None) -> Iterator[None]:
+        """Translate a lost race for `slot` into a validation error.
+
+        There is no availability pre-check and no row lock: the single INSERT/UPDATE either wins the
+        unique `confirmed_slot` index or fails, so concurrent attempts are arbitrated by the database.
+        """
+        try:
+            with transaction.atomic():
+                yield
+        except IntegrityError:
+            if slot is not None and Booking.objects.filter(confirmed_slot=slot).exists():
+                raise serializers.ValidationError("Slot is already booked") from None
+            raise
+
+
+# `.values()` columns needed by `serialize_booking_rows`
+BOOKING_ROW_FIELDS = (
+    "id",
+    "slot_id",
+    "reason",
+    "status",
+    "created_at",
+    "user_id",
+    "user__username",
+    "user__first_name",
+    "user__last_name",
+    "slot__start",
+    "slot__doctor_id",
+    "slot__doctor__first_name",
+    "slot__doctor__last_name",
+)
+
+
+def serialize_booking_rows(rows: Iterable[dict[str, Any]], request: "Request | None") -> list[dict[str, Any]]:
+    """Fast read path producing `BookingSerializer` output from `.values(*BOOKING_ROW_FIELDS)` rows.
+
+    Skips model instantiation and per-field serializer dispatch; used by the list actions.
+    """
+    detailed_users = is_administrator(request)
+    user = getattr(request, "user", None)
+    current_user_id = user.id if user is not None and user.is_authenticated else None
+
+    data = []
+    append = data.append
+    for row in rows:
+        user_id = row["user_id"]
+        if user_id is None:
+            booking_user = None
+        elif detailed_users:
+            full_name = f"{row['user__first_name']} {row['user__last_name']}".strip()
+            booking_user = {"id": user_id, "username": row["user__username"], "full_name": full_name or row["user__username"]}
+        else:
+            booking_user = row["user__username"]
+
+        doctor_name = None
+        if row["slot__doctor_id"] is not None:
+            doctor_name = f"{row['slot__doctor__first_name']} {row['slot__doctor__last_name']}".strip()
+
+        append(
+            {
+                "id": row["id"],
+                "slot": row["slot_id"],
+                "user": booking_user,
+                "reason": row["reason"],
+                "status": row["status"],
+                "is_owner": current_user_id is not None and user_id == current_user_id,
+                "slot_details": {"id": row["slot_id"], "start": row["slot__start"], "doctor_name": doctor_name},
+            }
+        )
+
+    return data
+
+
+class BookingPublicSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Limited serializer for public listing of bookings for a slot."""
 
     class Meta:
@@ -110,6 +218,69 @@ class BookingPublicSerializer(serializers.ModelSerializer):
         read_only_fields = ()
 
 
+class BookingSeriesSerializer(serializers.Serializer):
+    """Input of `POST /api/bookings/series/`: book several slots at once, all or nothing."""
+
+    slots = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=100)
+    reason = serializers.CharField(required=False, allow_blank=True, default="")
+
+    def validate_slots(self, value: list[int]) -> list[int]:
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError("Slots must not repeat")
+        return value
+
+    def create(self, validated_data: dict[str, Any]) -> list[Booking]:
+        try:
+            return book_series(self.context["request"].user, validated_data["slots"], validated_data["reason"])
+        except SlotsUnavailable as exc:
+            raise serializers.ValidationError({"slots": [f"Slot {slot_id} is not available" for slot_id in exc.slot_ids]}) from None
+
+
+class BulkCancelSerializer(serializers.Serializer):
+    """Input of `POST /api/bookings/bulk_cancel/`; `doctor` defaults to the requesting doctor."""
+
+    doctor = serializers.IntegerField(required=False)
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+
+    def validate(self, data: dict[str, Any]) -> dict[str, Any]:
+        if data["start"] >= data["end"]:
+            raise serializers.ValidationError("start must be before end")
+        return data
+
+
+class ImportRowSerializer(serializers.Serializer):
+    """One row of a slot/booking import (see api.imports): a slot, and a booking of it when `patient` or `status` is set.
+
+    `doctor` and `patient` are usernames; they are resolved for a whole batch of rows at once.
+    """
+
+    doctor = serializers.CharField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField(required=False)
+    patient = serializers.CharField(required=False)
+    status = serializers.ChoiceField(Booking.Status.choices, required=False)
+    reason = serializers.CharField(required=False, allow_blank=True, default="")
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        start = attrs["start"]
+        end = attrs.setdefault("end", start + datetime.timedelta(minutes=settings.SLOT_DEFAULT_MINUTES))
+        if end <= start:
+            raise serializers.ValidationError({"end": "Must be after start."})
+        if end - start > datetime.timedelta(minutes=settings.SLOT_MAX_MINUTES):
+            raise serializers.ValidationError({"end": f"Slots can last at most {settings.SLOT_MAX_MINUTES} minutes."})
+        if "patient" in attrs or "status" in attrs:
+            attrs.setdefault("status", Booking.Status.CONFIRMED)
+        return attrs
+
+
+class DailyOccupancySerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = DailyOccupancy
+        fields = ("day", "doctor", "total_slots", "confirmed", "cancelled")
+        read_only_fields = fields
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
@@ -125,8 +296,66 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     def create(self, validated_data: dict[str]) -> User:
         User = get_user_model()
         password = validated_data.pop("password")
-        user = User.objects.create(**validated_data)
-        user.set_password(password)
-        user.save()
+        # hash once (or take the hash computed by the caller, see api.async_views.register) and insert once
+        encoded = validated_data.pop("encoded_password", None) or make_password(password)
+        user = User(**validated_data, password=encoded)
+        user.save(force_insert=True)
+        # a new user belongs to no group, tokens need not query them
+        remember_roles(user, frozenset())
 
         return user
+
+
+class RoleClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Token pair serializer that embeds the user's group names and profile fields as claims.
+
+    With them, read requests are authenticated from the token alone (see api.authentication).
+    """
+
+    @classmethod
+    def get_token(cls, user: User):
+        token = super().get_token(user)
+        set_user_claims(token, user)
+
+        return token
+
+
+def set_user_claims(token: "Token", user: User) -> None:
+    token[ROLES_CLAIM] = sorted(roles_for_user(user))
+    for claim in PROFILE_CLAIMS:
+        token[claim] = getattr(user, claim)
+
+
+def issue_token_pair(user: User) -> dict[str, str]:
+    """The token endpoint's response for `user`, minted directly instead of re-checking the password."""
+    refresh = RoleClaimsTokenObtainPairSerializer.get_token(user)
+    if jwt_settings.UPDATE_LAST_LOGIN:
+        update_last_login(None, user)
+
+    return {"refresh": str(refresh), "access": str(refresh.access_token)}
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuse to refresh tokens revoked by logout or deactivation, and renew the user's claims.
+
+    The access token copies the claims of the refresh token, so roles and profile fields are read
+    from the database again; otherwise a refresh would keep the ones of the original login.
+    """
+
+    def validate(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        refresh = self.token_class(attrs["refresh"])
+        if is_revoked(refresh):
+            raise InvalidToken("Token has been revoked")
+        user = get_user_model().objects.filter(**{jwt_settings.USER_ID_FIELD: refresh.get(jwt_settings.USER_ID_CLAIM)}).first()
+        if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+        set_user_claims(refresh, user)
+
+        data = {"access": str(refresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+
+        return data
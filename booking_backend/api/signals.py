@@ -1,12 +1,16 @@
+from __future__ import annotations
+
 from typing import TYPE_CHECKING
 
-from django.conf import settings
-from django.contrib.auth.models import Group
-from django.core.mail import send_mail
-from django.db.models.signals import post_migrate, post_save
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
 from django.dispatch import receiver
 
-from .models import Booking
+from . import availability, events, occupancy
+from .authentication import revoke_user
+from .models import AppointmentSlot, Booking
+from .notifications import enqueue
+from .slot_cache import bump_slot_versions
 
 if TYPE_CHECKING:
     from django.db.models import Model
@@ -64,7 +68,18 @@ System Rezerwacji
 
 @receiver(post_save, sender=Booking)
 def on_booking_saved(sender: type[Model], instance: Booking, created: bool, **kwargs) -> None:
-    """Send email notifications when booking is created or updated."""
+    """Queue email notifications when booking is created or updated.
+
+    Emails are written to the notification outbox in the booking's transaction and delivered
+    by the `send_notifications` worker, so the request never waits on the mail server.
+    """
+    messages = build_booking_notifications(instance, created)
+    enqueue(messages)
+
+
+def build_booking_notifications(instance: Booking, created: bool) -> list[tuple[str, str, str]]:
+    """Return `(recipient, subject, body)` emails for a created or updated booking."""
+    messages = []
 
     # Get user details
     user_email = None
@@ -87,19 +102,118 @@ def on_booking_saved(sender: type[Model], instance: Booking, created: bool, **kw
     if created and instance.status == Booking.Status.CONFIRMED and user_email:
         subject = "Potwierdzenie rezerwacji wizyty"
         body = _get_booking_confirmation_email_content(user_name, slot_time, doctor_name, instance.reason)
-        send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [user_email], fail_silently=True)
+        messages.append((user_email, subject, body))
 
     # 2. Notify user about cancellation
     if not created and instance.status == Booking.Status.CANCELLED and user_email:
         subject = "Anulowanie rezerwacji wizyty"
         body = _get_booking_cancellation_email_content(user_name, slot_time, doctor_name)
-        send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [user_email], fail_silently=True)
+        messages.append((user_email, subject, body))
 
     # 3. Notify doctor about new booking
     if created and instance.status == Booking.Status.CONFIRMED and doctor_email:
         subject = "Nowa rezerwacja wizyty"
         body = _get_doctor_notification_email_content(doctor_name, slot_time, user_name, instance)
-        send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [doctor_email], fail_silently=True)
+        messages.append((doctor_email, subject, body))
+
+    return messages
+
+
+@receiver(post_save, sender=AppointmentSlot)
+@receiver(post_delete, sender=AppointmentSlot)
+def on_slot_changed(sender: type[Model], instance: AppointmentSlot, **kwargs) -> None:
+    """Invalidate cached slot listings for the slot's current and previously stored doctor."""
+    bump_slot_versions([instance.doctor_id, getattr(instance, "_loaded_doctor_id", None)])
+
+
+@receiver(post_save, sender=AppointmentSlot)
+def on_slot_saved_availability(sender: type[Model], instance: AppointmentSlot, created: bool, **kwargs) -> None:
+    """Keep the doctor availability index in sync with slot writes."""
+    availability.on_slot_saved(instance, created)
+
+
+@receiver(post_delete, sender=AppointmentSlot)
+def on_slot_deleted_availability(sender: type[Model], instance: AppointmentSlot, **kwargs) -> None:
+    availability.on_slot_deleted(instance)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def on_booking_changed(sender: type[Model], instance: Booking, **kwargs) -> None:
+    """Booking writes flip the slot's booked state, so invalidate listings for its doctor.
+
+    A booking moved to another slot also frees its previous slot, which may belong to another doctor.
+    """
+    doctor_ids = [instance.slot.doctor_id]
+    previous = getattr(instance, "_previous_state", None) if kwargs["signal"] is post_save else None
+    if previous is not None and previous[0] != instance.slot_id:
+        doctor_ids.append(AppointmentSlot.objects.filter(pk=previous[0]).values_list("doctor_id", flat=True).first())
+    bump_slot_versions(doctor_ids)
+    availability.on_booking_changed(instance, deleted=kwargs["signal"] is post_delete)
+
+
+@receiver(post_save, sender=AppointmentSlot)
+@receiver(post_delete, sender=AppointmentSlot)
+def on_slot_changed_events(sender: type[Model], instance: AppointmentSlot, **kwargs) -> None:
+    """Publish slot-created/slot-deleted events to open event streams after commit."""
+    if kwargs["signal"] is post_delete:
+        events.on_slot_deleted(instance)
+    else:
+        events.on_slot_saved(instance, kwargs["created"])
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def on_booking_changed_events(sender: type[Model], instance: Booking, **kwargs) -> None:
+    if kwargs["signal"] is post_delete:
+        events.on_booking_deleted(instance)
+    else:
+        events.on_booking_saved(instance, kwargs["created"])
+
+
+@receiver(post_save, sender=AppointmentSlot)
+@receiver(post_delete, sender=AppointmentSlot)
+def on_slot_changed_occupancy(sender: type[Model], instance: AppointmentSlot, **kwargs) -> None:
+    """Keep the daily occupancy aggregates in step with slot writes (in the same transaction)."""
+    if kwargs["signal"] is post_delete:
+        occupancy.on_slot_deleted(instance)
+    else:
+        occupancy.on_slot_saved(instance, kwargs["created"])
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def on_booking_changed_occupancy(sender: type[Model], instance: Booking, **kwargs) -> None:
+    if kwargs["signal"] is post_delete:
+        occupancy.on_booking_deleted(instance)
+    else:
+        occupancy.on_booking_saved(instance, kwargs["created"])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def on_user_changed(sender: type[Model], instance: User, **kwargs) -> None:
+    """Void the tokens of deactivated and deleted users; reads are authenticated from token claims alone."""
+    if kwargs["signal"] is post_delete or not instance.is_active:
+        revoke_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def on_user_groups_changed(sender: type[Model], instance: User | Group, action: str, reverse: bool, pk_set: set[int] | None, **kwargs) -> None:
+    """Void the tokens of users that lose a group: their tokens' role claims would still grant it.
+
+    Added groups need no revocation, the next token refresh picks them up.
+    """
+    if action not in ("post_remove", "pre_clear"):
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == "post_remove":
+        user_ids = pk_set
+    else:
+        user_ids = list(instance.user_set.values_list("pk", flat=True))
+    for user_id in user_ids:
+        revoke_user(user_id)
 
 
 @receiver(post_migrate)
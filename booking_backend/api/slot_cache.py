@@ -0,0 +1,99 @@
+import hashlib
+from collections.abc import Awaitable, Callable, Iterable
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .renderers import FastJSONRenderer
+
+if TYPE_CHECKING:
+    from rest_framework.request import Request
+
+# Slot listings are cached under a key that embeds a version counter. Writes never delete cached
+# responses; they bump the counter so the next read misses and old entries simply expire.
+# Unfiltered listings depend on the global counter, `?doctor=` listings on that doctor's counter.
+# The counters must be shared by all workers, so caching is off (SLOT_CACHE) under a process-local
+# cache; responses then carry ETags computed from fresh data.
+GLOBAL_VERSION_KEY = "slots:version:all"
+
+
+def _doctor_version_key(doctor_id: int) -> str:
+    return f"slots:version:doctor:{doctor_id}"
+
+
+def _bump(key: str) -> None:
+    # add() is a no-op when the key exists; incr() is atomic on memcached/redis and locmem
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # key evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def bump_slot_versions(doctor_ids: Iterable[int | None]) -> None:
+    """Invalidate cached slot listings touching the given doctors (and all unfiltered listings)."""
+    if not settings.SLOT_CACHE:
+        return
+    _bump(GLOBAL_VERSION_KEY)
+    for doctor_id in set(doctor_ids):
+        if doctor_id is not None:
+            _bump(_doctor_version_key(doctor_id))
+
+
+def _version_key(request: "Request") -> str:
+    doctor_id = request.query_params.get("doctor")
+    return _doctor_version_key(int(doctor_id)) if doctor_id and doctor_id.isdigit() else GLOBAL_VERSION_KEY
+
+
+def _entry_key(request: "Request", namespace: str, version: int) -> str:
+    params = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    params_hash = hashlib.md5(repr(params).encode(), usedforsecurity=False).hexdigest()
+    return f"slots:{namespace}:{version}:{params_hash}"
+
+
+def _make_entry(data: Any) -> tuple[str, Any]:
+    # drop DRF's ReturnList/ReturnDict wrappers, which hold a reference to the serializer
+    data = list(data) if isinstance(data, list) else dict(data)
+    etag = '"{}"'.format(hashlib.md5(FastJSONRenderer().render(data), usedforsecurity=False).hexdigest())
+    return etag, data
+
+
+def is_not_modified(request: "Request", etag: str) -> bool:
+    """Whether the request's `If-None-Match` matches `etag`."""
+    header = request.headers.get("If-None-Match", "")
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+    return etag in tags or "*" in tags
+
+
+def cached_slot_response(request: "Request", namespace: str, build: Callable[[], Any]) -> Response:
+    """Serve slot listing data from cache, honouring `If-None-Match` against the stored ETag.
+
+    `build` produces the response data on a cache miss; its JSON rendering is hashed into the ETag.
+    """
+    if not settings.SLOT_CACHE:
+        entry = _make_entry(build())
+    else:
+        key = _entry_key(request, namespace, cache.get(_version_key(request), 0))
+        if (entry := cache.get(key)) is None:
+            entry = _make_entry(build())
+            cache.set(key, entry, timeout=settings.SLOT_CACHE_TIMEOUT)
+
+    etag, data = entry
+    if is_not_modified(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(data, headers={"ETag": etag})
+
+
+async def acached_slot_entry(request: "Request", namespace: str, build: Callable[[], Awaitable[Any]]) -> tuple[str, Any]:
+    """Async `cached_slot_response`: return the cached `(etag, data)` entry, awaiting `build` on a miss."""
+    if not settings.SLOT_CACHE:
+        return _make_entry(await build())
+    key = _entry_key(request, namespace, await cache.aget(_version_key(request), 0))
+    if (entry := await cache.aget(key)) is None:
+        entry = _make_entry(await build())
+        await cache.aset(key, entry, timeout=settings.SLOT_CACHE_TIMEOUT)
+    return entry
@@ -1,10 +1,48 @@
+import asyncio
+import base64
+import csv
 import datetime
+import gzip
+import json
+import pathlib
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from rest_framework.test import APIClient
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import AppointmentSlot, Booking
+from booking_system.db.pool import ConnectionPool
+
+from . import availability, compression, events
+from .authentication import revocations, revoke_user
+from .bulk import book_series
+from .instrumentation import MetricsRegistry, QueryBudgetExceeded, RequestMetrics, capture_request_metrics, collect_published_metrics, registry
+from .models import AppointmentSlot, ArchivedBooking, ArchivedSlot, Booking, DailyOccupancy, Notification
+from .notifications import claim_due, deliver_pending
+from .renderers import FastJSONParser, FastJSONRenderer
+from .scheduling import WeeklyTemplate, create_slots, plan_slots
+from .serializers import BOOKING_ROW_FIELDS, BookingSerializer, RoleClaimsTokenObtainPairSerializer, serialize_booking_rows
+from .views import BookingViewSet
 
 
 class BookingModelTest(TestCase):
@@ -12,7 +50,8 @@ class BookingModelTest(TestCase):
         slot = AppointmentSlot.objects.create(
             start=timezone.now() + datetime.timedelta(days=1),
         )
-        Booking.objects.create(slot=slot, first_name="John", last_name="Doe", email="john@example.com")
+        user = User.objects.create(username="john", first_name="John", last_name="Doe", email="john@example.com")
+        Booking.objects.create(slot=slot, user=user)
         self.assertTrue(slot.is_booked())
 
 
@@ -22,30 +61,1253 @@ class BookingApiTest(TestCase):
         self.slot = AppointmentSlot.objects.create(
             start=timezone.now() + datetime.timedelta(days=1),
         )
+        self.user = User.objects.create(username="jane", first_name="Jane", last_name="Doe", email="jane@example.com")
+        self.client.force_authenticate(self.user)
 
     def test_create_booking_success(self):
         res = self.client.post(
             "/api/bookings/",
             {
                 "slot": self.slot.id,
-                "first_name": "Jane",
-                "last_name": "Doe",
-                "email": "jane@example.com",
+                "reason": "Kontrola",
             },
             format="json",
         )
         self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data["user"], "jane")
 
     def test_booking_full_block(self):
-        Booking.objects.create(slot=self.slot, first_name="X", last_name="Y", email="a@b.com")
+        other = User.objects.create(username="x", email="a@b.com")
+        Booking.objects.create(slot=self.slot, user=other)
         res = self.client.post(
             "/api/bookings/",
             {
                 "slot": self.slot.id,
-                "first_name": "Jane2",
-                "last_name": "Doe2",
-                "email": "jo@example.com",
+                "reason": "Kontrola",
             },
             format="json",
         )
         self.assertEqual(res.status_code, 400)
+
+
+class AppointmentSlotListTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        doctor = User.objects.create(username="doc", first_name="Anna", last_name="Kowalska")
+        doctor.groups.add(Group.objects.get_or_create(name="doctor")[0])
+        patient = User.objects.create(username="patient")
+        start = timezone.now() + datetime.timedelta(days=1)
+        self.slots = [AppointmentSlot.objects.create(start=start + datetime.timedelta(hours=i), doctor=doctor) for i in range(5)]
+        Booking.objects.create(slot=self.slots[0], user=patient)
+        Booking.objects.create(slot=self.slots[1], user=patient, status=Booking.Status.CANCELLED)
+
+    def test_list_runs_single_query(self):
+        with self.assertNumQueries(1):
+            res = self.client.get("/api/appointments/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([slot["is_booked"] for slot in res.data["results"]], [True, False, False, False, False])
+        self.assertEqual(res.data["results"][0]["doctor"], "Anna Kowalska")
+
+    def test_is_booked_uses_annotation(self):
+        slot = AppointmentSlot.objects.with_booking_state().get(pk=self.slots[0].pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(slot.is_booked())
+
+
+class RoleResolutionTest(TestCase):
+    def setUp(self):
+        revocations.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create(username="admin")
+        self.admin.set_password("Admin1234")
+        self.admin.save()
+        self.admin.groups.add(Group.objects.get_or_create(name="administrator")[0])
+        patient = User.objects.create(username="patient")
+        start = timezone.now() + datetime.timedelta(days=1)
+        for i in range(3):
+            slot = AppointmentSlot.objects.create(start=start + datetime.timedelta(hours=i))
+            Booking.objects.create(slot=slot, user=patient)
+
+    def test_groups_loaded_once_per_request(self):
+        self.client.force_authenticate(self.admin)
+        # permission check + serializing three bookings share a single group lookup, then live and archived bookings
+        with self.assertNumQueries(3):
+            res = self.client.get("/api/bookings/all_bookings/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["results"][0]["user"]["username"], "patient")
+
+    @override_settings(JWT_STATELESS_READS=True, ROLES_FROM_TOKEN_CLAIMS=True)
+    def test_roles_read_from_token_claim(self):
+        res = self.client.post("/api/auth/token/", {"username": "admin", "password": "Admin1234"}, format="json")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+        # reads are authenticated from the token claims: bookings queries only, no user or group lookup
+        with self.assertNumQueries(2):
+            res = self.client.get("/api/bookings/all_bookings/")
+        self.assertEqual(res.status_code, 200)
+
+    def test_roles_read_from_groups_by_default(self):
+        res = self.client.post("/api/auth/token/", {"username": "admin", "password": "Admin1234"}, format="json")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+        # the revocation cache is process local in tests, so the token's roles claim is not trusted
+        User.groups.through.objects.filter(user=self.admin).delete()
+        self.assertEqual(self.client.get("/api/bookings/all_bookings/").status_code, 403)
+
+    def test_refresh_renews_roles(self):
+        res = self.client.post("/api/auth/token/", {"username": "admin", "password": "Admin1234"}, format="json")
+        refresh = res.data["refresh"]
+        self.admin.groups.add(Group.objects.get_or_create(name="doctor")[0])
+        res = self.client.post("/api/auth/token/refresh/", {"refresh": refresh}, format="json")
+        self.assertEqual(AccessToken(res.data["access"])["roles"], ["administrator", "doctor"])
+
+    @override_settings(ROLES_FROM_TOKEN_CLAIMS=True)
+    def test_writes_check_current_groups(self):
+        res = self.client.post("/api/auth/token/", {"username": "admin", "password": "Admin1234"}, format="json")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+        # membership removed in the database directly, so no signal revokes the token
+        User.groups.through.objects.filter(user=self.admin).delete()
+        self.assertEqual(self.client.get("/api/bookings/all_bookings/").status_code, 200)
+        res = self.client.post("/api/bookings/bulk_cancel/", {"doctor": self.admin.id, "start": timezone.now(), "end": timezone.now()}, format="json")
+        self.assertEqual(res.status_code, 403)
+
+    def test_removing_group_revokes_tokens(self):
+        res = self.client.post("/api/auth/token/", {"username": "admin", "password": "Admin1234"}, format="json")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+        # revocations cover tokens issued in earlier seconds
+        with mock.patch("api.authentication.time.time", return_value=time.time() + 1):
+            Group.objects.get(name="administrator").user_set.remove(self.admin)
+        self.assertEqual(self.client.get("/api/bookings/all_bookings/").status_code, 401)
+        res = self.client.post("/api/auth/token/refresh/", {"refresh": res.data["refresh"]}, format="json")
+        self.assertEqual(res.status_code, 401)
+
+
+@override_settings(JWT_STATELESS_READS=True, ROLES_FROM_TOKEN_CLAIMS=True)
+class StatelessAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        revocations.clear()
+        self.client = APIClient()
+        self.patient = User.objects.create(username="patient", email="jan@example.com", first_name="Jan", last_name="Nowak")
+        self.patient.set_password("Patient1234")
+        self.patient.save()
+        slot = AppointmentSlot.objects.create(start=timezone.now() + datetime.timedelta(days=1))
+        Booking.objects.create(slot=slot, user=self.patient, reason="Kontrola")
+        res = self.client.post("/api/auth/token/", {"username": "patient", "password": "Patient1234"}, format="json")
+        self.access, self.refresh = res.data["access"], res.data["refresh"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+
+    def test_reads_skip_user_lookup(self):
+        with self.assertNumQueries(0):
+            res = self.client.get("/api/auth/me/")
+        self.assertEqual((res.data["id"], res.data["email"], res.data["first_name"]), (self.patient.id, "jan@example.com", "Jan"))
+        # live and archived bookings
+        with self.assertNumQueries(2):
+            res = self.client.get("/api/bookings/mine/")
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertTrue(res.data["results"][0]["is_owner"])
+
+    @override_settings(JWT_STATELESS_READS=False)
+    def test_reads_load_user_when_disabled(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/api/auth/me/").status_code, 200)
+
+    def test_writes_load_user(self):
+        slot = AppointmentSlot.objects.create(start=timezone.now() + datetime.timedelta(days=2))
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post("/api/bookings/", {"slot": slot.id, "reason": "Kontrola"}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(Booking.objects.get(slot=slot).user, self.patient)
+
+    def test_logout_revokes_tokens(self):
+        res = self.client.post("/api/auth/logout/", {"refresh": self.refresh}, format="json")
+        self.assertEqual(res.status_code, 204)
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 401)
+        self.client.credentials()
+        res = self.client.post("/api/auth/token/refresh/", {"refresh": self.refresh}, format="json")
+        self.assertEqual(res.status_code, 401)
+
+    def test_logout_rejects_foreign_refresh_token(self):
+        other = User.objects.create(username="other")
+        refresh = str(RoleClaimsTokenObtainPairSerializer.get_token(other))
+        res = self.client.post("/api/auth/logout/", {"refresh": refresh}, format="json")
+        self.assertEqual(res.status_code, 403)
+
+    def test_deactivation_revokes_tokens(self):
+        self.patient.is_active = False
+        with mock.patch("api.authentication.time.time", return_value=time.time() + 1):
+            self.patient.save()
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 401)
+
+    def test_token_issued_in_revocation_second_is_valid(self):
+        revoke_user(self.patient.id)
+        res = self.client.post("/api/auth/token/", {"username": "patient", "password": "Patient1234"}, format="json")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 200)
+
+    async def test_async_views_use_claims(self):
+        headers = {"Authorization": f"Bearer {self.access}"}
+        res = await self.async_client.get("/api/async/bookings/mine/", headers=headers)
+        self.assertEqual(res.status_code, 200)
+        await self.async_client.post("/api/auth/logout/", headers=headers)
+        res = await self.async_client.get("/api/async/bookings/mine/", headers=headers)
+        self.assertEqual(res.status_code, 401)
+
+
+class RegistrationTest(TestCase):
+    payload = {"username": "jan", "password": "Kontrola-2024", "email": "jan@example.com", "first_name": "Jan", "last_name": "Nowak"}
+
+    def assert_registered(self, res):
+        self.assertEqual(res.status_code, 201)
+        user = User.objects.get(username="jan")
+        self.assertTrue(user.check_password("Kontrola-2024"))
+        res = self.client.get("/api/auth/me/", headers={"Authorization": f"Bearer {res.json()['access']}"})
+        self.assertEqual(res.json()["email"], "jan@example.com")
+
+    def test_hashes_and_inserts_once(self):
+        with mock.patch("api.serializers.make_password", wraps=make_password) as hasher, self.assertNumQueries(2):
+            res = self.client.post("/api/auth/register/", self.payload, content_type="application/json")
+        hasher.assert_called_once()
+        self.assert_registered(res)
+
+    def test_rejects_taken_username(self):
+        User.objects.create(username="jan")
+        res = self.client.post("/api/auth/register/", self.payload, content_type="application/json")
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("username", res.json())
+
+    async def test_async_register(self):
+        res = await self.async_client.post("/api/async/auth/register/", self.payload, content_type="application/json")
+        await sync_to_async(self.assert_registered)(res)
+        res = await self.async_client.post("/api/async/auth/register/", self.payload, content_type="application/json")
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("username", res.json())
+        res = await self.async_client.get("/api/async/auth/register/")
+        self.assertEqual(res.status_code, 405)
+
+
+class CalendarFeedTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = User.objects.create(username="doc", first_name="Anna", last_name="Kowalska")
+        other = User.objects.create(username="doc2")
+        self.start = (timezone.now() + datetime.timedelta(days=1)).replace(microsecond=0)
+        self.slots = [
+            AppointmentSlot.objects.create(start=self.start + datetime.timedelta(hours=i), doctor=self.doctor if i % 2 == 0 else other) for i in range(4)
+        ]
+        Booking.objects.create(slot=self.slots[2])
+
+    def test_columnar_payload(self):
+        with self.assertNumQueries(1):
+            res = self.client.get("/api/appointments/calendar/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["ids"], [slot.id for slot in self.slots])
+        self.assertEqual(res.data["starts"][0], int(self.start.timestamp()))
+        self.assertEqual(res.data["booked"], [0, 0, 1, 0])
+        self.assertEqual(res.data["doctor_names"], {str(self.doctor.id): "Anna Kowalska", str(self.slots[1].doctor_id): "doc2"})
+
+    def test_filter_by_doctor(self):
+        res = self.client.get("/api/appointments/calendar/", {"doctor": self.doctor.id})
+        self.assertEqual(res.data["ids"], [self.slots[0].id, self.slots[2].id])
+        self.assertEqual(self.client.get("/api/appointments/calendar/", {"doctor": "x"}).status_code, 400)
+
+
+@override_settings(SLOT_CACHE=True)
+class SlotListCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.doctor = User.objects.create(username="doc")
+        self.other = User.objects.create(username="doc2")
+        start = timezone.now() + datetime.timedelta(days=1)
+        self.slot = AppointmentSlot.objects.create(start=start, doctor=self.doctor)
+        self.other_slot = AppointmentSlot.objects.create(start=start, doctor=self.other)
+
+    def test_cached_list_served_without_queries(self):
+        first = self.client.get("/api/appointments/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/appointments/")
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get("/api/appointments/calendar/")["ETag"]
+        res = self.client.get("/api/appointments/calendar/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+    def test_booking_invalidates_listing(self):
+        etag = self.client.get("/api/appointments/", {"doctor": self.doctor.id})["ETag"]
+        other_etag = self.client.get("/api/appointments/", {"doctor": self.other.id})["ETag"]
+        Booking.objects.create(slot=self.slot)
+
+        res = self.client.get("/api/appointments/", {"doctor": self.doctor.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.data["results"][0]["is_booked"])
+        # other doctors' listings keep their cache entries
+        with self.assertNumQueries(0):
+            res = self.client.get("/api/appointments/", {"doctor": self.other.id}, HTTP_IF_NONE_MATCH=other_etag)
+        self.assertEqual(res.status_code, 304)
+
+    def test_reassigning_slot_invalidates_previous_doctor(self):
+        self.client.get("/api/appointments/", {"doctor": self.doctor.id})
+        slot = AppointmentSlot.objects.get(pk=self.slot.pk)
+        slot.doctor = self.other
+        slot.save()
+        res = self.client.get("/api/appointments/", {"doctor": self.doctor.id})
+        self.assertEqual(res.data["results"], [])
+
+    def test_moving_booking_invalidates_previous_doctor(self):
+        booking = Booking.objects.create(slot=self.slot)
+        self.assertTrue(self.client.get("/api/appointments/", {"doctor": self.doctor.id}).data["results"][0]["is_booked"])
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.slot = self.other_slot
+        booking.save()
+        self.assertFalse(self.client.get("/api/appointments/", {"doctor": self.doctor.id}).data["results"][0]["is_booked"])
+
+    @override_settings(SLOT_CACHE=False)
+    def test_disabled_cache_still_answers_if_none_match(self):
+        etag = self.client.get("/api/appointments/")["ETag"]
+        self.assertEqual(self.client.get("/api/appointments/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Booking.objects.create(slot=self.slot)
+        self.assertEqual(self.client.get("/api/appointments/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError("smtp down")
+
+
+class NotificationOutboxTest(TestCase):
+    def setUp(self):
+        doctor = User.objects.create(username="doc", email="doc@example.com")
+        self.patient = User.objects.create(username="patient", email="patient@example.com")
+        self.slot = AppointmentSlot.objects.create(start=timezone.now() + datetime.timedelta(days=1), doctor=doctor)
+
+    def test_booking_queues_instead_of_sending(self):
+        booking = Booking.objects.create(slot=self.slot, user=self.patient)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(sorted(Notification.objects.values_list("recipient", flat=True)), ["doc@example.com", "patient@example.com"])
+
+        booking.status = Booking.Status.CANCELLED
+        booking.save()
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_worker_drains_outbox(self):
+        Booking.objects.create(slot=self.slot, user=self.patient)
+        call_command("send_notifications", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(Notification.objects.exclude(status=Notification.Status.SENT).exists())
+
+    def test_sends_outside_the_claiming_transaction(self):
+        Booking.objects.create(slot=self.slot, user=self.patient)
+        concurrent = []
+
+        def send_messages(messages):
+            # another worker polling meanwhile finds the batch claimed
+            concurrent.append(claim_due(10))
+            return len(messages)
+
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=send_messages):
+            self.assertEqual(deliver_pending(), (2, 0))
+        self.assertEqual(concurrent, [[], []])
+        self.assertEqual(Notification.objects.filter(status=Notification.Status.SENT, attempts=1).count(), 2)
+
+    @override_settings(EMAIL_BACKEND="api.tests.FailingEmailBackend", NOTIFICATION_RETRY_BACKOFF=30)
+    def test_failed_delivery_is_retried_with_backoff(self):
+        Booking.objects.create(slot=self.slot, user=self.patient)
+        self.assertEqual(deliver_pending(max_attempts=2), (0, 0))
+        notification = Notification.objects.first()
+        self.assertEqual(notification.attempts, 1)
+        self.assertEqual(notification.status, Notification.Status.PENDING)
+        self.assertGreater(notification.next_attempt_at, timezone.now() + datetime.timedelta(seconds=20))
+        self.assertIn("smtp down", notification.last_error)
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(max_attempts=2), (0, 2))
+        self.assertEqual(Notification.objects.filter(status=Notification.Status.FAILED).count(), 2)
+
+
+class ScheduleGenerationTest(TestCase):
+    def setUp(self):
+        self.doctor = User.objects.create(username="doc")
+        self.template = WeeklyTemplate.from_dict(
+            self.doctor.id,
+            {"hours": {"mon": [["09:00", "12:00"]], "tue": [["09:00", "11:00"]]}, "slot_minutes": 30, "breaks": [["10:00", "10:45"]]},
+        )
+        today = timezone.localdate()
+        self.monday = today + datetime.timedelta(days=7 - today.weekday())
+
+    def test_template_respects_breaks_and_holidays(self):
+        tz = timezone.get_current_timezone()
+        starts = self.template.slot_starts(self.monday, self.monday, tz)
+        self.assertEqual([start.strftime("%H:%M") for start in starts], ["09:00", "09:30", "10:45", "11:15"])
+
+        holiday = WeeklyTemplate.from_dict(self.doctor.id, {"hours": {"mon": [["09:00", "12:00"]]}, "holidays": [self.monday.isoformat()]})
+        self.assertEqual(holiday.slot_starts(self.monday, self.monday, tz), [])
+
+    def test_plan_skips_existing_slots(self):
+        plan = plan_slots([self.template], self.monday, self.monday + datetime.timedelta(days=6))
+        self.assertEqual((plan.candidates, plan.existing, len(plan.slots)), (6, 0, 6))
+        create_slots(plan.slots[:3])
+
+        with self.assertNumQueries(1):
+            plan = plan_slots([self.template], self.monday, self.monday + datetime.timedelta(days=6))
+        self.assertEqual((plan.candidates, plan.existing, len(plan.slots)), (6, 3, 3))
+        self.assertEqual(create_slots(plan.slots, batch_size=2), 3)
+        self.assertEqual(AppointmentSlot.objects.filter(doctor=self.doctor).count(), 6)
+
+    def test_plan_skips_overlapping_slots(self):
+        # an existing 45 minute slot at 09:15 overlaps the template's 09:00 and 09:30 slots
+        start = datetime.datetime.combine(self.monday, datetime.time(9, 15), timezone.get_current_timezone())
+        AppointmentSlot.objects.create(doctor=self.doctor, start=start, end=start + datetime.timedelta(minutes=45))
+        longer = WeeklyTemplate.from_dict(self.doctor.id, {"hours": {"mon": [["09:00", "12:00"]]}, "slot_minutes": 60})
+        plan = plan_slots([self.template, longer], self.monday, self.monday)
+        # candidates are taken in start order, later ones must not overlap those already planned
+        self.assertEqual((plan.candidates, plan.existing, plan.overlapping), (7, 0, 5))
+        self.assertEqual([(slot.start.strftime("%H:%M"), slot.end.strftime("%H:%M")) for slot in plan.slots], [("10:00", "11:00"), ("11:00", "12:00")])
+
+    def test_populate_slots_dry_run(self):
+        out = StringIO()
+        call_command("populate_slots", "--days", "7", "--dry-run", stdout=out)
+        self.assertIn("Dry run", out.getvalue())
+        self.assertIn("Would create user doctor1", out.getvalue())
+        self.assertFalse(AppointmentSlot.objects.exists())
+        self.assertFalse(User.objects.filter(username="doctor1").exists())
+
+        call_command("populate_slots", "--days", "7", stdout=out)
+        self.assertTrue(AppointmentSlot.objects.filter(doctor__username="doctor1").exists())
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.patient = User.objects.create(username="patient")
+        start = timezone.now() + datetime.timedelta(days=1)
+        self.slots = AppointmentSlot.objects.bulk_create(AppointmentSlot(start=start + datetime.timedelta(hours=i // 2)) for i in range(7))
+        for slot in self.slots[:5]:
+            Booking.objects.create(slot=slot, user=self.patient)
+
+    def _walk(self, url: str) -> list[int]:
+        ids, pages = [], 0
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            ids += [item["id"] for item in res.data["results"]]
+            url, pages = res.data["next"], pages + 1
+        self.assertEqual(pages, 3)
+        return ids
+
+    def test_slots_paginated_by_start_and_id(self):
+        self.assertEqual(self._walk("/api/appointments/?page_size=3"), [slot.id for slot in self.slots])
+
+    def test_ties_are_seeked_without_offset(self):
+        # slots start in pairs, the cursor carries the start and the id of the last row
+        res = self.client.get("/api/appointments/?page_size=3")
+        cursor = parse_qs(urlsplit(res.data["next"]).query)["cursor"][0]
+        self.assertNotIn("o=", base64.b64decode(cursor).decode())
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(res.data["next"])
+        self.assertNotIn("OFFSET", queries[-1]["sql"])
+        self.assertEqual([item["id"] for item in res.data["results"]], [slot.id for slot in self.slots[3:6]])
+        previous = self.client.get(res.data["previous"])
+        self.assertEqual([item["id"] for item in previous.data["results"]], [slot.id for slot in self.slots[:3]])
+
+    @override_settings(SECURE_PROXY_SSL_HEADER=("HTTP_X_FORWARDED_PROTO", "https"))
+    def test_links_keep_scheme_behind_tls_proxy(self):
+        res = self.client.get("/api/appointments/?page_size=3", HTTP_X_FORWARDED_PROTO="https")
+        self.assertTrue(res.data["next"].startswith("https://"))
+
+    def test_mine_paginated_by_created_at(self):
+        self.client.force_authenticate(self.patient)
+        self.assertEqual(self._walk("/api/bookings/mine/?page_size=2"), sorted(Booking.objects.values_list("id", flat=True)))
+
+
+class BookingRowSerializationTest(TestCase):
+    def setUp(self):
+        doctor = User.objects.create(username="doc", first_name="Anna", last_name="Kowalska")
+        self.patient = User.objects.create(username="patient", first_name="Jan")
+        self.admin = User.objects.create(username="admin")
+        self.admin.groups.add(Group.objects.get_or_create(name="administrator")[0])
+        start = timezone.now() + datetime.timedelta(days=1)
+        Booking.objects.create(slot=AppointmentSlot.objects.create(start=start, doctor=doctor), user=self.patient, reason="Kontrola")
+        Booking.objects.create(slot=AppointmentSlot.objects.create(start=start), status=Booking.Status.CANCELLED)
+
+    def _assert_same_output(self, user):
+        request = APIRequestFactory().get("/api/bookings/all_bookings/")
+        request.user = user
+        expected = BookingSerializer(Booking.objects.all(), many=True, context={"request": request}).data
+        rows = Booking.objects.values(*BOOKING_ROW_FIELDS)
+        self.assertEqual(serialize_booking_rows(rows, request), [dict(item) for item in expected])
+
+    def test_matches_serializer_for_administrator(self):
+        self._assert_same_output(self.admin)
+
+    def test_matches_serializer_for_patient(self):
+        self._assert_same_output(self.patient)
+
+
+class AtomicBookingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = User.objects.create(username="patient")
+        self.other = User.objects.create(username="other")
+        self.slot = AppointmentSlot.objects.create(start=timezone.now() + datetime.timedelta(days=1))
+
+    def test_database_rejects_second_confirmed_booking(self):
+        Booking.objects.create(slot=self.slot, user=self.patient)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Booking.objects.create(slot=self.slot, user=self.other)
+
+    def test_taken_slot_returns_400(self):
+        Booking.objects.create(slot=self.slot, user=self.other)
+        self.client.force_authenticate(self.patient)
+        res = self.client.post("/api/bookings/", {"slot": self.slot.id}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data, ["Slot is already booked"])
+
+    def test_cancelled_slot_can_be_booked_again(self):
+        booking = Booking.objects.create(slot=self.slot, user=self.other)
+        booking.status = Booking.Status.CANCELLED
+        booking.save(update_fields=["status"])
+        self.assertIsNone(Booking.objects.get(pk=booking.pk).confirmed_slot_id)
+
+        self.client.force_authenticate(self.patient)
+        res = self.client.post("/api/bookings/", {"slot": self.slot.id}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self.slot.confirmed_booking.user, self.patient)
+
+
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        # forget the key of earlier flushes (e.g. automatic ones during other tests)
+        registry._key = None
+        self.client = APIClient()
+        self.patient = User.objects.create(username="patient")
+        slot = AppointmentSlot.objects.create(start=timezone.now() + datetime.timedelta(days=1))
+        Booking.objects.create(slot=slot, user=self.patient)
+
+    def test_metrics_tagged_by_viewset_action(self):
+        self.client.force_authenticate(self.patient)
+        with capture_request_metrics() as captured:
+            res = self.client.get("/api/bookings/mine/")
+        self.assertIn("db;dur=", res["Server-Timing"])
+        (metrics,) = captured
+        self.assertEqual(metrics.tag, "BookingViewSet.mine")
+        self.assertEqual(metrics.budget, BookingViewSet.query_budgets["mine"])
+        # groups, live and archived bookings
+        self.assertEqual(metrics.queries, 3)
+        self.assertGreater(metrics.serialize_seconds, 0)
+        self.assertEqual(registry.snapshot()["BookingViewSet.mine"]["count"], 1)
+
+    def test_exceeding_budget_fails_tests(self):
+        self.client.force_authenticate(self.patient)
+        with self.settings(QUERY_BUDGET_STRICT=True), mock.patch.dict(BookingViewSet.query_budgets, {"mine": 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get("/api/bookings/mine/")
+
+    def test_workers_publish_under_separate_keys(self):
+        first, second = MetricsRegistry(), MetricsRegistry()
+        first.record(RequestMetrics(tag="a", total_seconds=0.01))
+        second.record(RequestMetrics(tag="b", total_seconds=0.01))
+        first.flush()
+        second.flush()
+        first.flush()
+        self.assertLessEqual({"a", "b"}, set(collect_published_metrics()))
+
+    def test_worker_registers_again_after_counter_loss(self):
+        first, second = MetricsRegistry(), MetricsRegistry()
+        first.record(RequestMetrics(tag="a", total_seconds=0.01))
+        second.record(RequestMetrics(tag="b", total_seconds=0.01))
+        first.flush()
+        cache.clear()
+        # a new worker takes number 1 again; the running one must not overwrite it or stay unlisted
+        second.flush()
+        first.flush()
+        self.assertEqual(set(collect_published_metrics()), {"a", "b"})
+        first.flush()
+        self.assertEqual(collect_published_metrics()["a"].count, 1)
+
+    def test_request_metrics_command(self):
+        self.client.get("/api/appointments/")
+        registry.flush()
+        out = StringIO()
+        call_command("request_metrics", stdout=out)
+        self.assertIn("AppointmentSlotViewSet.list", out.getvalue())
+
+
+class AvailabilityIndexTest(TestCase):
+    def setUp(self):
+        availability._store = None
+        self.client = APIClient()
+        self.doctor = User.objects.create(username="doctor")
+        self.doctor.groups.add(Group.objects.get_or_create(name="doctor")[0])
+        self.patient = User.objects.create(username="patient")
+        tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        self.day_start = datetime.datetime.combine(tomorrow, datetime.time(9), timezone.get_current_timezone())
+        self.slots = [AppointmentSlot.objects.create(doctor=self.doctor, start=self.day_start + datetime.timedelta(hours=hour)) for hour in range(4)]
+        AppointmentSlot.objects.create(doctor=self.doctor, start=self.day_start + datetime.timedelta(days=1))
+        Booking.objects.create(slot=self.slots[1], user=self.patient)
+
+    def test_next_free_slots_and_day_counts(self):
+        after = self.day_start + datetime.timedelta(minutes=30)
+        self.assertEqual([slot_id for _, slot_id in availability.next_free_slots(self.doctor.id, after, limit=2)], [self.slots[2].id, self.slots[3].id])
+        with self.assertNumQueries(0):
+            counts = availability.free_counts_per_day(self.doctor.id, days=3)
+        self.assertEqual(counts[self.day_start.date()], 3)
+        self.assertEqual(counts[self.day_start.date() + datetime.timedelta(days=1)], 1)
+
+    def test_index_follows_bookings_and_slots(self):
+        availability.ensure_loaded([self.doctor.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Booking.objects.create(slot=self.slots[0], user=self.patient)
+        with self.captureOnCommitCallbacks(execute=True):
+            new_slot = AppointmentSlot.objects.create(doctor=self.doctor, start=self.day_start - datetime.timedelta(hours=1))
+        with self.assertNumQueries(0):
+            free = [slot_id for _, slot_id in availability.next_free_slots(self.doctor.id, limit=10)]
+        self.assertEqual(free[:3], [new_slot.id, self.slots[2].id, self.slots[3].id])
+
+        booking.status = Booking.Status.CANCELLED
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save(update_fields=["status"])
+        with self.captureOnCommitCallbacks(execute=True):
+            new_slot.delete()
+        with self.assertNumQueries(0):
+            free = [slot_id for _, slot_id in availability.next_free_slots(self.doctor.id, limit=2)]
+        self.assertEqual(free, [self.slots[0].id, self.slots[2].id])
+
+    def test_moved_booking_frees_previous_slot(self):
+        booking = Booking.objects.get(slot=self.slots[1])
+        availability.ensure_loaded([self.doctor.id])
+        booking.slot = self.slots[2]
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+        free = [slot_id for _, slot_id in availability.next_free_slots(self.doctor.id, limit=3)]
+        self.assertEqual(free, [self.slots[0].id, self.slots[1].id, self.slots[3].id])
+
+    def test_availability_endpoints(self):
+        res = self.client.get("/api/availability/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data[0]["doctor_id"], self.doctor.id)
+        self.assertIsNotNone(res.data[0]["next_free"])
+
+        res = self.client.get(f"/api/availability/{self.doctor.id}/", {"limit": 1, "days": 2})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([slot["id"] for slot in res.data["next"]], [self.slots[0].id])
+        self.assertEqual(res.data["free_per_day"][self.day_start.date().isoformat()], 3)
+        self.assertEqual(self.client.get(f"/api/availability/{self.doctor.id}/", {"after": "soon"}).status_code, 400)
+        self.assertEqual(self.client.get(f"/api/availability/{self.patient.id}/").status_code, 404)
+
+
+class DailyOccupancyTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = User.objects.create(username="doctor")
+        self.patient = User.objects.create(username="patient")
+        self.admin = User.objects.create(username="admin")
+        self.admin.groups.add(Group.objects.get_or_create(name="administrator")[0])
+        self.day = timezone.localdate() + datetime.timedelta(days=2)
+        start = datetime.datetime.combine(self.day, datetime.time(9), timezone.get_current_timezone())
+        self.slots = [AppointmentSlot.objects.create(doctor=self.doctor, start=start + datetime.timedelta(hours=hour)) for hour in range(3)]
+
+    def counts(self, day=None):
+        row = DailyOccupancy.objects.get(day=day or self.day, doctor=self.doctor)
+        return row.total_slots, row.confirmed, row.cancelled
+
+    def test_one_cell_for_slots_without_doctor(self):
+        AppointmentSlot.objects.create(start=self.slots[0].start)
+        AppointmentSlot.objects.create(start=self.slots[1].start)
+        self.assertEqual(DailyOccupancy.objects.get(day=self.day, doctor=None).total_slots, 2)
+        # a transaction that missed the row cannot add a second doctorless cell
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailyOccupancy.objects.create(day=self.day, doctor=None, total_slots=1)
+
+    def test_aggregates_follow_writes(self):
+        booking = Booking.objects.create(slot=self.slots[0], user=self.patient)
+        Booking.objects.create(slot=self.slots[1], user=self.patient)
+        self.assertEqual(self.counts(), (3, 2, 0))
+
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.status = Booking.Status.CANCELLED
+        booking.save(update_fields=["status"])
+        self.assertEqual(self.counts(), (3, 1, 1))
+
+        # moving a booked slot to another day moves its booking too
+        slot = AppointmentSlot.objects.get(pk=self.slots[1].pk)
+        slot.start += datetime.timedelta(days=1)
+        slot.save()
+        self.assertEqual(self.counts(), (2, 0, 1))
+        self.assertEqual(self.counts(self.day + datetime.timedelta(days=1)), (1, 1, 0))
+
+        self.slots[0].delete()
+        self.assertEqual(self.counts(), (1, 0, 0))
+
+    def test_rebuild_matches_incremental_counts(self):
+        Booking.objects.create(slot=self.slots[2], user=self.patient)
+        create_slots([AppointmentSlot(doctor=self.doctor, start=self.slots[2].start + datetime.timedelta(hours=1))])
+        incremental = sorted(DailyOccupancy.objects.values_list("day", "doctor_id", "total_slots", "confirmed", "cancelled"))
+        self.assertEqual(incremental, [(self.day, self.doctor.id, 4, 1, 0)])
+
+        DailyOccupancy.objects.all().delete()
+        call_command("rebuild_occupancy", stdout=StringIO())
+        self.assertEqual(sorted(DailyOccupancy.objects.values_list("day", "doctor_id", "total_slots", "confirmed", "cancelled")), incremental)
+
+    def test_stats_endpoint(self):
+        Booking.objects.create(slot=self.slots[0], user=self.patient)
+        self.client.force_authenticate(self.patient)
+        self.assertEqual(self.client.get("/api/occupancy/").status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        res = self.client.get("/api/occupancy/", {"start": self.day.isoformat(), "doctor": self.doctor.id})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["results"], [{"day": self.day.isoformat(), "doctor": self.doctor.id, "total_slots": 3, "confirmed": 1, "cancelled": 0}])
+
+        res = self.client.get("/api/occupancy/summary/")
+        self.assertEqual(res.data, [{"doctor": self.doctor.id, "total_slots": 3, "confirmed": 1, "cancelled": 0, "utilization": 0.3333}])
+
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = User.objects.create(username="doctor")
+        self.patient = User.objects.create(username="patient")
+        self.admin = User.objects.create(username="admin")
+        self.admin.groups.add(Group.objects.get_or_create(name="administrator")[0])
+        old = timezone.now() - datetime.timedelta(days=400)
+        self.old_slots = [AppointmentSlot.objects.create(doctor=self.doctor, start=old + datetime.timedelta(hours=hour)) for hour in range(3)]
+        self.booking = Booking.objects.create(slot=self.old_slots[0], user=self.patient, reason="Kontrola")
+        Booking.objects.create(slot=self.old_slots[1], user=self.patient, status=Booking.Status.CANCELLED)
+        self.recent = AppointmentSlot.objects.create(doctor=self.doctor, start=timezone.now() - datetime.timedelta(days=10))
+        Booking.objects.create(slot=self.recent, user=self.patient)
+
+    def occupancy(self):
+        return sorted(DailyOccupancy.objects.values_list("day", "doctor_id", "total_slots", "confirmed", "cancelled"))
+
+    def test_moves_old_slots_in_batches(self):
+        before, notifications = self.occupancy(), Notification.objects.count()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            call_command("archive_history", "--batch-size", "2", stdout=(out := StringIO()))
+        self.assertIn("Archived 3 slots and 2 bookings", out.getvalue())
+        # no cancellation side effects
+        self.assertEqual(callbacks, [])
+        self.assertEqual(Notification.objects.count(), notifications)
+
+        self.assertEqual(list(AppointmentSlot.objects.values_list("id", flat=True)), [self.recent.id])
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(sorted(ArchivedSlot.objects.values_list("id", flat=True)), [slot.id for slot in self.old_slots])
+        archived = ArchivedBooking.objects.get(pk=self.booking.pk)
+        self.assertEqual((archived.slot_id, archived.user, archived.reason), (self.booking.slot_id, self.patient, "Kontrola"))
+        self.assertEqual(archived.created_at, self.booking.created_at)
+
+        # archived days keep their counts, also when rebuilt
+        self.assertEqual(self.occupancy(), before)
+        call_command("rebuild_occupancy", stdout=StringIO())
+        self.assertEqual(self.occupancy(), before)
+
+        call_command("archive_history", stdout=(out := StringIO()))
+        self.assertIn("Archived 0 slots", out.getvalue())
+
+    def test_admin_reads_archive(self):
+        call_command("archive_history", stdout=StringIO())
+        self.client.force_authenticate(self.admin)
+        res = self.client.get("/api/bookings/all_bookings/", {"archived": "false"})
+        self.assertEqual(len(res.data["results"]), 1)
+        res = self.client.get("/api/bookings/all_bookings/", {"archived": "true", "page_size": 1})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["results"][0]["id"], self.booking.id)
+        self.assertEqual(res.data["results"][0]["slot_details"]["start"], self.old_slots[0].start)
+        self.assertEqual(len(self.client.get(res.data["next"]).data["results"]), 1)
+
+    def test_listings_merge_live_and_archived(self):
+        call_command("archive_history", stdout=StringIO())
+        expected = sorted(Booking.objects.values_list("created_at", "id")) + sorted(ArchivedBooking.objects.values_list("created_at", "id"))
+        expected = [booking_id for _, booking_id in sorted(expected)]
+        self.client.force_authenticate(self.admin)
+        ids, url = [], "/api/bookings/all_bookings/?page_size=2"
+        while url:
+            res = self.client.get(url)
+            ids += [item["id"] for item in res.data["results"]]
+            url = res.data["next"]
+        self.assertEqual(ids, expected)
+        self.assertEqual(self.client.get("/api/bookings/all_bookings/", {"archived": "maybe"}).status_code, 400)
+
+        self.client.force_authenticate(self.patient)
+        res = self.client.get("/api/bookings/mine/")
+        self.assertEqual([item["id"] for item in res.data["results"]], expected)
+
+        self.client.force_authenticate(self.admin)
+        res = self.client.get("/api/bookings/export/", {"output": "ndjson"})
+        self.assertEqual([json.loads(line)["id"] for line in b"".join(res.streaming_content).splitlines()], sorted(expected))
+
+
+class BulkBookingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = User.objects.create(username="doctor", email="doctor@example.com")
+        self.doctor.groups.add(Group.objects.get_or_create(name="doctor")[0])
+        self.patient = User.objects.create(username="patient", email="patient@example.com")
+        self.start = timezone.now() + datetime.timedelta(days=1)
+        self.slots = [AppointmentSlot.objects.create(doctor=self.doctor, start=self.start + datetime.timedelta(days=7 * week)) for week in range(4)]
+
+    def test_book_series(self):
+        self.client.force_authenticate(self.patient)
+        with mock.patch("api.signals.enqueue") as per_row_enqueue:
+            res = self.client.post("/api/bookings/series/", {"slots": [slot.id for slot in self.slots], "reason": "therapy"}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual([row["slot"] for row in res.data], [slot.id for slot in self.slots])
+        per_row_enqueue.assert_not_called()
+        self.assertEqual(Booking.objects.filter(user=self.patient, confirmed_slot__isnull=False).count(), 4)
+        # patient confirmation and doctor notice per booking, written in one step
+        self.assertEqual(Notification.objects.count(), 8)
+        self.assertEqual(sum(DailyOccupancy.objects.values_list("confirmed", flat=True)), 4)
+
+    def test_series_is_all_or_nothing(self):
+        Booking.objects.create(slot=self.slots[2], user=self.doctor)
+        self.client.force_authenticate(self.patient)
+        res = self.client.post("/api/bookings/series/", {"slots": [slot.id for slot in self.slots]}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data["slots"], [f"Slot {self.slots[2].id} is not available"])
+        self.assertFalse(Booking.objects.filter(user=self.patient).exists())
+
+    def test_bulk_cancel(self):
+        for slot in self.slots:
+            Booking.objects.create(slot=slot, user=self.patient)
+        Notification.objects.all().delete()
+        end = self.start + datetime.timedelta(days=8)
+
+        self.client.force_authenticate(self.patient)
+        res = self.client.post("/api/bookings/bulk_cancel/", {"doctor": self.doctor.id, "start": self.start.isoformat(), "end": end.isoformat()}, format="json")
+        self.assertEqual(res.status_code, 403)
+
+        self.client.force_authenticate(self.doctor)
+        res = self.client.post("/api/bookings/bulk_cancel/", {"start": self.start.isoformat(), "end": end.isoformat()}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data["cancelled"]), 2)
+        cancelled = Booking.objects.filter(status=Booking.Status.CANCELLED)
+        self.assertEqual({booking.slot_id for booking in cancelled}, {self.slots[0].id, self.slots[1].id})
+        self.assertFalse(cancelled.filter(confirmed_slot__isnull=False).exists())
+        self.assertEqual(Notification.objects.filter(recipient=self.patient.email).count(), 2)
+        self.assertEqual(DailyOccupancy.objects.get(day=timezone.localdate(self.slots[0].start)).cancelled, 1)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTest(TransactionTestCase):
+    # TransactionTestCase: the router keeps reads inside an open transaction on the primary
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.patient = User.objects.create(username="patient")
+        self.primary_slot = AppointmentSlot.objects.create(start=timezone.now() + datetime.timedelta(days=1))
+        # written only to the replica; bulk_create skips the signal handlers that write to the primary
+        replica_slot = AppointmentSlot(id=self.primary_slot.id + 100, start=timezone.now() + datetime.timedelta(days=2))
+        (self.replica_slot,) = AppointmentSlot.objects.using("replica").bulk_create([replica_slot])
+
+    def listed_ids(self):
+        return [slot["id"] for slot in self.client.get("/api/appointments/").data["results"]]
+
+    def test_public_slot_list_reads_replica(self):
+        self.assertEqual(self.listed_ids(), [self.replica_slot.id])
+
+    def test_client_reads_primary_after_write(self):
+        self.client.force_authenticate(self.patient)
+        res = self.client.post("/api/bookings/", {"slot": self.primary_slot.id}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertIn("db_primary_pin", res.cookies)
+        self.assertEqual(self.listed_ids(), [self.primary_slot.id])
+
+    def test_other_actions_and_transactions_use_primary(self):
+        self.client.force_authenticate(self.patient)
+        self.assertEqual(self.client.get(f"/api/appointments/{self.primary_slot.id}/").status_code, 200)
+        with transaction.atomic():
+            self.assertEqual(self.listed_ids(), [self.primary_slot.id])
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def test_reuses_released_connections(self):
+        pool = ConnectionPool(max_idle=1)
+        first, second = mock.Mock(), mock.Mock()
+        connect = mock.Mock(side_effect=[first, second])
+        self.assertIs(pool.acquire(connect, lambda conn: True), first)
+        self.assertIs(pool.acquire(connect, lambda conn: True), second)
+
+        pool.release(first, lambda conn: conn.rollback())
+        pool.release(second, lambda conn: conn.rollback())
+        # only one idle connection is kept, the other one is closed
+        second.close.assert_called_once()
+        self.assertIs(pool.acquire(connect, lambda conn: True), first)
+        first.rollback.assert_called_once()
+
+    def test_discards_broken_connections(self):
+        pool = ConnectionPool(max_idle=2)
+        stale, fresh = mock.Mock(), mock.Mock()
+        pool.release(stale, lambda conn: None)
+        self.assertIs(pool.acquire(lambda: fresh, lambda conn: conn is not stale), fresh)
+        stale.close.assert_called_once()
+
+        broken = mock.Mock(**{"rollback.side_effect": RuntimeError})
+        pool.release(broken, lambda conn: conn.rollback())
+        broken.close.assert_called_once()
+        self.assertIs(pool.acquire(lambda: fresh, lambda conn: True), fresh)
+
+
+class AsyncReadEndpointTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create(username="doctor", first_name="Anna")
+        self.doctor.groups.add(Group.objects.get_or_create(name="doctor")[0])
+        self.patient = User.objects.create(username="patient")
+        slots = [AppointmentSlot.objects.create(doctor=self.doctor, start=timezone.now() + datetime.timedelta(hours=hour + 1)) for hour in range(5)]
+        for slot in slots[:3]:
+            Booking.objects.create(slot=slot, user=self.patient, reason="Kontrola")
+        token = RoleClaimsTokenObtainPairSerializer.get_token(self.patient).access_token
+        self.auth = {"Authorization": f"Bearer {token}"}
+
+    async def assert_same_output(self, sync_path, async_path, params=None, headers=None):
+        sync_res = await self.async_client.get(sync_path, params or {}, headers=headers)
+        async_res = await self.async_client.get(async_path, params or {}, headers=headers)
+        self.assertEqual(async_res.status_code, sync_res.status_code)
+        self.assertEqual(async_res["Content-Type"], sync_res["Content-Type"])
+        # page links differ only in the path they point at
+        self.assertEqual(async_res.content.replace(async_path.encode(), sync_path.encode()), sync_res.content)
+        return async_res
+
+    async def test_slot_list(self):
+        res = await self.assert_same_output("/api/appointments/", "/api/async/appointments/", {"page_size": 2})
+        next_page = await self.async_client.get(res.json()["next"])
+        self.assertEqual(len(next_page.json()["results"]), 2)
+        not_modified = await self.async_client.get("/api/async/appointments/", {"page_size": 2}, headers={"If-None-Match": res["ETag"]})
+        self.assertEqual(not_modified.status_code, 304)
+        await self.assert_same_output("/api/appointments/", "/api/async/appointments/", {"doctor": "x"})
+
+    async def test_calendar(self):
+        await self.assert_same_output("/api/appointments/calendar/", "/api/async/appointments/calendar/", {"doctor": self.doctor.id})
+
+    async def test_mine(self):
+        res = await self.assert_same_output("/api/bookings/mine/", "/api/async/bookings/mine/", {"page_size": 2}, self.auth)
+        self.assertEqual(len(res.json()["results"]), 2)
+        res = await self.assert_same_output("/api/bookings/mine/", "/api/async/bookings/mine/")
+        self.assertEqual(res.status_code, 401)
+        res = await self.assert_same_output("/api/bookings/mine/", "/api/async/bookings/mine/", headers={"Authorization": "Bearer nope"})
+        self.assertEqual(res.status_code, 401)
+
+
+class SlotEventStreamTest(TestCase):
+    def setUp(self):
+        events._broker = None
+        self.doctor = User.objects.create(username="doctor")
+        self.other_doctor = User.objects.create(username="other")
+        self.patient = User.objects.create(username="patient")
+        self.start = timezone.now() + datetime.timedelta(days=1)
+
+    def test_broker_failure_does_not_fail_committed_booking(self):
+        slot = AppointmentSlot.objects.create(doctor=self.doctor, start=self.start)
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        broker = mock.Mock(**{"publish.side_effect": ConnectionError("broker down")})
+        with mock.patch.object(events, "get_broker", return_value=broker), self.assertLogs("django.test", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                res = client.post("/api/bookings/", {"slot": slot.id, "reason": "Kontrola"}, format="json")
+        self.assertEqual(res.status_code, 201)
+        broker.publish.assert_called_once()
+
+    def test_repeated_saves_see_their_own_previous_state(self):
+        slot = AppointmentSlot.objects.create(doctor=self.doctor, start=self.start)
+        other = AppointmentSlot.objects.create(doctor=self.doctor, start=self.start + datetime.timedelta(hours=1))
+        booking = Booking.objects.create(slot=slot, user=self.patient)
+        broker = mock.Mock()
+        with mock.patch.object(events, "get_broker", return_value=broker), self.captureOnCommitCallbacks(execute=True):
+            booking.slot = other
+            booking.save()
+            booking.status = Booking.Status.CANCELLED
+            booking.save()
+        published = [(event.kind, event.slot_id) for call in broker.publish.call_args_list for event in call.args[0]]
+        self.assertEqual(published, [("slot-freed", slot.id), ("slot-booked", other.id), ("slot-freed", other.id)])
+        self.assertEqual(DailyOccupancy.objects.aggregate(confirmed=Sum("confirmed"), cancelled=Sum("cancelled")), {"confirmed": 0, "cancelled": 1})
+
+    def test_writes_publish_events_after_commit(self):
+        broker = mock.Mock()
+        with mock.patch.object(events, "get_broker", return_value=broker):
+            with self.captureOnCommitCallbacks(execute=True):
+                slot = AppointmentSlot.objects.create(doctor=self.doctor, start=self.start)
+                other = AppointmentSlot.objects.create(doctor=self.doctor, start=self.start + datetime.timedelta(hours=1))
+            with self.captureOnCommitCallbacks(execute=True):
+                booking = Booking.objects.create(slot=slot, user=self.patient)
+            self.assertEqual(broker.publish.call_count, 3)
+            booking = Booking.objects.get(pk=booking.pk)
+            booking.slot = other
+            with self.captureOnCommitCallbacks(execute=True):
+                booking.save()
+            booking = Booking.objects.get(pk=booking.pk)
+            booking.status = Booking.Status.CANCELLED
+            with self.captureOnCommitCallbacks(execute=True):
+                booking.save()
+                book_series(self.patient, [slot.pk])
+                slot_id = slot.pk
+                slot.delete()
+        published = [(event.kind, event.slot_id, event.free) for call in broker.publish.call_args_list for event in call.args[0]]
+        self.assertEqual(
+            published,
+            [
+                ("slot-created", slot_id, True),
+                ("slot-created", other.pk, True),
+                ("slot-booked", slot_id, False),
+                ("slot-freed", slot_id, True),
+                ("slot-booked", other.pk, False),
+                ("slot-freed", other.pk, True),
+                ("slot-booked", slot_id, False),
+                ("slot-freed", slot_id, True),
+                ("slot-deleted", slot_id, False),
+            ],
+        )
+
+    async def test_stream_sends_matching_events(self):
+        response = await self.async_client.get("/api/events/slots/", {"doctor": self.doctor.id, "start": self.start.date().isoformat()})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b"retry: 3000\n\n")
+        events.get_broker().publish(
+            [
+                events.SlotEvent(events.SLOT_BOOKED, 1, self.other_doctor.id, self.start, free=False),
+                events.SlotEvent(events.SLOT_BOOKED, 2, self.doctor.id, self.start - datetime.timedelta(days=2), free=False),
+                events.SlotEvent(events.SLOT_FREED, 3, self.doctor.id, self.start, free=True),
+            ]
+        )
+        chunk = await asyncio.wait_for(anext(chunks), timeout=1)
+        self.assertTrue(chunk.startswith(b"event: slot-freed\ndata: "))
+        self.assertEqual(json.loads(chunk.split(b"data: ")[1])["slot"], 3)
+        # a client disconnect cancels the pending read, which unsubscribes the stream
+        pending = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertFalse(events.get_broker()._subscriptions)
+
+    def test_stream_requires_asgi(self):
+        self.assertEqual(self.client.get("/api/events/slots/").status_code, 501)
+
+
+class ResponseEncodingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        start = timezone.now() + datetime.timedelta(days=1)
+        AppointmentSlot.objects.bulk_create(AppointmentSlot(start=start + datetime.timedelta(minutes=30 * i)) for i in range(50))
+
+    def test_fast_renderer_matches_drf(self):
+        data = {
+            "start": datetime.datetime(2026, 1, 1, 10, 0, 0, 123456, tzinfo=datetime.UTC),
+            "day": datetime.date(2026, 1, 2),
+            "ratio": Decimal("0.5"),
+            "name": "Zażółć\u2028",
+            "nested": [{"id": 1, "doctor": None}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        with self.settings(FAST_JSON=False):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_fast_parser(self):
+        self.assertEqual(FastJSONParser().parse(BytesIO('{"reason": "ból"}'.encode())), {"reason": "ból"})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b"{"))
+
+    def test_large_get_responses_are_compressed(self):
+        plain = self.client.get("/api/appointments/")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertTrue(plain.json()["results"][0]["start"].endswith("Z"))
+
+        res = self.client.get("/api/appointments/", headers={"Accept-Encoding": "br;q=0, gzip"})
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertEqual(res["ETag"], "W/" + plain["ETag"])
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertIn("Accept-Encoding", res["Vary"])
+
+        with mock.patch.object(compression, "brotli", mock.Mock(**{"compress.return_value": b"br"})):
+            res = self.client.get("/api/appointments/", headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual((res["Content-Encoding"], res.content), ("br", b"br"))
+
+        small = self.client.get("/api/appointments/", {"page_size": 1}, headers={"Accept-Encoding": "gzip"})
+        self.assertFalse(small.has_header("Content-Encoding"))
+
+
+class BookingExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = User.objects.create(username="doctor", first_name="Anna", last_name="Kowalska")
+        self.patient = User.objects.create(username="patient")
+        self.admin = User.objects.create(username="admin")
+        self.admin.groups.add(Group.objects.get_or_create(name="administrator")[0])
+        start = timezone.now() + datetime.timedelta(days=1)
+        slots = [AppointmentSlot.objects.create(doctor=self.doctor if i else None, start=start + datetime.timedelta(hours=i)) for i in range(3)]
+        self.bookings = [
+            Booking.objects.create(slot=slots[0], user=self.patient, reason="=HYPERLINK(1)"),
+            Booking.objects.create(slot=slots[1], user=self.patient, reason="Kontrola, ból"),
+            Booking.objects.create(slot=slots[2], status=Booking.Status.CANCELLED),
+        ]
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        res = self.client.get("/api/bookings/export/", params)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        return b"".join(res.streaming_content).decode()
+
+    def test_csv(self):
+        rows = list(csv.reader(StringIO(self.export())))
+        self.assertEqual(rows[0], ["id", "slot", "start", "doctor", "doctor_name", "user", "username", "status", "reason", "created_at"])
+        self.assertEqual([row[0] for row in rows[1:]], [str(booking.id) for booking in self.bookings])
+        # formulas are neutralized, quoting is left to the csv module
+        self.assertEqual(rows[1][8], "'=HYPERLINK(1)")
+        self.assertEqual(rows[2][3:5] + rows[2][8:9], [str(self.doctor.id), "Anna Kowalska", "Kontrola, ból"])
+        self.assertTrue(rows[2][2].endswith("Z"))
+
+        rows = list(csv.reader(StringIO(self.export(status="cancelled", doctor=self.doctor.id))))
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.bookings[2].id)])
+        self.assertEqual(len(list(csv.reader(StringIO(self.export(start="2000-01-01", end="2000-01-02"))))), 1)
+
+    def test_ndjson(self):
+        lines = self.export(output="ndjson").splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([record["id"] for record in records], [booking.id for booking in self.bookings])
+        self.assertEqual(records[1]["reason"], "Kontrola, ból")
+        self.assertIsNone(records[0]["doctor_name"])
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self.client.get("/api/bookings/export/", {"output": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/bookings/export/", {"status": "lost"}).status_code, 400)
+        self.client.force_authenticate(self.patient)
+        self.assertEqual(self.client.get("/api/bookings/export/").status_code, 403)
+
+    def test_gzip_streams(self):
+        res = self.client.get("/api/bookings/export/", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(res.streaming_content)).decode(), self.export())
+
+    def test_memory_stays_flat(self):
+        slot = AppointmentSlot.objects.create(start=timezone.now() + datetime.timedelta(days=5))
+        for _ in range(20):
+            Booking.objects.bulk_create(Booking(slot=slot, user=self.patient, reason="Kontrola okresowa", status=Booking.Status.CANCELLED) for _ in range(5000))
+        res = self.client.get("/api/bookings/export/", {"output": "ndjson"})
+        tracemalloc.start()
+        try:
+            lines = 0
+            for chunk in res.streaming_content:
+                lines += chunk.count(b"\n")
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(lines, 100_003)
+        # one page of EXPORT_CHUNK_SIZE rows at a time, materializing the 100k rows takes tens of MB
+        self.assertLess(peak, 10 * 1024 * 1024)
+
+
+class SlotOverlapTest(TestCase):
+    def setUp(self):
+        self.doctor = User.objects.create(username="doctor")
+        self.doctor.groups.add(Group.objects.get_or_create(name="doctor")[0])
+        self.client = APIClient()
+        self.client.force_authenticate(self.doctor)
+        self.start = (timezone.now() + datetime.timedelta(days=1)).replace(microsecond=0)
+        self.slot = AppointmentSlot.objects.create(doctor=self.doctor, start=self.start, end=self.start + datetime.timedelta(minutes=30))
+
+    def test_create_rejects_overlaps(self):
+        res = self.client.post("/api/appointments/", {"start": self.start + datetime.timedelta(minutes=15)}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data["start"], [f"Overlaps slot {self.slot.id}"])
+
+        res = self.client.post("/api/appointments/", {"start": self.start + datetime.timedelta(minutes=30)}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data["end"], self.start + datetime.timedelta(minutes=90))
+
+        end = self.start + datetime.timedelta(hours=11)
+        res = self.client.post("/api/appointments/", {"start": self.start + datetime.timedelta(hours=2), "end": end}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("end", res.data)
+
+    def test_update_keeps_length_and_ignores_itself(self):
+        res = self.client.patch(f"/api/appointments/{self.slot.id}/", {"start": self.start + datetime.timedelta(minutes=10)}, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.end - self.slot.start, datetime.timedelta(minutes=30))
+
+    def test_overlap_query_is_bounded_range(self):
+        query = str(AppointmentSlot.objects.overlapping(self.doctor.id, self.start, self.start + datetime.timedelta(hours=1)).query)
+        # bounded on both sides of `start`, so the (doctor, start, end) index is range scanned
+        self.assertIn('"start" > ', query)
+        self.assertIn('"start" < ', query)
+        self.assertEqual(list(AppointmentSlot.objects.overlapping(self.doctor.id, self.start - datetime.timedelta(minutes=30), self.start)), [])
+
+
+class SlotImportTest(TestCase):
+    def setUp(self):
+        self.doctor = User.objects.create(username="doctor")
+        self.doctor.groups.add(Group.objects.get_or_create(name="doctor")[0])
+        self.patient = User.objects.create(username="patient")
+        self.admin = User.objects.create(username="admin")
+        self.admin.groups.add(Group.objects.get_or_create(name="administrator")[0])
+        self.start = (timezone.now() + datetime.timedelta(days=1)).replace(microsecond=0)
+        self.existing = AppointmentSlot.objects.create(doctor=self.doctor, start=self.start, end=self.start + datetime.timedelta(minutes=30))
+
+    def at(self, minutes):
+        return (self.start + datetime.timedelta(minutes=minutes)).isoformat()
+
+    def write(self, name, content):
+        path = pathlib.Path(self.enterContext(tempfile.TemporaryDirectory())) / name
+        path.write_text(content)
+        return str(path)
+
+    def csv_file(self):
+        return (
+            "doctor,start,end,patient,status,reason\n"
+            f"doctor,{self.at(60)},{self.at(90)},patient,,Kontrola\n"
+            f"doctor,{self.at(90)},,,,\n"
+            f"nobody,{self.at(200)},,,,\n"
+            f"doctor,{self.at(15)},,,,\n"
+            f"doctor,{self.at(60)},{self.at(90)},,,\n"
+            "doctor,not a date,,,,\n"
+            f"doctor,{self.at(300)},,patient,cancelled,\n"
+        )
+
+    def test_imports_valid_rows_and_reports_the_rest(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("import_slots", self.write("slots.csv", self.csv_file()), "--batch-size", "3", stdout=(out := StringIO()))
+        self.assertIn("Imported 3 slots and 2 bookings from 7 rows, 4 rows skipped", out.getvalue())
+        self.assertIn("line 4: doctor: Unknown doctor 'nobody'", out.getvalue())
+        self.assertIn("line 5: start: Overlaps another slot of the doctor", out.getvalue())
+        self.assertIn("line 6: start: Slot already exists", out.getvalue())
+        self.assertIn("line 7: start:", out.getvalue())
+
+        self.assertEqual(AppointmentSlot.objects.count(), 4)
+        confirmed = Booking.objects.get(status=Booking.Status.CONFIRMED)
+        self.assertEqual((confirmed.user, confirmed.reason, confirmed.slot.end), (self.patient, "Kontrola", self.start + datetime.timedelta(minutes=90)))
+        self.assertEqual(confirmed.confirmed_slot_id, confirmed.slot_id)
+        self.assertEqual(Notification.objects.count(), 0)
+        # occupancy as if the rows had been created one by one
+        before = sorted(DailyOccupancy.objects.values_list("day", "doctor_id", "total_slots", "confirmed", "cancelled"))
+        call_command("rebuild_occupancy", stdout=StringIO())
+        self.assertEqual(sorted(DailyOccupancy.objects.values_list("day", "doctor_id", "total_slots", "confirmed", "cancelled")), before)
+
+    def test_json_lines_dry_run(self):
+        rows = [{"doctor": "doctor", "start": self.at(60)}, "[1]", {"doctor": "doctor", "start": self.at(60)}]
+        content = "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows)
+        call_command("import_slots", self.write("slots.jsonl", content), "--dry-run", "--json", stdout=(out := StringIO()))
+        result = json.loads(out.getvalue())
+        self.assertEqual((result["rows"], result["slots"], result["error_count"]), (3, 1, 2))
+        self.assertEqual([error["line"] for error in result["errors"]], [2, 3])
+        self.assertEqual(AppointmentSlot.objects.count(), 1)
+
+    def test_admin_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        upload = SimpleUploadedFile("slots.csv", self.csv_file().encode())
+        self.assertEqual(client.post("/api/import/", {"file": upload}, format="multipart").status_code, 403)
+
+        client.force_authenticate(self.admin)
+        upload = SimpleUploadedFile("slots.csv", self.csv_file().encode())
+        res = client.post("/api/import/", {"file": upload}, format="multipart")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data["slots"], res.data["bookings"], res.data["error_count"]), (3, 2, 4))
+
+        res = client.post("/api/import/", {"file": SimpleUploadedFile("slots.xlsx", b"")}, format="multipart")
+        self.assertEqual(res.status_code, 400)
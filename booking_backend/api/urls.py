@@ -5,16 +5,27 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
-from .views import AppointmentSlotViewSet, BookingViewSet, CurrentUserView, RegisterView
+from . import async_views
+from .views import AppointmentSlotViewSet, AvailabilityViewSet, BookingViewSet, CurrentUserView, LogoutView, OccupancyViewSet, RegisterView, SlotImportView
 
 router = DefaultRouter()
 router.register(r"appointments", AppointmentSlotViewSet, basename="appointments")
 router.register(r"bookings", BookingViewSet, basename="bookings")
+router.register(r"availability", AvailabilityViewSet, basename="availability")
+router.register(r"occupancy", OccupancyViewSet, basename="occupancy")
 
 urlpatterns = [
+    # async (ASGI) versions of the hot read endpoints and registration, same responses as their sync views
+    path("async/appointments/", async_views.slot_list, name="async-appointments-list"),
+    path("async/appointments/calendar/", async_views.slot_calendar, name="async-appointments-calendar"),
+    path("async/bookings/mine/", async_views.my_bookings, name="async-bookings-mine"),
+    path("async/auth/register/", async_views.register, name="async-auth-register"),
+    path("events/slots/", async_views.slot_events, name="slot-events"),
     path("", include(router.urls)),
     path("auth/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("auth/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("auth/register/", RegisterView.as_view(), name="auth_register"),
+    path("auth/logout/", LogoutView.as_view(), name="auth_logout"),
     path("auth/me/", CurrentUserView.as_view(), name="current_user"),
+    path("import/", SlotImportView.as_view(), name="slot_import"),
 ]
@@ -1,50 +1,156 @@
+import dataclasses
+import datetime
+import io
 from typing import TYPE_CHECKING
 
+from django.contrib.auth.models import User
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.generic import TemplateView
-from rest_framework import permissions, status, viewsets
+from rest_framework import mixins, permissions, serializers, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-
-from .models import AppointmentSlot, Booking
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import availability, exports, imports
+from .authentication import revoke_token
+from .bulk import cancel_doctor_bookings
+from .feeds import build_calendar_feed
+from .instrumentation import serialization_timer
+from .models import AppointmentSlot, ArchivedBooking, Booking, DailyOccupancy
+from .pagination import BookingPagination, OccupancyPagination, SlotPagination
 from .permissions import (
     CanCreateBooking,
     IsAdministrator,
     IsBookingOwnerOrReadOnly,
     IsDoctor,
 )
-from .serializers import AppointmentSlotSerializer, BookingPublicSerializer, BookingSerializer, UserRegistrationSerializer
+from .roles import is_administrator, is_doctor
+from .serializers import (
+    BOOKING_ROW_FIELDS,
+    AppointmentSlotSerializer,
+    BookingPublicSerializer,
+    BookingSerializer,
+    BookingSeriesSerializer,
+    BulkCancelSerializer,
+    DailyOccupancySerializer,
+    UserRegistrationSerializer,
+    issue_token_pair,
+    serialize_booking_rows,
+)
+from .slot_cache import cached_slot_response
 
 if TYPE_CHECKING:
     from django.db.models import QuerySet
+    from django.http import QueryDict
+    from rest_framework.request import Request
 
 
 class IndexView(TemplateView):
     template_name = "index.html"
 
 
+def upcoming_slots(qs: "QuerySet[AppointmentSlot]", params: "QueryDict") -> "QuerySet[AppointmentSlot]":
+    """Future slots of `qs` with booking state, filtered by the `start`, `end` and `doctor` query params."""
+    # Only return future appointment slots
+    qs = qs.with_booking_state()
+    now = timezone.now()
+    qs = qs.filter(start__gte=now)
+
+    # Support filtering by date range
+    start_date = params.get("start")
+    end_date = params.get("end")
+
+    if start_date:
+        qs = qs.filter(start__gte=start_date)
+    if end_date:
+        qs = qs.filter(start__lte=end_date)
+
+    # Support filtering by doctor
+    if doctor_id := params.get("doctor"):
+        if not doctor_id.isdigit():
+            raise ValidationError({"doctor": "Must be a numeric user id."})
+        qs = qs.filter(doctor_id=int(doctor_id))
+
+    return qs.order_by("start")
+
+
+def datetime_param(params: "QueryDict", name: str) -> datetime.datetime | None:
+    """Parse an ISO 8601 datetime or date (midnight) query param in the current time zone."""
+    if not (raw := params.get(name)):
+        return None
+    try:
+        value = parse_datetime(raw) or parse_date(raw)
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValidationError({name: "Must be an ISO 8601 date or datetime."})
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time.min)
+    return value if timezone.is_aware(value) else timezone.make_aware(value)
+
+
+def own_bookings(request: "Request", model: type[Booking | ArchivedBooking] = Booking) -> "QuerySet[Booking]":
+    """Bookings of the requesting patient, or of the requesting doctor's slots (archived ones with `model=ArchivedBooking`)."""
+    if is_doctor(request):
+        # Show all bookings for slots assigned to this doctor
+        return model.objects.filter(slot__doctor_id=request.user.id)
+    # Show bookings made by this user
+    return model.objects.filter(user_id=request.user.id)
+
+
+def booking_sources(params: "QueryDict", live: "QuerySet[Booking]", archived: "QuerySet[ArchivedBooking]") -> list["QuerySet"]:
+    """The booking tables to read: both by default, only the archive with `?archived=true`, only live bookings with `false`.
+
+    Archived bookings have the fields of live ones (and keep their ids), so rows of both read the same.
+    """
+    match params.get("archived", "").lower():
+        case "":
+            return [live, archived]
+        case "1" | "true":
+            return [archived]
+        case "0" | "false":
+            return [live]
+    raise ValidationError({"archived": "Must be true or false."})
+
+
+def filter_bookings(qs: "QuerySet[Booking]", params: "QueryDict") -> "QuerySet[Booking]":
+    """Apply the `start`/`end` (slot start), `doctor` and `status` query params to `qs`."""
+    if start := datetime_param(params, "start"):
+        qs = qs.filter(slot__start__gte=start)
+    if end := datetime_param(params, "end"):
+        qs = qs.filter(slot__start__lte=end)
+    if doctor := params.get("doctor"):
+        if not doctor.isdigit():
+            raise ValidationError({"doctor": "Must be a numeric user id."})
+        qs = qs.filter(slot__doctor_id=int(doctor))
+    if status := params.get("status"):
+        if status not in Booking.Status.values:
+            raise ValidationError({"status": f"Must be one of: {', '.join(Booking.Status.values)}."})
+        qs = qs.filter(status=status)
+    return qs
+
+
 class AppointmentSlotViewSet(viewsets.ModelViewSet):
     queryset = AppointmentSlot.objects.all()
     serializer_class = AppointmentSlotSerializer
+    pagination_class = SlotPagination
+    # maximum SQL queries per action, enforced by api.instrumentation.RequestMetricsMiddleware
+    # (budgets include the authentication and role lookups of a JWT request)
+    query_budgets = {"list": 1, "calendar": 1, "retrieve": 1}
+    # public read-only listings that may lag the primary by replication delay (see api.routing)
+    replica_actions = {"list", "calendar"}
 
     def get_queryset(self) -> "QuerySet[AppointmentSlot]":
-        # Only return future appointment slots
-        qs = super().get_queryset()
-        now = timezone.now()
-        qs = qs.filter(start__gte=now)
-
-        # Support filtering by date range
-        start_date = self.request.query_params.get("start")
-        end_date = self.request.query_params.get("end")
-
-        if start_date:
-            qs = qs.filter(start__gte=start_date)
-        if end_date:
-            qs = qs.filter(start__lte=end_date)
-
-        return qs.order_by("start")
+        return upcoming_slots(super().get_queryset(), self.request.query_params)
 
     def get_permissions(self) -> list[permissions.BasePermission]:
         if self.action in ("create", "update", "partial_update", "destroy"):
@@ -56,20 +162,138 @@ class AppointmentSlotViewSet(viewsets.ModelViewSet):
         # Automatically assign the doctor field to the logged-in user
         serializer.save(doctor=self.request.user)
 
+    def list(self, request, *args, **kwargs) -> Response:
+        return cached_slot_response(request, "list", lambda: super(AppointmentSlotViewSet, self).list(request, *args, **kwargs).data)
+
+    @action(detail=False, methods=["get"])
+    def calendar(self, request) -> Response:
+        """Compact columnar feed for calendar range queries (`start`, `end`, `doctor` params)."""
+
+        def build():
+            with serialization_timer():
+                return build_calendar_feed(self.get_queryset())
+
+        return cached_slot_response(request, "calendar", build)
+
+
+class AvailabilityViewSet(viewsets.ViewSet):
+    """Free slots per doctor, answered from the availability index instead of MySQL."""
+
+    permission_classes = [permissions.AllowAny]
+    query_budgets = {"list": 2, "retrieve": 2}
+    datetime_field = serializers.DateTimeField()
+
+    def list(self, request) -> Response:
+        """Next free slot of every doctor."""
+        doctors = list(User.objects.filter(groups__name="doctor").order_by("id").values_list("id", "first_name", "last_name", "username"))
+        availability.ensure_loaded(doctor_id for doctor_id, *_ in doctors)
+        data = []
+        for doctor_id, first_name, last_name, username in doctors:
+            next_free = availability.next_free_slots(doctor_id, limit=1)
+            data.append(
+                {
+                    "doctor_id": doctor_id,
+                    "doctor": f"{first_name} {last_name}".strip() or username,
+                    "next_free": self.datetime_field.to_representation(next_free[0][0]) if next_free else None,
+                }
+            )
+
+        return Response(data)
+
+    def retrieve(self, request, pk: str | None = None) -> Response:
+        """Next `limit` free slots after `after` and free slot counts for the next `days` days."""
+        doctor = get_object_or_404(User.objects.filter(groups__name="doctor"), pk=pk)
+        after = None
+        if raw_after := request.query_params.get("after"):
+            if (after := parse_datetime(raw_after)) is None:
+                raise ValidationError({"after": "Must be an ISO 8601 datetime."})
+            if timezone.is_naive(after):
+                after = timezone.make_aware(after)
+        limit = self._int_param("limit", default=10, maximum=100)
+        days = self._int_param("days", default=30, maximum=90)
+
+        next_free = availability.next_free_slots(doctor.id, after, limit)
+        free_per_day = availability.free_counts_per_day(doctor.id, days)
+        return Response(
+            {
+                "doctor_id": doctor.id,
+                "next": [{"id": slot_id, "start": self.datetime_field.to_representation(start)} for start, slot_id in next_free],
+                "free_per_day": {day.isoformat(): count for day, count in free_per_day.items()},
+            }
+        )
+
+    def _int_param(self, name: str, default: int, maximum: int) -> int:
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+        if not value.isdigit() or not 0 < int(value) <= maximum:
+            raise ValidationError({name: f"Must be an integer between 1 and {maximum}."})
+        return int(value)
+
+
+class OccupancyViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """Daily slot and booking counts per doctor, read from the `DailyOccupancy` aggregates."""
+
+    queryset = DailyOccupancy.objects.all()
+    serializer_class = DailyOccupancySerializer
+    pagination_class = OccupancyPagination
+    permission_classes = [IsAdministrator]
+    query_budgets = {"list": 3, "summary": 3}
+    replica_actions = {"list", "summary"}
+
+    def get_queryset(self) -> "QuerySet[DailyOccupancy]":
+        qs = super().get_queryset()
+        for param, lookup in (("start", "day__gte"), ("end", "day__lte")):
+            if value := self.request.query_params.get(param):
+                if (day := parse_date(value)) is None:
+                    raise ValidationError({param: "Must be an ISO 8601 date."})
+                qs = qs.filter(**{lookup: day})
+        if doctor := self.request.query_params.get("doctor"):
+            if not doctor.isdigit():
+                raise ValidationError({"doctor": "Must be a user id."})
+            qs = qs.filter(doctor_id=doctor)
+        return qs
+
+    @action(detail=False, methods=["get"])
+    def summary(self, request) -> Response:
+        """Totals and utilization per doctor over the filtered days."""
+        rows = (
+            self.get_queryset()
+            .order_by("doctor_id")
+            .values("doctor_id")
+            .annotate(total_slots=Sum("total_slots"), confirmed=Sum("confirmed"), cancelled=Sum("cancelled"))
+        )
+        data = [
+            {
+                "doctor": row["doctor_id"],
+                "total_slots": row["total_slots"],
+                "confirmed": row["confirmed"],
+                "cancelled": row["cancelled"],
+                "utilization": round(row["confirmed"] / row["total_slots"], 4) if row["total_slots"] else None,
+            }
+            for row in rows
+        ]
+        return Response(data)
+
 
 class BookingViewSet(viewsets.ModelViewSet):
     queryset = Booking.objects.all().select_related("slot", "slot__doctor", "user")
     serializer_class = BookingSerializer
+    pagination_class = BookingPagination
+    # `series` and `bulk_cancel` update one occupancy row per day touched and have no fixed budget
+    # `export` reads its rows while the response streams, after the budget is checked
+    query_budgets = {"list": 3, "mine": 4, "all_bookings": 4, "export": 2, "retrieve": 3, "create": 10, "cancel": 8}
+    replica_actions = {"all_bookings", "export"}
 
     def get_permissions(self) -> list[permissions.BasePermission]:
         # only authenticated users can create bookings; listing by slot may be public; other actions require admin
-        if self.action == "create":
+        if self.action in ("create", "series"):
             return [permissions.IsAuthenticated(), CanCreateBooking()]
         if self.action == "list":
             # allow public listing only when filtering by slot (limited data will be returned)
             if self.request and self.request.query_params.get("slot"):
                 return [permissions.AllowAny()]
-        if self.action in ("mine", "cancel"):
+        if self.action in ("mine", "cancel", "bulk_cancel"):
             return [permissions.IsAuthenticated()]
         if self.action == "all_bookings":
             # administrators can view all bookings
@@ -105,12 +329,25 @@ class BookingViewSet(viewsets.ModelViewSet):
             user = getattr(self.request, "user", None)
             if user and user.is_authenticated:
                 # Administrators can see all bookings for a slot
-                if user.groups.filter(name="administrator").exists():
+                if is_administrator(self.request):
                     return qs
-                return qs.filter(user=user)
+                return qs.filter(user_id=user.id)
             return qs.none()
         return qs
 
+    def list(self, request, *args, **kwargs) -> Response:
+        if self.get_serializer_class() is not BookingSerializer:
+            return super().list(request, *args, **kwargs)
+        return self._booking_rows_response([self.filter_queryset(self.get_queryset())])
+
+    def _booking_rows_response(self, querysets: "list[QuerySet[Booking]]") -> Response:
+        """Paginate `querysets` as one list of `.values()` rows and serialize them through the fast read path."""
+        page = self.paginator.paginate_querysets([qs.values(*BOOKING_ROW_FIELDS) for qs in querysets], self.request, view=self)
+        with serialization_timer():
+            data = serialize_booking_rows(page, self.request)
+
+        return self.get_paginated_response(data)
+
     def perform_create(self, serializer: BookingSerializer) -> Booking:
         booking = serializer.save()
         # signals will handle email
@@ -118,44 +355,33 @@ class BookingViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
     def mine(self, request) -> Response:
-        # If user is a doctor, show bookings for their slots
-        # Otherwise show bookings created by the user
-        is_doctor = request.user.groups.filter(name="doctor").exists()
-
-        if is_doctor:
-            # Show all bookings for slots assigned to this doctor
-            qs = Booking.objects.filter(slot__doctor=request.user).select_related("slot", "user")
-        else:
-            # Show bookings made by this user
-            qs = Booking.objects.filter(user=request.user).select_related("slot")
-
-        page = self.paginate_queryset(qs)
-        serializer = self.get_serializer(page or qs, many=True)
-        if page is not None:
-            return self.get_paginated_response(serializer.data)
-
-        return Response(serializer.data)
+        """The requesting user's live and archived bookings (see `booking_sources` for `?archived=`)."""
+        return self._booking_rows_response(booking_sources(request.query_params, own_bookings(request), own_bookings(request, ArchivedBooking)))
 
     @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated, IsAdministrator])
     def all_bookings(self, request) -> Response:
-        """Endpoint for administrators to view all bookings."""
-        qs = Booking.objects.all().select_related("slot", "user")
-        page = self.paginate_queryset(qs)
-        serializer = self.get_serializer(page or qs, many=True)
-        if page is not None:
-            return self.get_paginated_response(serializer.data)
+        """Endpoint for administrators to view all bookings, live and archived (see `booking_sources` for `?archived=`)."""
+        return self._booking_rows_response(booking_sources(request.query_params, Booking.objects.all(), ArchivedBooking.objects.all()))
 
-        return Response(serializer.data)
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated, IsAdministrator])
+    def export(self, request) -> StreamingHttpResponse:
+        """Stream the bookings as CSV, or NDJSON with `?output=ndjson`.
+
+        Takes the `start`/`end` (slot start), `doctor`, `status` and `archived` filters.
+        """
+        output = request.query_params.get("output", "csv")
+        if output not in exports.FORMATS:
+            raise ValidationError({"output": f"Must be one of: {', '.join(exports.FORMATS)}."})
+        sources = booking_sources(request.query_params, Booking.objects.all(), ArchivedBooking.objects.all())
+        return exports.export_response([filter_bookings(qs, request.query_params) for qs in sources], output)
 
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated])
     def cancel(self, request, pk: int | None = None) -> Response:
         booking = self.get_object()
         # Allow owner, doctor (slot owner), or administrators to cancel
-        is_admin = request.user.groups.filter(name="administrator").exists()
-        is_doctor = request.user.groups.filter(name="doctor").exists()
         is_slot_doctor = booking.slot.doctor == request.user if booking.slot.doctor else False
 
-        if booking.user != request.user and not is_admin and not (is_doctor and is_slot_doctor):
+        if booking.user != request.user and not is_administrator(request) and not (is_doctor(request) and is_slot_doctor):
             return Response({"detail": "Not allowed"}, status=status.HTTP_403_FORBIDDEN)
 
         booking.status = Booking.Status.CANCELLED
@@ -164,33 +390,101 @@ class BookingViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data)
 
+    @action(detail=False, methods=["post"])
+    def series(self, request) -> Response:
+        """Book a series of slots (e.g. recurring therapy) in one transaction, all or nothing."""
+        serializer = BookingSeriesSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        bookings = serializer.save()
+
+        # re-read the rows: bulk_create does not return primary keys on MySQL
+        rows = Booking.objects.filter(confirmed_slot_id__in=[booking.slot_id for booking in bookings]).order_by("slot__start").values(*BOOKING_ROW_FIELDS)
+        with serialization_timer():
+            data = serialize_booking_rows(rows, request)
+
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"])
+    def bulk_cancel(self, request) -> Response:
+        """Cancel every confirmed booking of a doctor's slots in `[start, end)`.
+
+        Administrators may cancel for any doctor, doctors only for their own slots.
+        """
+        serializer = BulkCancelSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        doctor_id = serializer.validated_data.get("doctor", request.user.id)
+        if not is_administrator(request) and not (is_doctor(request) and doctor_id == request.user.id):
+            return Response({"detail": "Not allowed"}, status=status.HTTP_403_FORBIDDEN)
+
+        bookings = cancel_doctor_bookings(doctor_id, serializer.validated_data["start"], serializer.validated_data["end"])
+
+        return Response({"cancelled": [booking.id for booking in bookings]})
+
 
 class RegisterView(APIView):
     """Public endpoint to register a new user and return JWT tokens."""
 
     permission_classes = [permissions.AllowAny]
+    # username uniqueness check + insert
+    query_budgets = {"post": 2}
 
     def post(self, request, *args, **kwargs) -> Response:
         serializer = UserRegistrationSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
 
-        # create token pair for the new user
-        token_serializer = TokenObtainPairSerializer(
-            data={
-                "username": user.username,
-                "password": request.data.get("password"),
-            }
-        )
-        token_serializer.is_valid(raise_exception=True)
+        return Response(issue_token_pair(user), status=status.HTTP_201_CREATED)
+
+
+class LogoutView(APIView):
+    """Revoke the request's access token and, when given, the `refresh` token of the session."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request) -> Response:
+        tokens = [request.auth]
+        if raw_refresh := request.data.get("refresh"):
+            try:
+                refresh = RefreshToken(raw_refresh)
+            except TokenError as exc:
+                raise InvalidToken(exc.args[0]) from exc
+            if refresh.get(jwt_settings.USER_ID_CLAIM) != str(request.user.id):
+                return Response({"detail": "Not allowed"}, status=status.HTTP_403_FORBIDDEN)
+            tokens.append(refresh)
+        for token in tokens:
+            if token is not None:
+                revoke_token(token)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SlotImportView(APIView):
+    """Import slots and their bookings from an uploaded CSV or JSON `file` (see api.imports).
+
+    Rows that cannot be imported are reported with their line number; `dry_run` only validates.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, IsAdministrator]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request) -> Response:
+        if (upload := request.FILES.get("file")) is None:
+            raise ValidationError({"file": "Upload a CSV or JSON file."})
+        dry_run = str(request.data.get("dry_run", "")).lower() in ("1", "true")
+        try:
+            rows = imports.read_rows(io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline=""), imports.format_for(upload.name))
+            result = imports.import_rows(rows, dry_run=dry_run)
+        except imports.ImportFormatError as exc:
+            raise ValidationError({"file": str(exc)}) from exc
 
-        return Response(token_serializer.validated_data, status=status.HTTP_201_CREATED)
+        return Response(dataclasses.asdict(result))
 
 
 class CurrentUserView(APIView):
     """Return current authenticated user's details."""
 
     permission_classes = [permissions.IsAuthenticated]
+    # answered from the token claims, the lookup only runs for tokens issued without them
+    query_budgets = {"get": 1}
 
     def get(self, request) -> Response:
         user = request.user
@@ -0,0 +1,5 @@
+"""Performance benchmarks.
+
+Run from `booking_backend/` as `python -m benchmarks.<name>`. Each benchmark works on a throwaway,
+migrated test database (SQLite in memory unless `DATABASE_ADDRESS` points to a server).
+"""
@@ -0,0 +1,143 @@
+"""End-to-end benchmark of the hot booking API endpoints.
+
+Usage: `python -m benchmarks.api [--doctors 20] [--slots 200] [--bookings 2000] [--output results.json] [--compare baseline.json]`
+
+Seeds N doctors x M slots x K bookings with bulk factories, then drives each endpoint through the
+full Django/DRF stack and reports query count, p50/p99 latency and peak allocations per request.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from .harness import percentile, scratch_database, setup_django
+
+
+def _git_revision() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def run_scenario(request: Callable[[int], Any], iterations: int, expected_status: int) -> dict[str, Any]:
+    """Call `request(i)` `iterations` times and collect per-request statistics."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    latencies, queries = [], []
+    for i in range(iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = request(i)
+            latencies.append(time.perf_counter() - started)
+        if response.status_code != expected_status:
+            raise RuntimeError(f"Unexpected status {response.status_code}: {getattr(response, 'data', response.content)!r}")
+        queries.append(len(ctx.captured_queries))
+
+    # allocations are traced in a separate pass so tracing overhead does not skew latencies
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    request(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "queries": max(queries),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "peak_alloc_kib": round(peak / 1024, 1),
+    }
+
+
+def print_results(results: dict[str, Any], baseline: dict[str, Any] | None) -> None:
+    print(f"{'scenario':<28}{'queries':>8}{'p50 ms':>10}{'p99 ms':>10}{'alloc KiB':>12}")
+    for name, stats in results["scenarios"].items():
+        line = f"{name:<28}{stats['queries']:>8}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['peak_alloc_kib']:>12.1f}"
+        if baseline and (before := baseline["scenarios"].get(name)):
+            change = (stats["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+            line += f"   p50 {change:+.1f}%, queries {stats['queries'] - before['queries']:+d} vs {baseline.get('revision') or 'baseline'}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--slots", type=int, default=200, help="Slots per doctor")
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=50, help="Requests per scenario")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.cache import cache
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+
+    from api.models import Booking
+
+    from .factories import seed
+
+    with scratch_database():
+        started = time.perf_counter()
+        data = seed(args.doctors, args.slots, args.bookings, patients=args.patients)
+        seed_seconds = time.perf_counter() - started
+
+        anonymous, patient, admin = APIClient(), APIClient(), APIClient()
+        patient.force_authenticate(data.patients[0])
+        admin.force_authenticate(data.admin)
+
+        free_slots = data.slots[args.bookings :]
+        patient_bookings = [booking for booking in data.bookings if booking.user_id == data.patients[0].id]
+        if len(free_slots) <= args.iterations or len(patient_bookings) <= args.iterations:
+            raise SystemExit("Not enough free slots or patient bookings for the requested iterations; raise --slots/--bookings")
+        range_params = {"end": (timezone.now() + datetime.timedelta(days=7)).isoformat()}
+
+        def cold_slot_list(i):
+            cache.clear()
+            return anonymous.get("/api/appointments/", range_params)
+
+        scenarios = {
+            "appointments list": (cold_slot_list, 200),
+            "appointments list (cached)": (lambda i: anonymous.get("/api/appointments/", range_params), 200),
+            "bookings mine": (lambda i: patient.get("/api/bookings/mine/"), 200),
+            "bookings all_bookings": (lambda i: admin.get("/api/bookings/all_bookings/"), 200),
+            "booking create": (lambda i: patient.post("/api/bookings/", {"slot": free_slots[i].id, "reason": "Kontrola"}, format="json"), 201),
+            "booking cancel": (lambda i: patient.post(f"/api/bookings/{patient_bookings[i].id}/cancel/"), 200),
+        }
+
+        results = {
+            "revision": _git_revision(),
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "params": {**vars(args), "database": Booking.objects.db},
+            "seed_seconds": round(seed_seconds, 3),
+            "scenarios": {name: run_scenario(request, args.iterations, status) for name, (request, status) in scenarios.items()},
+        }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    print(f"Seeded {args.doctors} doctors x {args.slots} slots, {args.bookings} bookings in {seed_seconds:.2f}s")
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
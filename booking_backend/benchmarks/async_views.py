@@ -0,0 +1,82 @@
+"""Sync DRF viewsets vs their async versions under concurrent load.
+
+Usage: `python -m benchmarks.async_views [--requests 400] [--concurrency 50] [--slots 500]`
+
+Requests are driven through Django's ASGI handler (as under uvicorn) with `--concurrency` requests
+in flight. Sync views are run in a thread per request by the handler, async views only hop to a
+thread for database calls. Reports throughput, p50/p99 latency and the peak number of threads.
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+from .harness import percentile, scratch_database, setup_django
+
+
+async def drive(client, path: str, headers: dict[str, str], requests: int, concurrency: int) -> dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    peak_threads = threading.active_count()
+
+    async def one() -> None:
+        nonlocal peak_threads
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            peak_threads = max(peak_threads, threading.active_count())
+            if response.status_code != 200:
+                raise RuntimeError(f"{path}: unexpected status {response.status_code}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "threads": peak_threads,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--slots", type=int, default=500, help="Slots per doctor")
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.test import AsyncClient
+
+    from api.serializers import RoleClaimsTokenObtainPairSerializer
+
+    from .factories import seed
+
+    with scratch_database():
+        data = seed(doctors=5, slots_per_doctor=args.slots, bookings=args.slots, patients=5)
+        token = RoleClaimsTokenObtainPairSerializer.get_token(data.patients[0]).access_token
+        auth = {"Authorization": f"Bearer {token}"}
+        client = AsyncClient()
+        # measure the views rather than the slot listing cache
+        settings.SLOT_CACHE_TIMEOUT = 0
+        scenarios = [
+            ("slot list", "/api/appointments/?page_size=50", "/api/async/appointments/?page_size=50", {}),
+            ("calendar", "/api/appointments/calendar/", "/api/async/appointments/calendar/", {}),
+            ("mine", "/api/bookings/mine/", "/api/async/bookings/mine/", auth),
+        ]
+
+        print(f"{'scenario':<12}{'mode':<7}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'threads':>9}")
+        for name, sync_path, async_path, headers in scenarios:
+            for mode, path in (("sync", sync_path), ("async", async_path)):
+                stats = asyncio.run(drive(client, path, headers, args.requests, args.concurrency))
+                print(f"{name:<12}{mode:<7}{stats['rps']:>9.1f}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['threads']:>9}")
+
+
+if __name__ == "__main__":
+    main()
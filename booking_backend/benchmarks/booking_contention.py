@@ -0,0 +1,76 @@
+"""Many clients racing for the same slot through `BookingSerializer`.
+
+Usage: `python -m benchmarks.booking_contention [--attempts 1000] [--workers 32]`
+
+Exactly one attempt must win; every other one has to be rejected with "Slot is already booked".
+SQLite serializes writers, so run against MySQL (`DATABASE_ADDRESS=...`) for realistic contention.
+"""
+
+import argparse
+import datetime
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .harness import scratch_database, setup_django
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--attempts", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, connection
+    from django.utils import timezone
+    from rest_framework import serializers
+    from rest_framework.test import APIRequestFactory
+
+    from api.models import AppointmentSlot, Booking
+    from api.serializers import BookingSerializer
+
+    with scratch_database():
+        slot = AppointmentSlot.objects.create(start=timezone.now() + datetime.timedelta(days=1))
+        patients = User.objects.bulk_create(User(username=f"patient{i}") for i in range(args.attempts))
+        factory = APIRequestFactory()
+
+        def attempt(patient: User) -> tuple[str, float]:
+            request = factory.post("/api/bookings/")
+            request.user = patient
+            started = time.perf_counter()
+            try:
+                serializer = BookingSerializer(data={"slot": slot.id}, context={"request": request})
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                outcome = "booked"
+            except serializers.ValidationError:
+                outcome = "rejected"
+            except OperationalError:
+                # e.g. SQLite "database is locked" under concurrent writers
+                outcome = "db error"
+            finally:
+                connection.close()
+            return outcome, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(attempt, patients))
+        elapsed = time.perf_counter() - started
+
+        outcomes = Counter(outcome for outcome, _ in results)
+        latencies = sorted(latency for _, latency in results)
+        print(f"{args.attempts} attempts, {args.workers} workers, {connection.vendor}: {elapsed:.2f}s ({args.attempts / elapsed:.0f} attempts/s)")
+        print(f"  outcomes: {dict(outcomes)}")
+        print(f"  latency p50 {statistics.median(latencies) * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+        confirmed = Booking.objects.filter(slot=slot, status=Booking.Status.CONFIRMED).count()
+        print(f"  confirmed bookings for the slot: {confirmed}")
+        if confirmed != 1:
+            raise SystemExit("FAILED: slot was double booked")
+
+
+if __name__ == "__main__":
+    main()
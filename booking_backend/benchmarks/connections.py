@@ -0,0 +1,96 @@
+"""Per-request latency with fresh, persistent and pooled database connections.
+
+Usage: `python -m benchmarks.connections [--requests 500] [--concurrency 8]`
+
+Each mode runs in its own process (the settings are read from env at startup) and simulates requests
+as Django handles them: `request_started`, one slot lookup, `request_finished`, which closes or keeps
+the connection according to `CONN_MAX_AGE`. The connection handshake only shows up against a real
+server, so run it against MySQL (`DATABASE_ADDRESS=...` or `JAWSDB_URL=...`); the pooled mode only
+applies to MySQL.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .harness import percentile, scratch_database, setup_django
+
+MODES = {
+    "fresh": {"DATABASE_CONN_MAX_AGE": "0", "DATABASE_POOL": "false"},
+    "persistent": {"DATABASE_CONN_MAX_AGE": "60", "DATABASE_POOL": "false"},
+    "pooled": {"DATABASE_POOL": "true"},
+}
+
+
+def run_mode(requests: int, concurrency: int) -> dict[str, float | int]:
+    setup_django()
+
+    from django.core.signals import request_finished, request_started
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+
+    from api.models import AppointmentSlot
+
+    if connection.vendor == "sqlite":
+        # in-memory test databases are never closed, use a file so closing has a cost
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+
+    opened = 0
+    lock = threading.Lock()
+
+    def count_connection(**kwargs) -> None:
+        nonlocal opened
+        with lock:
+            opened += 1
+
+    connection_created.connect(count_connection)
+
+    def request(i: int) -> float:
+        started = time.perf_counter()
+        request_started.send(sender=None)
+        try:
+            AppointmentSlot.objects.filter(pk=i).first()
+        finally:
+            request_finished.send(sender=None)
+        return time.perf_counter() - started
+
+    with scratch_database():
+        opened = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = sorted(pool.map(request, range(requests)))
+
+    return {
+        "vendor": connection.vendor,
+        "connections": opened,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8, help="Worker threads handling requests")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.requests, args.concurrency)))
+        return
+
+    print(f"{'mode':<12}{'connections':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for mode, env in MODES.items():
+        command = [sys.executable, "-m", "benchmarks.connections", "--mode", mode, "--requests", str(args.requests), "--concurrency", str(args.concurrency)]
+        output = subprocess.run(command, env=os.environ | env, capture_output=True, text=True, check=True).stdout
+        stats = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<12}{stats['connections']:>12}{stats['p50_ms']:>10.3f}{stats['p99_ms']:>10.3f}  ({stats['vendor']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import datetime
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from django.contrib.auth.models import Group, User
+from django.utils import timezone
+
+from api.models import AppointmentSlot, Booking
+
+if TYPE_CHECKING:
+    from django.db.models import QuerySet
+
+
+@dataclass
+class Dataset:
+    doctors: list[User]
+    patients: list[User]
+    admin: User
+    slots: list[AppointmentSlot]
+    bookings: list[Booking]
+
+
+def _with_pks(created: list, reload: "QuerySet") -> list:
+    # bulk_create only sets primary keys on backends with RETURNING (SQLite, PostgreSQL, MariaDB)
+    return created if all(obj.pk is not None for obj in created) else list(reload)
+
+
+def seed(doctors: int, slots_per_doctor: int, bookings: int, patients: int = 50, batch_size: int = 1000) -> Dataset:
+    """Insert users, slots and confirmed bookings with `bulk_create` (no signals, no password hashing).
+
+    The first `bookings` slots (in start order, across doctors) are booked round-robin by the patients;
+    the remaining slots stay free.
+    """
+    doctor_group, _ = Group.objects.get_or_create(name="doctor")
+    admin_group, _ = Group.objects.get_or_create(name="administrator")
+
+    doctor_users = _with_pks(
+        User.objects.bulk_create(User(username=f"doctor{i}", first_name="Doctor", last_name=str(i)) for i in range(doctors)),
+        User.objects.filter(username__startswith="doctor").order_by("id"),
+    )
+    patient_users = _with_pks(
+        User.objects.bulk_create(User(username=f"patient{i}", email=f"patient{i}@example.com") for i in range(patients)),
+        User.objects.filter(username__startswith="patient").order_by("id"),
+    )
+    admin = User.objects.create(username="admin")
+    User.groups.through.objects.bulk_create(
+        [User.groups.through(user_id=doctor.id, group_id=doctor_group.id) for doctor in doctor_users]
+        + [User.groups.through(user_id=admin.id, group_id=admin_group.id)]
+    )
+
+    first_start = (timezone.now() + datetime.timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    slots = _with_pks(
+        AppointmentSlot.objects.bulk_create(
+            (
+                AppointmentSlot(
+                    doctor=doctor,
+                    start=first_start + datetime.timedelta(minutes=30 * i),
+                    end=first_start + datetime.timedelta(minutes=30 * (i + 1)),
+                )
+                for i in range(slots_per_doctor)
+                for doctor in doctor_users
+            ),
+            batch_size=batch_size,
+        ),
+        AppointmentSlot.objects.order_by("start", "doctor_id"),
+    )
+    if bookings > len(slots):
+        raise ValueError(f"Cannot book {bookings} of {len(slots)} slots")
+
+    # bulk_create skips Booking.save(), so set the confirmed_slot mirror explicitly
+    booking_objs = _with_pks(
+        Booking.objects.bulk_create(
+            (Booking(slot=slot, confirmed_slot=slot, user=patient_users[i % patients], reason="Kontrola") for i, slot in enumerate(slots[:bookings])),
+            batch_size=batch_size,
+        ),
+        Booking.objects.order_by("id"),
+    )
+    return Dataset(doctors=doctor_users, patients=patient_users, admin=admin, slots=slots, bookings=booking_objs)
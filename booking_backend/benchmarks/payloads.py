@@ -0,0 +1,89 @@
+"""Serialization, JSON rendering and compression of the slot and booking list payloads.
+
+Usage: `python -m benchmarks.payloads [--rows 500] [--repeat 20]`
+
+Compares DRF's stdlib `JSONRenderer` on datetimes pre-formatted per field (`DATETIME_FORMAT` ISO 8601,
+the previous setup) with `FastJSONRenderer` on native datetimes, then the size and cost of gzip and
+brotli (when installed) on the rendered page.
+"""
+
+import argparse
+import datetime
+
+from .harness import measure, scratch_database, setup_django
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500, help="Rows per payload (one API page)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+    from django.utils import timezone
+    from django.utils.text import compress_string
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory
+
+    from api import compression
+    from api.models import AppointmentSlot, Booking
+    from api.renderers import FastJSONRenderer, orjson
+    from api.serializers import BOOKING_ROW_FIELDS, AppointmentSlotSerializer, serialize_booking_rows
+
+    with scratch_database():
+        doctor = User.objects.create(username="doctor", first_name="Anna", last_name="Kowalska")
+        patient = User.objects.create(username="patient", first_name="Jan", last_name="Nowak")
+        start = timezone.now() + datetime.timedelta(days=1)
+        slots = AppointmentSlot.objects.bulk_create(AppointmentSlot(start=start + datetime.timedelta(minutes=30 * i), doctor=doctor) for i in range(args.rows))
+        Booking.objects.bulk_create(Booking(slot=slot, user=patient, reason="Kontrola") for slot in slots)
+
+        request = APIRequestFactory().get("/api/bookings/mine/")
+        request.user = patient
+        slot_rows = list(AppointmentSlot.objects.with_booking_state().select_related("doctor"))
+        booking_rows = list(Booking.objects.values(*BOOKING_ROW_FIELDS))
+
+        def slot_payload():
+            return AppointmentSlotSerializer(slot_rows, many=True).data
+
+        def booking_payload():
+            return serialize_booking_rows(booking_rows, request)
+
+        def preformatted_booking_payload():
+            # the row serializer formatted the slot start with isoformat() per row before
+            data = serialize_booking_rows(booking_rows, request)
+            for row in data:
+                row["slot_details"]["start"] = row["slot_details"]["start"].isoformat()
+            return data
+
+        print(f"{args.rows} rows per payload, best of {args.repeat}; orjson {'installed' if orjson else 'missing'}")
+        print(f"{'payload':<10}{'setup':<28}{'serialize ms':>14}{'render ms':>11}{'bytes':>9}")
+        for name, baseline, fast in (
+            ("slots", slot_payload, slot_payload),
+            ("bookings", preformatted_booking_payload, booking_payload),
+        ):
+            with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DATETIME_FORMAT": "iso-8601"}):
+                data = baseline()
+                serialize = measure(baseline, args.repeat)["min"]
+            render = measure(lambda data=data: JSONRenderer().render(data), args.repeat)["min"]
+            print(f"{name:<10}{'stdlib json, iso strings':<28}{serialize * 1000:>14.2f}{render * 1000:>11.2f}{len(JSONRenderer().render(data)):>9}")
+
+            data = fast()
+            serialize = measure(fast, args.repeat)["min"]
+            render = measure(lambda data=data: FastJSONRenderer().render(data), args.repeat)["min"]
+            body = FastJSONRenderer().render(data)
+            print(f"{name:<10}{'fast json, native datetimes':<28}{serialize * 1000:>14.2f}{render * 1000:>11.2f}{len(body):>9}")
+
+            encoders = [("gzip", lambda body=body: compress_string(body, max_random_bytes=100))]
+            if compression.brotli is not None:
+                encoders.append(("brotli", lambda body=body: compression.brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)))
+            for encoding, encode in encoders:
+                cost = measure(encode, args.repeat)["min"]
+                print(f"{'':<10}{'+ ' + encoding:<28}{'':>14}{cost * 1000:>11.2f}{len(encode()):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Registration throughput of one worker: the previous two-hash path vs the sync and async views.
+
+Usage: `python -m benchmarks.registration [--requests 40] [--concurrency 8]`
+
+`previous` replays the old pipeline in process (create, `set_password`, `save`, then a token pair
+obtained by authenticating with the password again: two hashes, three writes). The views are driven
+through Django's ASGI handler with `--concurrency` registrations in flight; the sync view runs in the
+single thread ASGI uses for sync code, the async one hashes in the `PASSWORD_HASH_THREADS` pool.
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+
+from .harness import percentile, scratch_database, setup_django
+
+_names = itertools.count()
+
+
+def payload() -> dict[str, str]:
+    name = f"user{next(_names)}"
+    return {"username": name, "password": "Kontrola-2024", "email": f"{name}@example.com", "first_name": "Jan", "last_name": "Nowak"}
+
+
+async def drive(client, path: str, requests: int, concurrency: int) -> dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, payload(), content_type="application/json")
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 201:
+                raise RuntimeError(f"{path}: unexpected status {response.status_code}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {"rps": requests / elapsed, "p50_ms": percentile(latencies, 50) * 1000, "p99_ms": percentile(latencies, 99) * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import AsyncClient, Client
+    from django.test.utils import CaptureQueriesContext
+
+    from api.serializers import RoleClaimsTokenObtainPairSerializer
+
+    def previous(data: dict[str, str]) -> None:
+        user = User.objects.create(**{k: v for k, v in data.items() if k != "password"})
+        user.set_password(data["password"])
+        user.save()
+        tokens = RoleClaimsTokenObtainPairSerializer(data={"username": user.username, "password": data["password"]})
+        tokens.is_valid(raise_exception=True)
+
+    with scratch_database():
+        print(f"{args.requests} registrations, {args.concurrency} in flight, {settings.PASSWORD_HASH_THREADS} hashing threads")
+        print(f"{'path':<10}{'queries':>9}{'reg/s':>9}{'p50 ms':>10}{'p99 ms':>10}")
+
+        with CaptureQueriesContext(connection) as queries:
+            previous(payload())
+        latencies = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            previous(payload())
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        rps = args.requests / sum(latencies)
+        print(f"{'previous':<10}{len(queries):>9}{rps:>9.1f}{percentile(latencies, 50) * 1000:>10.2f}{percentile(latencies, 99) * 1000:>10.2f}")
+
+        client = AsyncClient()
+        for mode, path in (("sync", "/api/auth/register/"), ("async", "/api/async/auth/register/")):
+            # queries of the ASGI handler's threads are not visible here, count them through the test client
+            with CaptureQueriesContext(connection) as queries:
+                Client().post(path, payload(), content_type="application/json")
+            stats = asyncio.run(drive(client, path, args.requests, args.concurrency))
+            print(f"{mode:<10}{len(queries):>9}{stats['rps']:>9.1f}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
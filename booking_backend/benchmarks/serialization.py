@@ -0,0 +1,58 @@
+"""Throughput of `BookingSerializer` versus the `serialize_booking_rows` fast path.
+
+Usage: `python -m benchmarks.serialization [--bookings 10000]`
+"""
+
+import argparse
+import datetime
+
+from .harness import measure, scratch_database, setup_django
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth.models import Group, User
+    from django.utils import timezone
+    from rest_framework.test import APIRequestFactory
+
+    from api.models import AppointmentSlot, Booking
+    from api.serializers import BOOKING_ROW_FIELDS, BookingSerializer, serialize_booking_rows
+
+    with scratch_database():
+        doctor = User.objects.create(username="doctor", first_name="Anna", last_name="Kowalska")
+        patient = User.objects.create(username="patient", first_name="Jan", last_name="Nowak")
+        admin = User.objects.create(username="admin")
+        admin.groups.add(Group.objects.create(name="administrator"))
+
+        start = timezone.now() + datetime.timedelta(days=1)
+        slots = AppointmentSlot.objects.bulk_create(
+            AppointmentSlot(start=start + datetime.timedelta(minutes=30 * i), doctor=doctor) for i in range(args.bookings)
+        )
+        Booking.objects.bulk_create(Booking(slot=slot, user=patient, reason="Kontrola") for slot in slots)
+
+        request = APIRequestFactory().get("/api/bookings/all_bookings/")
+        request.user = admin
+
+        def model_serializer():
+            qs = Booking.objects.select_related("slot", "slot__doctor", "user")
+            return BookingSerializer(qs, many=True, context={"request": request}).data
+
+        def row_serializer():
+            return serialize_booking_rows(Booking.objects.values(*BOOKING_ROW_FIELDS), request)
+
+        print(f"{args.bookings} bookings, best of {args.repeat} (query + serialization)")
+        baseline = None
+        for name, func in (("BookingSerializer", model_serializer), ("serialize_booking_rows", row_serializer)):
+            stats = measure(func, args.repeat)
+            baseline = baseline or stats["min"]
+            print(f"  {name:<24} {stats['min'] * 1000:8.1f} ms  {args.bookings / stats['min']:10.0f} rows/s  x{baseline / stats['min']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
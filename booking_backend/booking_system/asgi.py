@@ -3,5 +3,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "booking_system.settings")
+# per-thread persistent connections are not reused under ASGI, pool them instead (see settings.DATABASE_POOL)
+os.environ.setdefault("DATABASE_POOL", "true")
 
 application = get_asgi_application()
@@ -0,0 +1,16 @@
+from django.db.backends.mysql import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """MySQL backend with pooled connections (ENGINE = "booking_system.db.mysql")."""
+
+    def is_pooled_connection_usable(self, connection) -> bool:
+        if not self.settings_dict["CONN_HEALTH_CHECKS"]:
+            return True
+        try:
+            connection.ping()
+        except base.Database.Error:
+            return False
+        return True
@@ -0,0 +1,86 @@
+import threading
+from collections.abc import Callable
+from typing import Any
+
+
+def _close_quietly(connection: Any) -> None:
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """Thread-safe LIFO pool of idle DB-API connections.
+
+    At most `max_idle` connections are kept; connections released beyond that are closed. The pool
+    never blocks: when it is empty a new connection is opened.
+    """
+
+    def __init__(self, max_idle: int) -> None:
+        self.max_idle = max_idle
+        self._idle: list[Any] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, connect: Callable[[], Any], is_usable: Callable[[Any], bool]) -> Any:
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                return connect()
+            if is_usable(connection):
+                return connection
+            _close_quietly(connection)
+
+    def release(self, connection: Any, reset: Callable[[Any], None]) -> None:
+        try:
+            reset(connection)
+        except Exception:
+            # broken connection, do not hand it out again
+            _close_quietly(connection)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        _close_quietly(connection)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            _close_quietly(connection)
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+class PooledDatabaseWrapperMixin:
+    """Take connections from a process-wide pool per database alias and return them on close.
+
+    Meant for `CONN_MAX_AGE = 0`: Django closes the connection when a request finishes, which puts it
+    back into the pool instead of disconnecting. `POOL_SIZE` in the database settings caps idle connections.
+    """
+
+    @property
+    def pool(self) -> ConnectionPool:
+        with _pools_lock:
+            if self.alias not in _pools:
+                _pools[self.alias] = ConnectionPool(self.settings_dict.get("POOL_SIZE", 10))
+            return _pools[self.alias]
+
+    def get_new_connection(self, conn_params: dict[str, Any]) -> Any:
+        connect = super().get_new_connection
+        return self.pool.acquire(lambda: connect(conn_params), self.is_pooled_connection_usable)
+
+    def _close(self) -> None:
+        if self.connection is not None:
+            self.pool.release(self.connection, self.reset_pooled_connection)
+
+    def is_pooled_connection_usable(self, connection: Any) -> bool:
+        return True
+
+    def reset_pooled_connection(self, connection: Any) -> None:
+        # discard whatever the previous request left uncommitted
+        connection.rollback()
@@ -9,6 +9,7 @@ export interface User {
 export interface AppointmentSlot {
     id: number;
     start: string;
+    end: string;
     doctor: string | null;
     is_booked: boolean;
 }
@@ -33,6 +34,12 @@ export interface Booking {
     };
 }
 
+export interface CursorPage<T> {
+    next: string | null;
+    previous: string | null;
+    results: T[];
+}
+
 export interface TokenResponse {
     access: string;
     refresh: string;
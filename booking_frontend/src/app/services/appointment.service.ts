@@ -4,6 +4,7 @@ import { Observable } from 'rxjs';
 import { map } from 'rxjs/operators';
 import { AppointmentSlot, CalendarEvent } from '../models/types';
 import { AuthService } from './auth.service';
+import { fetchAllPages } from './pagination';
 
 @Injectable({
     providedIn: 'root'
@@ -28,7 +29,7 @@ export class AppointmentService {
             url += '?' + params.join('&');
         }
 
-        return this.http.get<AppointmentSlot[]>(url).pipe(
+        return fetchAllPages<AppointmentSlot>(this.http, url).pipe(
             map(slots => this.convertSlotsToEvents(slots))
         );
     }
@@ -50,9 +51,6 @@ export class AppointmentService {
 
     private convertSlotsToEvents(slots: AppointmentSlot[]): CalendarEvent[] {
         return slots.map(slot => {
-            const slotDate = new Date(slot.start);
-            const endDate = new Date(slotDate.getTime() + 60 * 60 * 1000); // +1 hour
-
             let title: string;
             let backgroundColor: string;
             let borderColor: string;
@@ -73,7 +71,7 @@ export class AppointmentService {
                 id: slot.id.toString(),
                 title,
                 start: slot.start,
-                end: endDate.toISOString(),
+                end: slot.end,
                 backgroundColor,
                 borderColor,
                 extendedProps: {
@@ -49,6 +49,12 @@ export class AuthService {
     }
 
     logout(): void {
+        const refresh = localStorage.getItem('refresh_token');
+        if (this.hasToken()) {
+            // revoke both tokens server side, the local session ends either way
+            this.http.post(`${this.apiUrl}/auth/logout/`, { refresh }, { headers: this.getAuthHeaders() })
+                .subscribe({ error: () => undefined });
+        }
         localStorage.removeItem('access_token');
         localStorage.removeItem('refresh_token');
         this.isAuthenticatedSubject.next(false);
@@ -3,6 +3,7 @@ import { HttpClient } from '@angular/common/http';
 import { Observable } from 'rxjs';
 import { Booking } from '../models/types';
 import { AuthService } from './auth.service';
+import { fetchAllPages } from './pagination';
 
 @Injectable({
     providedIn: 'root'
@@ -13,23 +14,26 @@ export class BookingService {
     private apiUrl = '/api/bookings';
 
     getBookingsBySlot(slotId: number): Observable<Booking[]> {
-        return this.http.get<Booking[]>(
+        return fetchAllPages<Booking>(
+            this.http,
             `${this.apiUrl}/?slot=${slotId}`,
-            { headers: this.authService.getAuthHeaders() }
+            this.authService.getAuthHeaders()
         );
     }
 
     getMyBookings(): Observable<Booking[]> {
-        return this.http.get<Booking[]>(
+        return fetchAllPages<Booking>(
+            this.http,
             `${this.apiUrl}/mine/`,
-            { headers: this.authService.getAuthHeaders() }
+            this.authService.getAuthHeaders()
         );
     }
 
     getAllBookings(): Observable<Booking[]> {
-        return this.http.get<Booking[]>(
+        return fetchAllPages<Booking>(
+            this.http,
             `${this.apiUrl}/all_bookings/`,
-            { headers: this.authService.getAuthHeaders() }
+            this.authService.getAuthHeaders()
         );
     }
 
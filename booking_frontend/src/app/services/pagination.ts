@@ -0,0 +1,12 @@
+import { HttpClient, HttpHeaders } from '@angular/common/http';
+import { EMPTY, Observable } from 'rxjs';
+import { expand, reduce } from 'rxjs/operators';
+import { CursorPage } from '../models/types';
+
+/** Follow `next` cursors of a paginated list endpoint and emit all results at once. */
+export function fetchAllPages<T>(http: HttpClient, url: string, headers?: HttpHeaders): Observable<T[]> {
+    return http.get<CursorPage<T>>(url, { headers }).pipe(
+        expand(page => page.next ? http.get<CursorPage<T>>(page.next, { headers }) : EMPTY),
+        reduce((items, page) => items.concat(page.results), [] as T[])
+    );
+}